@@ -0,0 +1,171 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+def retry_after(seconds):
+    """Format a wait in seconds as a Retry-After header value: whole seconds, at least one"""
+    return str(max(1, math.ceil(seconds)))
+
+
+class RateLimiter:
+    """Token bucket per client: a steady rate with bursts up to a fixed size.
+
+    Buckets are kept in an LRU table bounded by max_clients. A client
+    evicted for being idle comes back with a full bucket, which it would
+    have had by then anyway. A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate=5.0, burst=20, max_clients=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, client, cost=1):
+        """Take cost tokens from a client's bucket; return 0 if allowed, else the seconds until it would be"""
+        if self.rate <= 0:
+            return 0
+        # Requests costing more than a full bucket are let through once it is full
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                bucket = self.buckets[client] = [float(self.burst), now]
+            else:
+                self.buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                self.allowed += 1
+                return 0
+            self.limited += 1
+            return (cost - bucket[0]) / self.rate
+
+    def stats(self):
+        """Return the limit, the number of tracked clients and allowed/limited counters"""
+        with self.lock:
+            return {
+                'rate_per_second': self.rate,
+                'burst': self.burst,
+                'clients': len(self.buckets),
+                'allowed': self.allowed,
+                'limited': self.limited,
+            }
+
+
+class Ticket:
+    """An admitted request's slot; released once, on exit or explicitly"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """Bounded number of requests in flight, with a short bounded wait queue.
+
+    At most max_in_flight requests run at once. Up to max_queued more wait
+    for a slot, each no longer than its deadline, and any beyond that are
+    rejected straight away so that queues cannot grow with the load. The
+    last cheap_reserve slots only go to cheap requests, and waiting cheap
+    requests are admitted before expensive ones: canned and local answers
+    keep flowing while the translate and search paths are saturated.
+    """
+
+    def __init__(self, max_in_flight=32, max_queued=64, queue_timeout=2.0, cheap_reserve=4):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.cheap_reserve = min(cheap_reserve, max_in_flight - 1)
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.waiting = {True: 0, False: 0}
+        self.admitted = {True: 0, False: 0}
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_in_flight = 0
+
+    def _has_slot(self, cheap):
+        """Whether a request can start now; the condition's lock must be held"""
+        if cheap:
+            return self.in_flight < self.max_in_flight
+        return self.in_flight < self.max_in_flight - self.cheap_reserve and not self.waiting[True]
+
+    def _start(self, cheap):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self.admitted[cheap] += 1
+        return Ticket(self)
+
+    def try_admit(self, cheap=False):
+        """Return a Ticket if a slot is free right now, else None, without queueing or counting a rejection"""
+        with self.condition:
+            if self._has_slot(cheap):
+                return self._start(cheap)
+        return None
+
+    def admit(self, cheap=False, timeout=None):
+        """Return a Ticket for a slot, or None if the queue is full or no slot frees up in time.
+
+        timeout caps the wait below queue_timeout, for requests with a shorter deadline.
+        """
+        timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        with self.condition:
+            if self._has_slot(cheap):
+                return self._start(cheap)
+            if self.waiting[True] + self.waiting[False] >= self.max_queued or timeout <= 0:
+                self.rejected += 1
+                return None
+
+            self.waiting[cheap] += 1
+            try:
+                if self.condition.wait_for(lambda: self._has_slot(cheap), timeout):
+                    return self._start(cheap)
+            finally:
+                self.waiting[cheap] -= 1
+                # Expensive requests may have been waiting on this cheap one
+                self.condition.notify_all()
+            self.timed_out += 1
+            return None
+
+    def _release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def stats(self):
+        """Return the limits, current load and admitted/rejected counters"""
+        with self.condition:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queued': self.max_queued,
+                'queue_timeout': self.queue_timeout,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'waiting': self.waiting[True] + self.waiting[False],
+                'admitted_cheap': self.admitted[True],
+                'admitted_expensive': self.admitted[False],
+                'rejected_queue_full': self.rejected,
+                'rejected_timeout': self.timed_out,
+            }
@@ -1,52 +1,167 @@
 import os
 import json
 import random
+import hashlib
+import time
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from deep_translator import GoogleTranslator
-import requests
+from urllib.parse import urlencode
 from dotenv import load_dotenv
-import re
+from werkzeug.http import parse_options_header
 
 # Load environment variables
 load_dotenv('.env.production')
 
+from dataset import Dataset, DEFAULT_DATA_PATH, DEFAULT_COLLEGES_PATH
+from college_index import COURSE_FAMILIES, POSTINGS
+from name_index import NameIndex
+from translation_cache import (LANGUAGES, translate_segments, translate_segments_many, translate_text, translate_texts,
+                               translation_cache)
+from response_catalogue import ResponseCatalogue
+from response_memo import ResponseMemo
+from session_store import SessionStore
+from search_cache import search_cache, normalize_query
+from upload_store import UploadStore, UploadTooLarge
+from upstream import search_upstream, upstreams
+from performance_monitor import performance_monitor, metric_lines
+from college_ingest import CollegeIngestor, upload_format
+from language_detector import LanguageDetector
+from admission_control import AdmissionController, RateLimiter, retry_after
+from renderers import (GREETINGS, SUGGESTIONS, greeting_prefix, time_of_day, text, join_segments, with_greeting,
+                       maharashtra_heading, render_top_colleges, render_maharashtra_colleges, render_exams,
+                       render_scholarships, render_admission, render_local_answer, render_named, render_suggestions,
+                       render_search_results, structured_record)
+
 app = Flask(__name__)
 CORS(app)
 
-# Load Indian education data
-data_path = os.path.join(os.path.dirname(__file__), 'data', 'indian_education_data.json')
-with open(data_path, 'r', encoding='utf-8') as f:
-    indian_education_data = json.load(f)
+# Load, index and pre-render the data files; a watcher swaps in a new snapshot when they change
+data_path = DEFAULT_DATA_PATH
+maharashtra_colleges_path = DEFAULT_COLLEGES_PATH
+dataset = Dataset(data_path, maharashtra_colleges_path)
+dataset.watch(float(os.getenv('DATA_RELOAD_INTERVAL', '5')))
 
-# Load Maharashtra college data if available
-maharashtra_colleges_path = os.path.join(os.path.dirname(__file__), 'data', 'maharashtra_colleges.json')
-maharashtra_colleges = []
-if os.path.exists(maharashtra_colleges_path):
-    try:
-        with open(maharashtra_colleges_path, 'r', encoding='utf-8') as f:
-            maharashtra_colleges = json.load(f)
-        print(f"Loaded {len(maharashtra_colleges)} Maharashtra colleges")
-    except Exception as e:
-        print(f"Error loading Maharashtra colleges: {str(e)}")
-
-# Initialize conversation history
-conversation_history = []
-
-# Language codes and names
-LANGUAGES = {
-    'en': 'English',
-    'hi': 'Hindi',
-    'ta': 'Tamil',
-    'te': 'Telugu',
-    'bn': 'Bengali',
-    'mr': 'Marathi',
-    'gu': 'Gujarati',
-    'kn': 'Kannada',
-    'ml': 'Malayalam',
-    'pa': 'Punjabi'
-}
+# Custom Search endpoint; overridable to point at a local stand-in server.
+# Its timeouts, retries and circuit breaker are set in upstream.py (SEARCH_TIMEOUT etc.)
+SEARCH_API_URL = os.getenv('GOOGLE_SEARCH_URL', 'https://www.googleapis.com/customsearch/v1')
+
+# Conversation history per client session, bounded per session and overall
+session_store = SessionStore.from_config(os.getenv('SESSION_BACKEND'))
+
+# Largest number of messages accepted by /api/chat/batch
+CHAT_BATCH_LIMIT = int(os.getenv('CHAT_BATCH_LIMIT', '50'))
+
+# Uploaded files, stored once per distinct content
+upload_store = UploadStore(max_bytes=int(os.getenv('MAX_UPLOAD_BYTES', str(20 * 2**20))))
+
+# Uploaded college lists are parsed and merged into the live data in the background
+college_ingestor = CollegeIngestor(dataset, workers=int(os.getenv('INGEST_WORKERS', '2')),
+                                   max_queued=int(os.getenv('INGEST_QUEUE_SIZE', '16')))
+
+# Offline detection for messages sent with language 'auto'
+language_detector = LanguageDetector()
+
+# Requests per second and burst allowed per client address, and how many chat
+# requests may be answered or wait at once; beyond these, 429 or 503 with Retry-After
+rate_limiter = RateLimiter(rate=float(os.getenv('RATE_LIMIT_PER_SECOND', '5')),
+                           burst=int(os.getenv('RATE_LIMIT_BURST', '20')))
+admission = AdmissionController(max_in_flight=int(os.getenv('MAX_IN_FLIGHT', '32')),
+                                max_queued=int(os.getenv('MAX_QUEUED', '64')),
+                                queue_timeout=float(os.getenv('QUEUE_TIMEOUT', '2')))
+
+# Rendered and translated answer bodies, keyed by (query, language, dataset version)
+response_memo = ResponseMemo()
+
+# Serve static answers pre-translated; rebuild in the background if the data changed
+response_catalogue = ResponseCatalogue(data_path=data_path)
+response_catalogue.ensure_fresh(list(LANGUAGES), translate_segments)
+
+def on_data_reload(old, new):
+    """Carry over the memoized answers the new data leaves as they were, and refresh the catalogue"""
+    if new.base_version == old.base_version:
+        # Colleges were merged in: only answers listing or naming colleges can change
+        stale = merge_changes(old, new)
+        response_memo.rekey(lambda key, answer: None if key[2] != old.version or stale(answer['scope'])
+                            else key[:2] + (new.version,))
+    else:
+        response_memo.clear()
+    if old.file_hashes.get(data_path) != new.file_hashes.get(data_path):
+        response_catalogue.ensure_fresh(list(LANGUAGES), translate_segments)
+
+dataset.on_swap(on_data_reload)
+
+def merge_changes(old, new):
+    """Return stale(scope): whether merging colleges into old, giving new, changes an answer with that scope"""
+    changed = new.maharashtra_index.changed
+    # Listings fall back to the first five colleges when nothing matches
+    few = len(old.maharashtra_colleges) < 5
+    names = NameIndex()
+    for i, college in enumerate(new.maharashtra_colleges[len(old.maharashtra_colleges):]):
+        names.add([college['name']], i)
+    named = {}
+
+    def stale(scope):
+        filters = scope['filters']
+        if filters is not None and (few or all(value is None or (postings, value) in changed
+                                               for postings, value in zip(POSTINGS, filters))):
+            return True
+        query = scope['query']
+        if query is None:
+            return False
+        if query not in named:
+            named[query] = names.best(query) is not None
+        return named[query]
+
+    return stale
+
+def memo_scope(query, route):
+    """Return what of the ingestable data an answer depends on: the college listing filters and the query names"""
+    filters = None
+    if route['intent'] == 'college' and route['maharashtra'] and not route.get('named') and not route.get('local'):
+        field = route['fields']['college']
+        filters = (route['city'], field if field in COURSE_FAMILIES else None, route['type'])
+    # Queries of these intents are looked up by name, so a new college can take them over
+    named = route.get('named') or route['intent'] in ('general', 'college', 'exam')
+    return {'filters': filters, 'query': query if named else None}
+
+@app.before_request
+def pin_dataset():
+    """Serve the whole request, including streamed responses, from one data snapshot"""
+    g.dataset_token = dataset.pin()
+
+@app.teardown_request
+def unpin_dataset(exc=None):
+    token = g.pop('dataset_token', None)
+    if token is not None:
+        dataset.unpin(token)
+
+@app.before_request
+def start_request_timer():
+    """Count the request as in flight and time it until teardown, after any streamed body"""
+    g.request_start = time.perf_counter()
+    performance_monitor.request_started()
+
+@app.after_request
+def note_status(response):
+    g.status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request(exc=None):
+    """Record the request's latency, labeled by the intent and language the chat views set"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        performance_monitor.request_finished(request.endpoint or 'unknown', g.get('intent', 'none'),
+                                             g.get('language', 'none'), 500 if exc else g.get('status', 500),
+                                             time.perf_counter() - start)
+
+def language_label(lang):
+    """Return the metrics label for a client-supplied language: a code from LANGUAGES, else 'other'.
+    
+    Every label value adds series to the request histogram, so clients must not be able to make up new ones.
+    """
+    return lang if isinstance(lang, str) and lang in LANGUAGES else 'other'
 
 @app.route('/api/languages', methods=['GET'])
 def get_languages():
@@ -55,6 +170,10 @@ def get_languages():
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
+        limited = rate_limit_response()
+        if limited:
+            return limited
+        
         if not request.is_json:
             print("ERROR: Received non-JSON request")
             return jsonify({"error": "Request must be JSON"}), 400
@@ -64,456 +183,863 @@ def chat():
         
         message = data.get('message', '')
         user_lang = data.get('language', 'en')
-        
-        # Add user message to conversation history
-        conversation_history.append({'role': 'user', 'content': message})
-        
-        # Keep only the last 10 messages for context
-        if len(conversation_history) > 10:
-            conversation_history.pop(0)
+        session_id = get_session_id(data)
+        known_ids = data.get('known_ids') or []
+        if not isinstance(known_ids, list) or not all(isinstance(record_id, str) for record_id in known_ids):
+            return jsonify({"error": "known_ids must be a list of record id strings"}), 400
         
         # Detect language if not specified
         if user_lang == 'auto':
-            try:
-                # deep-translator doesn't have a direct detect method, so we'll default to English
-                user_lang = 'en'
-            except:
-                user_lang = 'en'
+            user_lang = language_detector.detect(message)
         
-        # Check for common queries first
-        response = check_common_queries(message.lower())
+        # Turn the request away now rather than queue it behind slower ones
+        g.language = language_label(user_lang)
+        route = route_message(message)
+        ticket, busy = admit_request(is_cheap(message, user_lang, route))
+        if busy:
+            return busy
         
-        # If not a common query, search for educational information
-        if not response:
-            # Translate to English for processing if needed
-            query = message
-            if user_lang != 'en':
-                try:
-                    translator = GoogleTranslator(source=user_lang, target='en')
-                    query = translator.translate(message)
-                except:
-                    pass
-            
-            # Process the query to find relevant information
-            response = process_educational_query(query)
+        # Add user message to this session's history (the last 10 messages are kept)
+        session_store.add_message(session_id, 'user', message)
         
-        # Translate response if needed
-        if user_lang != 'en':
-            try:
-                translator = GoogleTranslator(source='en', target=user_lang)
-                response = translator.translate(response)
-            except:
-                pass
+        with ticket:
+            # Check for common queries first
+            response = common_answer(route, user_lang)
+            
+            # Records as data, with only the labels translated
+            if data.get('format') == 'structured':
+                result = structured_answer(message, user_lang, route, response, known_ids)
+                session_store.add_message(session_id, 'assistant', result.get('text') or result['heading'])
+                result['session_id'] = session_id
+                return jsonify(result)
+            
+            if response:
+                etag = hashlib.sha1(f"{user_lang}:{response}".encode('utf-8')).hexdigest()[:20]
+            else:
+                # Repeat questions are a dictionary lookup; only the greeting and suggestions vary
+                memo_key = (normalize_query(message), user_lang, dataset.current().version)
+                answer = response_memo.get(memo_key)
+                if answer is None:
+                    answer = answer_query(message, user_lang, route)
+                    if answer['cacheable']:
+                        response_memo.set(memo_key, answer)
+                response = decorate_answer(answer, user_lang)
+                etag = f"{answer['etag']}-{time_of_day()}"
         
         # Add assistant response to conversation history
-        conversation_history.append({'role': 'assistant', 'content': response})
+        session_store.add_message(session_id, 'assistant', response)
+        
+        # Clients that already hold this answer get an empty 304
+        if request.if_none_match.contains_weak(etag):
+            not_modified = app.response_class(status=304)
+            not_modified.set_etag(etag, weak=True)
+            return not_modified
         
-        return jsonify({
+        result = jsonify({
             'response': response,
-            'language': user_lang
+            'language': user_lang,
+            'session_id': session_id
         })
+        result.set_etag(etag, weak=True)
+        return result
         
     except Exception as e:
         print(f"API CRASH: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-def check_common_queries(message):
-    """Check if the message matches any common queries and return a predefined response"""
-    # Check greetings
-    for greeting, response in indian_education_data['common_queries']['greetings'].items():
-        if greeting in message:
-            return response
+@app.route('/api/chat/stream', methods=['GET', 'POST'])
+def chat_stream():
+    """Stream a chat answer as Server-Sent Events, one rendered block at a time.
     
-    # Check general queries
-    for query, response in indian_education_data['common_queries']['general'].items():
-        if query in message:
-            return response
+    Takes the /api/chat JSON payload, or query parameters for EventSource clients.
+    """
+    limited = rate_limit_response()
+    if limited:
+        return limited
     
-    return None
+    if request.method == 'POST':
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+        data = request.get_json()
+    else:
+        data = request.args
+    
+    ticket = None
+    try:
+        message = data.get('message', '')
+        user_lang = data.get('language', 'en')
+        if user_lang == 'auto':
+            user_lang = language_detector.detect(message)
+        g.language = language_label(user_lang)
+        route = route_message(message)
+        ticket, busy = admit_request(is_cheap(message, user_lang, route))
+        if busy:
+            return busy
+        session_id = get_session_id(data)
+        session_store.add_message(session_id, 'user', message)
+    except Exception as e:
+        print(f"API CRASH: {str(e)}")
+        if ticket is not None:
+            ticket.release()
+        # Sent like a failure mid-answer: EventSource clients only read events from a 200 event stream
+        return Response(sse_event('error', {'error': 'Internal server error'}), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    
+    response = Response(stream_with_context(stream_answer(message, user_lang, session_id, route)),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The slot is held until the stream ends or the client goes away
+    response.call_on_close(ticket.release)
+    return response
 
-def process_educational_query(query):
-    """Process educational queries related to Indian colleges, exams, etc."""
-    # Get current time for greetings
-    current_hour = datetime.now().hour
-    greeting = "Good morning! " if 5 <= current_hour < 12 else "Good afternoon! " if 12 <= current_hour < 17 else "Good evening! "
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_answer(message, user_lang, session_id, route):
+    """Yield the SSE events for an answer and record it in the session history"""
+    yield sse_event('meta', {'language': user_lang, 'session_id': session_id})
     
-    # Check for college-related queries
-    if any(keyword in query.lower() for keyword in ['college', 'university', 'institute', 'iit', 'nit', 'aiims', 'iim']):
-        return process_college_query(query, greeting)
+    chunks = []
+    try:
+        for chunk in answer_chunks(message, user_lang, route):
+            chunks.append(chunk)
+            yield sse_event('chunk', {'text': chunk})
+    except Exception as e:
+        print(f"API CRASH: {str(e)}")
+        yield sse_event('error', {'error': 'Internal server error'})
+        return
     
-    # Check for exam-related queries
-    elif any(keyword in query.lower() for keyword in ['exam', 'entrance', 'jee', 'neet', 'cat', 'xat', 'bitsat']):
-        return process_exam_query(query, greeting)
+    session_store.add_message(session_id, 'assistant', ''.join(chunks))
+    yield sse_event('done', {})
+
+def answer_chunks(message, user_lang, route):
+    """Yield an answer in pieces: the greeting first, then each block once it is translated"""
+    response = common_answer(route, user_lang)
+    if response:
+        yield response
+        return
     
-    # Check for scholarship-related queries
-    elif any(keyword in query.lower() for keyword in ['scholarship', 'financial aid', 'funding', 'stipend']):
-        return process_scholarship_query(query, greeting)
+    yield localized_greeting(user_lang) + " "
     
-    # Check for admission-related queries
-    elif any(keyword in query.lower() for keyword in ['admission', 'apply', 'application', 'form', 'deadline', 'cutoff']):
-        return process_admission_query(query, greeting)
+    memo_key = (normalize_query(message), user_lang, dataset.current().version)
+    answer = response_memo.get(memo_key)
+    if answer is not None:
+        yield answer['body']
+        if answer['suggestions']:
+            yield localized_suggestions(user_lang)
+        return
     
-    # If no specific category is matched, perform a general search
+    query, route, cacheable = english_query(message, user_lang, route)
+    body = response_catalogue.answer_body(route, user_lang)
+    suggestions = False
+    
+    if body is not None:
+        yield body
     else:
-        return perform_general_search(query, greeting)
+        blocks, suggestions, complete = render_answer(query, route)
+        cacheable = cacheable and complete
+        parts = []
+        for block in blocks:
+            part, translated = translate_blocks([block], user_lang)
+            cacheable = cacheable and translated
+            parts.append(part)
+            yield part
+        body = ''.join(parts)
+        
+        if suggestions:
+            yield localized_suggestions(user_lang)
+    
+    if cacheable:
+        response_memo.set(memo_key, make_answer(body, suggestions, cacheable, user_lang, memo_scope(query, route)))
 
-def process_college_query(query, greeting):
-    """Process queries related to colleges and universities"""
-    response = f"{greeting}Here's what I found about Indian colleges and universities related to your query:\n\n"
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer several chat messages, each with its own language and session, in one request"""
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
     
-    # Check for Maharashtra specific queries
-    if any(keyword in query.lower() for keyword in ['maharashtra', 'mumbai', 'pune', 'nagpur', 'aurangabad']):
-        return process_maharashtra_college_query(query, greeting)
-    
-    # Check for specific fields
-    if any(keyword in query.lower() for keyword in ['engineering', 'tech', 'b.tech', 'm.tech']):
-        colleges = indian_education_data['top_colleges']['engineering']
-        field = "engineering"
-    elif any(keyword in query.lower() for keyword in ['medical', 'mbbs', 'doctor', 'medicine']):
-        colleges = indian_education_data['top_colleges']['medical']
-        field = "medical"
-    elif any(keyword in query.lower() for keyword in ['management', 'mba', 'business', 'pgdm']):
-        colleges = indian_education_data['top_colleges']['management']
-        field = "management"
-    elif any(keyword in query.lower() for keyword in ['arts', 'science', 'ba', 'bsc', 'ma', 'msc']):
-        colleges = indian_education_data['top_colleges']['arts_and_science']
-        field = "arts and science"
-    else:
-        # If no specific field, combine top colleges from all fields
-        colleges = []
-        for field_colleges in indian_education_data['top_colleges'].values():
-            colleges.extend(field_colleges[:2])  # Take top 2 from each field
-        field = "various fields"
+    messages = (request.get_json() or {}).get('messages')
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "messages must be a non-empty list"}), 400
+    if len(messages) > CHAT_BATCH_LIMIT:
+        return jsonify({"error": f"At most {CHAT_BATCH_LIMIT} messages per batch"}), 400
     
-    response += f"Top colleges for {field} in India:\n\n"
+    # A batch counts against the client's rate once per message
+    limited = rate_limit_response(len(messages))
+    if limited:
+        return limited
+    ticket, busy = admit_request(cheap=False)
+    if busy:
+        return busy
     
-    # Add college information
-    for i, college in enumerate(colleges[:5], 1):
-        response += f"{i}. {college['name']} ({college['location']})\n"
-        response += f"   • Ranking: {college['ranking']}\n"
-        response += f"   • Admission: {college['admission_process']}\n"
-        response += f"   • Fees: {college['fees']}\n"
-        response += f"   • Website: {college['website']}\n\n"
+    with ticket:
+        results = answer_batch_messages(messages)
     
-    response += "Would you like more specific information about any of these colleges or a different field?"
+    languages = {language_label(entry.get('language', 'en')) for entry in messages if isinstance(entry, dict)}
+    g.intent = 'batch'
+    g.language = languages.pop() if len(languages) == 1 else 'mixed'
+    return jsonify({'results': results})
+
+def answer_batch_messages(messages):
+    """Return the /api/chat/batch result for each message entry, recording them in the sessions"""
+    items = []
+    for entry in messages:
+        if not isinstance(entry, dict) or not isinstance(entry.get('message', ''), str):
+            items.append(None)
+            continue
+        user_lang = entry.get('language', 'en')
+        if user_lang == 'auto':
+            user_lang = language_detector.detect(entry.get('message', ''))
+        session_id = get_session_id(entry)
+        session_store.add_message(session_id, 'user', entry.get('message', ''))
+        items.append((entry.get('message', ''), user_lang, session_id))
     
-    return response
+    results = []
+    responses = iter(answer_batch([item for item in items if item is not None]))
+    for item in items:
+        if item is None:
+            results.append({'error': 'Each message must be an object with a message string'})
+            continue
+        _, user_lang, session_id = item
+        response = next(responses)
+        if isinstance(response, Exception):
+            print(f"API CRASH: {str(response)}")
+            results.append({'error': 'Internal server error', 'session_id': session_id})
+            continue
+        session_store.add_message(session_id, 'assistant', response)
+        results.append({'response': response, 'language': user_lang, 'session_id': session_id})
+    
+    return results
 
-def process_maharashtra_college_query(query, greeting):
-    """Process queries specifically about Maharashtra colleges"""
-    if not maharashtra_colleges:
-        return process_college_query(query, greeting)  # Fallback to general college query
-    
-    response = f"{greeting}Here's what I found about colleges in Maharashtra related to your query:\n\n"
-    
-    # Filter colleges based on query keywords
-    filtered_colleges = maharashtra_colleges
-    
-    # Filter by city if mentioned
-    cities = ['mumbai', 'pune', 'nagpur', 'aurangabad', 'nashik', 'amravati', 'solapur', 'kolhapur', 'thane', 'navi mumbai']
-    for city in cities:
-        if city in query.lower():
-            filtered_colleges = [college for college in filtered_colleges if city in college.get('location', '').lower()]
-            response = f"{greeting}Here's what I found about colleges in {city.title()}, Maharashtra:\n\n"
-            break
-    
-    # Filter by course/field if mentioned
-    if any(keyword in query.lower() for keyword in ['engineering', 'tech', 'b.tech', 'm.tech']):
-        filtered_colleges = [college for college in filtered_colleges if any(course.lower() in ['b.tech', 'engineering', 'b.e.'] for course in (college.get('courses', []) if isinstance(college.get('courses', []), list) else [college.get('courses', '')]))]
-        response = response.replace('colleges in', 'engineering colleges in')
-    elif any(keyword in query.lower() for keyword in ['medical', 'mbbs', 'doctor', 'medicine']):
-        filtered_colleges = [college for college in filtered_colleges if any(course.lower() in ['mbbs', 'medical', 'medicine'] for course in (college.get('courses', []) if isinstance(college.get('courses', []), list) else [college.get('courses', '')]))]
-        response = response.replace('colleges in', 'medical colleges in')
-    elif any(keyword in query.lower() for keyword in ['management', 'mba', 'business', 'pgdm']):
-        filtered_colleges = [college for college in filtered_colleges if any(course.lower() in ['mba', 'management', 'business', 'pgdm'] for course in (college.get('courses', []) if isinstance(college.get('courses', []), list) else [college.get('courses', '')]))]
-        response = response.replace('colleges in', 'management colleges in')
-    
-    # Filter by type if mentioned
-    if 'government' in query.lower() or 'govt' in query.lower():
-        filtered_colleges = [college for college in filtered_colleges if college.get('type', '').lower() in ['government', 'govt', 'public']]
-        response = response.replace('colleges in', 'government colleges in')
-    elif 'private' in query.lower():
-        filtered_colleges = [college for college in filtered_colleges if college.get('type', '').lower() == 'private']
-        response = response.replace('colleges in', 'private colleges in')
-    
-    # Filter by fees if mentioned
-    if 'affordable' in query.lower() or 'cheap' in query.lower() or 'low fee' in query.lower():
-        # Try to extract numeric fee values and filter for lower fees
-        def extract_fee(fee_str):
-            if not fee_str or not isinstance(fee_str, str):
-                return float('inf')
-            import re
-            # Extract numbers from fee string
-            numbers = re.findall(r'(\d+(?:\.\d+)?)', fee_str.replace(',', ''))
-            if numbers:
-                return float(numbers[0])
-            return float('inf')
-        
-        filtered_colleges = sorted(filtered_colleges, key=lambda college: extract_fee(college.get('fees', '')))
-        filtered_colleges = filtered_colleges[:15]  # Take top 15 affordable colleges
-        response = response.replace('colleges in', 'affordable colleges in')
+def answer_batch(items):
+    """Answer (message, language, ...) items together, in order.
+    
+    Identical questions are answered once, and each translation direction
+    costs one batched upstream call per language for the whole batch.
+    A failing message yields its exception instead of a response.
+    """
+    snapshot = dataset.current()
+    results = [None] * len(items)
+    units = {}
+    common = {}
     
-    # Sort by rating if available
-    def get_rating(college):
+    # Route every message; common and memoized answers need no further work
+    for i, (message, user_lang, *_) in enumerate(items):
         try:
-            rating = college.get('rating', '0')
-            if isinstance(rating, str):
-                # Handle NIRF rank (lower is better)
-                if 'nirf' in rating.lower():
-                    match = re.search(r'(\d+)', rating)
-                    if match:
-                        return 1000 - float(match.group(1))  # Invert NIRF rank for sorting
-                
-                # Handle regular ratings (higher is better)
-                rating = rating.replace('/5', '').replace('/10', '').strip()
-                return float(rating)
-            return rating
-        except:
-            return 0
-    
-    filtered_colleges = sorted(filtered_colleges, key=get_rating, reverse=True)
-    
-    # Take top 5 colleges
-    top_colleges = filtered_colleges[:5]
-    
-    if not top_colleges:
-        response += "I couldn't find specific colleges matching your query in Maharashtra. Here are some top colleges in Maharashtra instead:\n\n"
-        top_colleges = maharashtra_colleges[:5]
-    
-    # Add college information
-    for i, college in enumerate(top_colleges, 1):
-        response += f"{i}. {college['name']} ({college.get('location', 'Maharashtra')})\n"
-        
-        # Add source information
-        if 'source' in college:
-            response += f"   • Source: {college['source']}\n"
-        
-        # Add type information
-        if 'type' in college and college['type']:
-            response += f"   • Type: {college['type']}\n"
-        
-        # Add established year
-        if 'established' in college and college['established']:
-            response += f"   • Established: {college['established']}\n"
-        
-        # Add rating information
-        if 'rating' in college and college['rating']:
-            if 'nirf' in str(college['rating']).lower():
-                response += f"   • NIRF Ranking: {college['rating']}\n"
-            else:
-                response += f"   • Rating: {college['rating']}\n"
-        
-        # Add fees information
-        if 'fees' in college and college['fees']:
-            response += f"   • Fees: {college['fees']}\n"
-        
-        # Add courses information
-        if 'courses' in college and college['courses']:
-            if isinstance(college['courses'], list):
-                response += f"   • Courses: {', '.join(college['courses'][:3])}\n"
-            else:
-                response += f"   • Courses: {college['courses']}\n"
-        
-        # Add admission process information
-        if 'admission_process' in college and college['admission_process']:
-            response += f"   • Admission: {college['admission_process']}\n"
-        
-        # Add approval information
-        if 'approved_by' in college and college['approved_by']:
-            if isinstance(college['approved_by'], list):
-                response += f"   • Approved by: {', '.join(college['approved_by'][:3])}\n"
+            route = route_message(message)
+            if route['common']:
+                response = response_catalogue.lookup(f"common:{route['common']}", user_lang)
+                if response:
+                    results[i] = response
+                else:
+                    common.setdefault(user_lang, {})[i] = snapshot.router.common_response(route)
+                continue
+            
+            key = (normalize_query(message), user_lang, snapshot.version)
+            if key not in units:
+                units[key] = {'message': message, 'lang': user_lang, 'route': route,
+                              'answer': response_memo.get(key), 'indexes': []}
+            units[key]['indexes'].append(i)
+        except Exception as e:
+            results[i] = e
+    
+    pending = {key: unit for key, unit in units.items() if unit['answer'] is None}
+    
+    # Translate the questions to English, one batch per language
+    for user_lang, group in group_by_language(pending.values()).items():
+        messages = [unit['message'] for unit in group]
+        translated = user_lang == 'en'
+        if not translated:
+            try:
+                with performance_monitor.stage('translate_in'):
+                    messages = translate_texts(messages, user_lang, 'en')
+                translated = True
+            except Exception as e:
+                print(f"Error translating batch to English: {e}")
+        for unit, query in zip(group, messages):
+            unit['query'] = query
+            unit['cacheable'] = translated
+            if translated and user_lang != 'en':
+                unit['route'] = route_message(query)
+    
+    # Render each distinct question once
+    for unit in pending.values():
+        try:
+            body = response_catalogue.answer_body(unit['route'], unit['lang'])
+            if body is not None:
+                unit['answer'] = make_answer(body, False, unit['cacheable'], unit['lang'],
+                                             memo_scope(unit['query'], unit['route']))
             else:
-                response += f"   • Approved by: {college['approved_by']}\n"
-        
-        # Add address information
-        if 'address' in college and college['address']:
-            response += f"   • Address: {college['address']}\n"
-        
-        # Add website information
-        if 'website' in college and college['website']:
-            response += f"   • Website: {college['website']}\n"
-        
-        response += "\n"
+                unit['blocks'], unit['suggestions'], complete = render_answer(unit['query'], unit['route'])
+                unit['cacheable'] = unit['cacheable'] and complete
+        except Exception as e:
+            unit['error'] = e
     
-    response += "Would you like more specific information about any of these colleges or a different location in Maharashtra?"
+    # Translate the rendered answers and common replies, one batch per language. All the suggestions
+    # go along where any answer gets some, so that decorating each message below finds them cached.
+    rendered = group_by_language(unit for unit in pending.values() if 'blocks' in unit)
+    suggested = {unit['lang'] for unit in units.values()
+                 if unit.get('suggestions') or (unit['answer'] or {}).get('suggestions')}
+    for user_lang in dict.fromkeys([*rendered, *common, *suggested]):
+        group = rendered.get(user_lang, [])
+        answers = common.get(user_lang, {})
+        jobs = [unit['blocks'] for unit in group] + [[[text(answer)]] for answer in answers.values()]
+        if user_lang in suggested:
+            jobs.append(render_suggestions(SUGGESTIONS))
+        bodies, translated = translate_many(jobs, user_lang)
+        for unit, body in zip(group, bodies):
+            unit['answer'] = make_answer(body, unit['suggestions'], unit['cacheable'] and translated, user_lang,
+                                         memo_scope(unit['query'], unit['route']))
+        for i, response in zip(answers, bodies[len(group):]):
+            results[i] = response
     
-    return response
-
-def process_exam_query(query, greeting):
-    """Process queries related to entrance exams"""
-    response = f"{greeting}Here's information about entrance exams in India related to your query:\n\n"
-    
-    # Check for specific exam categories
-    if any(keyword in query.lower() for keyword in ['engineering', 'jee', 'bitsat']):
-        exams = indian_education_data['entrance_exams']['engineering']
-        field = "engineering"
-    elif any(keyword in query.lower() for keyword in ['medical', 'neet', 'aiims']):
-        exams = indian_education_data['entrance_exams']['medical']
-        field = "medical"
-    elif any(keyword in query.lower() for keyword in ['management', 'cat', 'xat', 'mba']):
-        exams = indian_education_data['entrance_exams']['management']
-        field = "management"
-    else:
-        # If no specific field, combine exams from all fields
-        exams = []
-        for field_exams in indian_education_data['entrance_exams'].values():
-            exams.extend(field_exams)
-        field = "various fields"
-    
-    response += f"Important entrance exams for {field} in India:\n\n"
-    
-    # Add exam information
-    for i, exam in enumerate(exams, 1):
-        response += f"{i}. {exam['name']} ({exam['full_name']})\n"
-        response += f"   • Conducted by: {exam['conducting_body']}\n"
-        response += f"   • Eligibility: {exam['eligibility']}\n"
-        response += f"   • Application period: {exam['application_period']}\n"
-        response += f"   • Exam dates: {exam['exam_dates']}\n"
-        response += f"   • Colleges accepting: {exam['colleges']}\n"
-        response += f"   • Website: {exam['website']}\n\n"
-    
-    response += "Do you need more specific details about any of these exams or preparation tips?"
+    for key, unit in pending.items():
+        if unit['answer'] is not None and unit['answer']['cacheable']:
+            response_memo.set(key, unit['answer'])
     
+    # Greetings and suggestions are added per message
+    for unit in units.values():
+        for i in unit['indexes']:
+            try:
+                if 'error' in unit:
+                    raise unit['error']
+                results[i] = decorate_answer(unit['answer'], unit['lang'])
+            except Exception as e:
+                results[i] = e
+    
+    return results
+
+def group_by_language(units):
+    """Group batch units by their language, keeping their order"""
+    groups = {}
+    for unit in units:
+        groups.setdefault(unit['lang'], []).append(unit)
+    return groups
+
+def route_message(message):
+    """Route a message on the pinned snapshot, timed as a stage; the request is labeled with its intent"""
+    with performance_monitor.stage('routing'):
+        route = dataset.current().route(message)
+    g.intent = 'common' if route['common'] else route['intent']
+    return route
+
+def rate_limit_response(cost=1):
+    """Return a 429 response if the client is over its request rate, or None"""
+    wait = rate_limiter.acquire(request.remote_addr or 'anonymous', cost)
+    if not wait:
+        return None
+    response = jsonify({"error": "Too many requests"})
+    response.status_code = 429
+    response.headers['Retry-After'] = retry_after(wait)
     return response
 
-def process_scholarship_query(query, greeting):
-    """Process queries related to scholarships"""
-    response = f"{greeting}Here's information about scholarships available for Indian students:\n\n"
+def admit_request(cheap):
+    """Wait for a slot to answer in; return (ticket, None), or (None, a 503 response) when busy.
     
-    scholarships = indian_education_data['scholarships']
+    Clients can shorten the wait with an X-Request-Timeout header, in seconds.
+    """
+    try:
+        timeout = float(request.headers.get('X-Request-Timeout', admission.queue_timeout))
+    except ValueError:
+        timeout = None
+    ticket = admission.admit(cheap, timeout)
+    if ticket is not None:
+        return ticket, None
+    response = jsonify({"error": "Server busy, try again shortly"})
+    response.status_code = 503
+    response.headers['Retry-After'] = retry_after(admission.queue_timeout)
+    return None, response
+
+def is_cheap(message, user_lang, route):
+    """Whether a message can be answered without translation or search calls"""
+    if route['common']:
+        return True
+    if user_lang == 'en':
+        return route['intent'] != 'general' or bool(route.get('local'))
+    return (normalize_query(message), user_lang, dataset.current().version) in response_memo
+
+def get_session_id(data):
+    """Identify the client session from the payload, a header, or the client address"""
+    session_id = data.get('session_id') or request.headers.get('X-Session-ID')
+    if not session_id:
+        session_id = request.remote_addr or 'anonymous'
+    return str(session_id)[:128]
+
+def common_answer(route, lang):
+    """Return the canned answer to a common query in the user's language, or None"""
+    if not route['common']:
+        return None
     
-    for i, scholarship in enumerate(scholarships, 1):
-        response += f"{i}. {scholarship['name']}\n"
-        response += f"   • Provider: {scholarship['provider']}\n"
-        response += f"   • Eligibility: {scholarship['eligibility']}\n"
-        response += f"   • Amount: {scholarship['amount']}\n"
-        response += f"   • Application period: {scholarship['application_period']}\n"
-        response += f"   • Website: {scholarship['website']}\n\n"
+    response = response_catalogue.lookup(f"common:{route['common']}", lang)
+    if response:
+        return response
     
-    response += "Would you like information about any specific scholarship or eligibility criteria?"
+    response = dataset.current().router.common_response(route)
     
+    # Translate response if needed
+    if response and lang != 'en':
+        try:
+            with performance_monitor.stage('translate_out'):
+                response = translate_text(response, 'en', lang)
+        except Exception as e:
+            print(f"Error translating response: {e}")
     return response
 
-def process_admission_query(query, greeting):
-    """Process queries related to admission processes and deadlines"""
-    response = f"{greeting}Here's information about admission processes and timelines in India:\n\n"
-    
-    # Check for specific fields
-    if any(keyword in query.lower() for keyword in ['engineering', 'tech', 'b.tech', 'm.tech']):
-        calendar = indian_education_data['admission_calendar']['engineering']
-        field = "engineering"
-    elif any(keyword in query.lower() for keyword in ['medical', 'mbbs', 'doctor', 'medicine']):
-        calendar = indian_education_data['admission_calendar']['medical']
-        field = "medical"
-    elif any(keyword in query.lower() for keyword in ['management', 'mba', 'business', 'pgdm']):
-        calendar = indian_education_data['admission_calendar']['management']
-        field = "management"
+def structured_answer(message, user_lang, route, common=None, known_ids=()):
+    """Answer with the matching records as data instead of prose.
+    
+    Records carry stable IDs for the dataset version; records whose ID the
+    client lists in known_ids are sent as bare references. Field labels are
+    sent once, translated, in 'labels'.
+    """
+    snapshot = dataset.current()
+    result = {
+        'format': 'structured',
+        'language': user_lang,
+        'dataset_version': snapshot.version,
+        'intent': 'general' if common else route['intent'],
+        'field': None,
+        'greeting': None,
+        'heading': None,
+        'records': [],
+        'labels': {},
+        'closing': None,
+    }
+    if common:
+        result['text'] = common
+        return result
+    
+    query, route, _ = english_query(message, user_lang, route)
+    result['intent'] = route['intent']
+    result['field'] = route['fields'].get(route['intent'])
+    result['greeting'] = localized_greeting(user_lang)
+    
+    records = []
+    def collect(render, record):
+        records.append((render, record))
+        return snapshot.fragments.fragment(render, record)
+    
+    if route['intent'] in ('college', 'exam', 'scholarship') or route.get('local'):
+        with performance_monitor.stage(render_stage(route)):
+            blocks = process_educational_query(query, route, greeting='', fragment=collect)
     else:
-        # If no specific field, provide general admission information
-        response += "General admission timeline for various fields:\n\n"
-        for field, calendar in indian_education_data['admission_calendar'].items():
-            response += f"For {field.capitalize()} courses:\n"
-            for event, timeline in calendar.items():
-                response += f"   • {event}: {timeline}\n"
-            response += "\n"
+        blocks = render_answer(query, route)[0]
+    
+    if not records:
+        result['text'] = translate_blocks(blocks, user_lang)[0]
+        return result
+    
+    known_ids = set(known_ids)
+    labels = {}
+    for render, record in records:
+        record_id = snapshot.fragments.key(record)
+        if record_id is not None and record_id in known_ids:
+            result['records'].append({'id': record_id})
+            continue
+        data, record_labels = structured_record(render, record)
+        result['records'].append(dict(id=record_id, **data))
+        labels.update(record_labels)
+    
+    # Translate the heading, closing line and field labels in one batch
+    responses = [[blocks[0]], [blocks[-1]]] + [[[text(label)]] for label in labels.values()]
+    texts = translate_many(responses, user_lang)[0]
+    result['heading'] = texts[0].strip()
+    result['closing'] = texts[1].strip()
+    result['labels'] = dict(zip(labels, texts[2:]))
+    return result
+
+def english_query(message, user_lang, route):
+    """Translate a message to English for processing and route it again.
+    
+    Returns the query, its route and whether the translation succeeded.
+    """
+    if user_lang == 'en':
+        return message, route, True
+    try:
+        with performance_monitor.stage('translate_in'):
+            query = translate_text(message, user_lang, 'en')
+        return query, route_message(query), True
+    except Exception as e:
+        print(f"Error translating query: {e}")
+        return message, route, False
+
+def answer_query(message, user_lang, route):
+    """Produce the answer body in the user's language, without greeting or suggestions.
+    
+    The result may be memoized unless a translation or search call failed.
+    """
+    query, route, cacheable = english_query(message, user_lang, route)
+    
+    # Static answers come pre-translated from the catalogue
+    body = response_catalogue.answer_body(route, user_lang)
+    suggestions = False
+    
+    if body is None:
+        blocks, suggestions, complete = render_answer(query, route)
         
-        response += "Would you like more specific information about admission processes for a particular field or college?"
-        return response
+        # Translate only the text segments that are not cached yet
+        body, translated = translate_blocks(blocks, user_lang)
+        cacheable = cacheable and complete and translated
     
-    response += f"Admission timeline for {field} courses in India:\n\n"
+    return make_answer(body, suggestions, cacheable, user_lang, memo_scope(query, route))
+
+def make_answer(body, suggestions, cacheable, user_lang, scope):
+    """Bundle an answer body with its ETag and memo_scope for the response memo"""
+    return {
+        'body': body,
+        'suggestions': suggestions,
+        'cacheable': cacheable,
+        'scope': scope,
+        'etag': hashlib.sha1(f"{dataset.current().version}:{user_lang}:{body}".encode('utf-8')).hexdigest()[:20]
+    }
+
+def render_answer(query, route):
+    """Render an answer without the greeting or follow-up suggestions.
+    
+    Returns the blocks, whether suggestions should be appended, and whether
+    the search (if any) succeeded.
+    """
+    if route['intent'] != 'general' or route.get('local'):
+        with performance_monitor.stage(render_stage(route)):
+            return process_educational_query(query, route, greeting=''), False, True
     
-    for event, timeline in calendar.items():
-        response += f"• {event}: {timeline}\n"
+    search_results = get_search_results(query)
+    if search_results is None:
+        return [[text(search_fallback(''))]], False, search_url(query) is None
+    
+    found = bool(search_results.get('items'))
+    with performance_monitor.stage('render_search'):
+        return render_search_results(query, search_results), found, True
+
+def render_stage(route):
+    """Name the stage timer for rendering a route's answer"""
+    if route.get('named'):
+        return 'render_named'
+    if route.get('local'):
+        return 'render_local'
+    return f"render_{route['intent']}"
+
+def translate_blocks(blocks, lang):
+    """Translate rendered blocks, falling back to English.
     
-    response += "\nWould you like more specific information about admission processes for a particular college?"
+    Returns the text and whether it is in the requested language.
+    """
+    texts, translated = translate_many([blocks], lang)
+    return texts[0], translated
+
+def translate_many(responses, lang):
+    """Translate several rendered responses in one batch, falling back to English.
     
+    Returns the texts and whether they are in the requested language.
+    Record fragments reuse their cached translation for the language.
+    """
+    if lang != 'en':
+        try:
+            translate = lambda jobs: translate_segments_many(jobs, 'en', lang)
+            with performance_monitor.stage('translate_out'):
+                return dataset.current().fragments.translate(responses, lang, translate), True
+        except Exception as e:
+            print(f"Error translating batch from English: {e}")
+    return [join_segments(blocks) for blocks in responses], lang == 'en'
+
+def localized_greeting(lang):
+    """Return the time-of-day greeting in the user's language"""
+    period = time_of_day()
+    greeting = response_catalogue.lookup(f"greeting:{period}", lang)
+    if greeting is None:
+        greeting = translate_blocks([[text(GREETINGS[period])]], lang)[0]
+    return greeting
+
+def localized_suggestions(lang):
+    """Return three random follow-up suggestions in the user's language"""
+    return translate_blocks(render_suggestions(random.sample(SUGGESTIONS, 3)), lang)[0]
+
+def decorate_answer(answer, lang):
+    """Add the time-of-day greeting and random suggestions to an answer body"""
+    response = f"{localized_greeting(lang)} {answer['body']}"
+    if answer['suggestions']:
+        response += localized_suggestions(lang)
     return response
 
-def perform_general_search(query, greeting):
-    """Perform a general search for educational information"""
-    # For general queries, try to use Google Custom Search API if available
+def process_educational_query(query, route=None, greeting=None, fragment=None):
+    """Process educational queries related to Indian colleges, exams, etc.
+
+    Returns the response as rendered blocks of segments, see renderers.py.
+    Record blocks come from the fragment store unless another fragment hook is given.
+    """
+    # Get current time for greetings
+    if greeting is None:
+        greeting = greeting_prefix()
+    
+    if fragment is None:
+        fragment = dataset.current().fragments.fragment
+    
+    # Tokenize and match the query once; the renderers reuse the route
+    if route is None:
+        route = dataset.current().route(query)
+    
+    # A college or exam asked about by name gets its own record rather than a listing
+    if route.get('named'):
+        render, record = route['named']
+        return with_greeting(greeting, render_named(render, record, fragment))
+    
+    # General questions the local records answer skip the web search
+    if route.get('local'):
+        return with_greeting(greeting, render_local_answer(route['local'], fragment))
+    
+    if route['intent'] == 'college':
+        return process_college_query(query, greeting, route, fragment)
+    elif route['intent'] == 'exam':
+        return process_exam_query(query, greeting, route, fragment)
+    elif route['intent'] == 'scholarship':
+        return process_scholarship_query(query, greeting, route, fragment)
+    elif route['intent'] == 'admission':
+        return process_admission_query(query, greeting, route)
+    
+    # If no specific category is matched, perform a general search
+    else:
+        return [[text(perform_general_search(query, greeting))]]
+
+def process_college_query(query, greeting, route=None, fragment=None):
+    """Process queries related to colleges and universities"""
+    snapshot = dataset.current()
+    if route is None:
+        route = snapshot.route(query)
+    
+    # Check for Maharashtra specific queries
+    if route['maharashtra']:
+        return process_maharashtra_college_query(query, greeting, route, fragment)
+    
+    return with_greeting(greeting, render_top_colleges(snapshot.education_data, route['fields']['college'],
+                                                         fragment=fragment or snapshot.fragments.fragment))
+
+def process_maharashtra_college_query(query, greeting, route=None, fragment=None):
+    """Process queries specifically about Maharashtra colleges"""
+    snapshot = dataset.current()
+    if route is None:
+        route = snapshot.route(query)
+    
+    if not snapshot.maharashtra_colleges:
+        return process_college_query(query, greeting, dict(route, maharashtra=False), fragment)  # Fallback to general college query
+    
+    # Intersect the index posting lists and take the top 5 by rating
+    top_colleges = snapshot.maharashtra_index.search(
+        city=route['city'],
+        field=route['fields']['college'],
+        college_type=route['type'],
+        affordable=route['affordable'],
+        limit=5
+    )
+    
+    blocks = render_maharashtra_colleges(maharashtra_heading(route), top_colleges, snapshot.maharashtra_colleges[:5],
+                                         fragment=fragment or snapshot.fragments.fragment)
+    return with_greeting(greeting, blocks)
+
+def process_exam_query(query, greeting, route=None, fragment=None):
+    """Process queries related to entrance exams"""
+    snapshot = dataset.current()
+    if route is None:
+        route = snapshot.route(query)
+    
+    return with_greeting(greeting, render_exams(snapshot.education_data, route['fields']['exam'],
+                                                  fragment=fragment or snapshot.fragments.fragment))
+
+def process_scholarship_query(query, greeting, route=None, fragment=None):
+    """Process queries related to scholarships"""
+    snapshot = dataset.current()
+    return with_greeting(greeting, render_scholarships(snapshot.education_data,
+                                                         fragment=fragment or snapshot.fragments.fragment))
+
+def process_admission_query(query, greeting, route=None):
+    """Process queries related to admission processes and deadlines"""
+    snapshot = dataset.current()
+    if route is None:
+        route = snapshot.route(query)
+    
+    return with_greeting(greeting, render_admission(snapshot.education_data, route['fields']['admission']))
+
+def search_url(query):
+    """Build the Google Custom Search URL for a query, or None if search is not configured"""
     api_key = os.getenv('GOOGLE_API_KEY')
     search_engine_id = os.getenv('GOOGLE_SEARCH_ENGINE_ID')
     
-    if api_key and search_engine_id:
+    if not (api_key and search_engine_id):
+        return None
+    
+    # Add India-specific terms to the query
+    india_query = f"{query} India education college university"
+    params = urlencode({'key': api_key, 'cx': search_engine_id, 'q': india_query})
+    return f"{SEARCH_API_URL}?{params}"
+
+def search_fallback(greeting):
+    """Response used when search is unavailable or fails"""
+    return f"{greeting}I don't have specific information about that query. Please ask about Indian colleges, entrance exams, scholarships, or admission processes for more detailed information."
+
+def fetch_search_results(url):
+    """Call the Custom Search API and return its JSON results"""
+    return search_upstream.get(url).json()
+
+def get_search_results(query):
+    """Return Custom Search results for a query, or None if search is unavailable or fails"""
+    # For general queries, try to use Google Custom Search API if available
+    url = search_url(query)
+    
+    if url:
         try:
-            # Add India-specific terms to the query
-            india_query = f"{query} India education college university"
-            
-            # Make the API request
-            url = f"https://www.googleapis.com/customsearch/v1?key={api_key}&cx={search_engine_id}&q={india_query}"
-            response = requests.get(url)
-            search_results = response.json()
-            
-            # Format the response
-            return format_search_results(query, search_results, greeting)
+            # Identical queries share cached results and one in-flight API request
+            with performance_monitor.stage('search'):
+                return search_cache.get_or_fetch(query, lambda: fetch_search_results(url))
         except Exception as e:
             print(f"Error in Google search: {e}")
+            # While search is failing, an expired answer beats none
+            return search_cache.stale(query)
+    
+    return None
+
+def perform_general_search(query, greeting):
+    """Perform a general search for educational information"""
+    search_results = get_search_results(query)
     
     # Fallback response if API call fails or keys are not available
-    return f"{greeting}I don't have specific information about that query. Please ask about Indian colleges, entrance exams, scholarships, or admission processes for more detailed information."
+    if search_results is None:
+        return search_fallback(greeting)
+    
+    # Format the response
+    return format_search_results(query, search_results, greeting)
 
-def format_search_results(query, search_results, greeting):
+def format_search_results(query, search_results, greeting, suggestions=True):
     """Format search results into a structured response"""
-    if 'items' not in search_results or not search_results['items']:
-        return f"{greeting}I couldn't find specific information about '{query}' in the context of Indian education. Please try asking about specific colleges, exams, or admission processes."
+    response = greeting + join_segments(render_search_results(query, search_results))
     
-    response = f"{greeting}Here's what I found about '{query}' in the Indian education context:\n\n"
-    
-    # Add search results
-    for i, item in enumerate(search_results['items'][:3], 1):
-        title = item.get('title', 'No title')
-        snippet = item.get('snippet', 'No description available')
-        link = item.get('link', '#')
-        
-        response += f"{i}. {title}\n"
-        response += f"   • {snippet}\n"
-        response += f"   • {link}\n\n"
-    
-    # Add follow-up suggestions
-    response += "You might also be interested in:\n"
-    suggestions = [
-        "Top engineering colleges in India",
-        "NEET preparation tips",
-        "JEE Main important dates",
-        "Scholarships for undergraduate students in India",
-        "MBA admission process in IIMs"
-    ]
-    
-    # Select 3 random suggestions
-    selected_suggestions = random.sample(suggestions, 3)
-    for suggestion in selected_suggestions:
-        response += f"• {suggestion}\n"
+    # Add 3 random follow-up suggestions, unless nothing was found
+    if suggestions and search_results.get('items'):
+        response += join_segments(render_suggestions(random.sample(SUGGESTIONS, 3)))
     
     return response
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    # Clients that send the file's sha256 skip the transfer when it is already stored
+    digest = request.headers.get('X-Content-SHA256')
+    file_path = upload_store.find(digest)
+    if file_path:
+        return stored_upload(request.args.get('filename', ''), 'File already uploaded',
+                             (digest.lower(), file_path, os.path.getsize(file_path), True))
+
+    mimetype, options = parse_options_header(request.headers.get('Content-Type', ''))
+    if mimetype != 'multipart/form-data' or not options.get('boundary'):
         return jsonify({'success': False, 'message': 'No file part'})
-    
-    file = request.files['file']
-    
-    if file.filename == '':
+
+    too_large = jsonify({'success': False, 'message': f'File exceeds the {upload_store.max_bytes} byte upload limit'})
+    # Turn away bodies that cannot fit before reading them; multipart framing adds a little
+    if request.content_length and request.content_length > upload_store.max_bytes + 64 * 1024:
+        return too_large, 413
+
+    # Read the body in chunks instead of letting Werkzeug buffer the form
+    try:
+        filename, stored = upload_store.save_multipart(request.stream, options['boundary'].encode('latin-1'))
+    except UploadTooLarge:
+        return too_large, 413
+
+    if filename is None:
+        return jsonify({'success': False, 'message': 'No file part'})
+    if not filename:
         return jsonify({'success': False, 'message': 'No selected file'})
-    
-    # Create uploads directory if it doesn't exist
-    uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-    os.makedirs(uploads_dir, exist_ok=True)
-    
-    # Save the file
-    file_path = os.path.join(uploads_dir, file.filename)
-    file.save(file_path)
-    
-    return jsonify({
+    if stored is None:
+        return jsonify({'success': False, 'message': 'Incomplete upload'}), 400
+
+    return stored_upload(filename, f'File {filename} uploaded successfully', stored)
+
+def stored_upload(filename, message, stored):
+    """Answer a stored upload, queueing it as a college list when ?ingest=colleges is set"""
+    digest, file_path, size, duplicate = stored
+    body = {
         'success': True,
-        'message': f'File {file.filename} uploaded successfully',
-        'file_path': file_path
-    })
+        'message': message,
+        'file_path': file_path,
+        'sha256': digest,
+        'size': size,
+        'duplicate': duplicate
+    }
+    if request.args.get('ingest') != 'colleges':
+        return jsonify(body)
+
+    if upload_format(filename) is None:
+        body.update(success=False, message='College lists must be .csv, .json or .jsonl files')
+        return jsonify(body), 400
+    job = college_ingestor.submit(file_path, filename, digest)
+    if job is None:
+        body.update(success=False, message='Too many college lists are waiting to be ingested, try again later')
+        return jsonify(body), 503
+    body['job'] = job.to_dict()
+    return jsonify(body), 202
+
+@app.route('/api/ingest/<job_id>')
+def ingest_status(job_id):
+    job = college_ingestor.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown ingestion job'}), 404
+    return jsonify(job.to_dict())
 
 @app.route('/api/health')
 def health_check():
     return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()})
 
+@app.route('/api/stats')
+def stats():
+    return jsonify({
+        'translation_cache': translation_cache.stats(),
+        'sessions': session_store.stats(),
+        'search_cache': search_cache.stats(),
+        'response_memo': response_memo.stats(),
+        'fragments': dataset.current().fragments.stats(),
+        'dataset': dataset.stats(),
+        'ingest': college_ingestor.stats(),
+        'rate_limit': rate_limiter.stats(),
+        'admission': admission.stats(),
+        'upstreams': {name: upstream.stats() for name, upstream in upstreams.items()}
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: request and stage latency histograms, in-flight requests, caches, admission and upstreams"""
+    translation = translation_cache.stats()
+    caches = {
+        'translation': (translation['memory_hits'] + translation['disk_hits'], translation['misses']),
+        'search': tuple(search_cache.stats()[key] for key in ('hits', 'misses')),
+        'response_memo': tuple(response_memo.stats()[key] for key in ('hits', 'misses')),
+        'fragments': tuple(dataset.current().fragments.stats()[key] for key in ('hits', 'misses')),
+    }
+    ratios = [((name,), hits / (hits + misses) if hits + misses else 0) for name, (hits, misses) in caches.items()]
+    admission_stats = admission.stats()
+    upstream_stats = {name: upstream.stats() for name, upstream in upstreams.items()}
+    
+    lines = performance_monitor.prometheus_lines()
+    lines += metric_lines('cache_hits_total', 'counter', 'Cache lookups answered from the cache',
+                          [((name,), hits) for name, (hits, _) in caches.items()], ('cache',))
+    lines += metric_lines('cache_misses_total', 'counter', 'Cache lookups that missed',
+                          [((name,), misses) for name, (_, misses) in caches.items()], ('cache',))
+    lines += metric_lines('cache_hit_ratio', 'gauge', 'Share of cache lookups answered from the cache', ratios, ('cache',))
+    lines += metric_lines('chat_admission_in_flight', 'gauge', 'Chat requests holding an admission slot',
+                          [((), admission_stats['in_flight'])])
+    lines += metric_lines('chat_admission_waiting', 'gauge', 'Chat requests waiting for an admission slot',
+                          [((), admission_stats['waiting'])])
+    lines += metric_lines('chat_rejected_total', 'counter', 'Chat requests turned away',
+                          [(('rate_limit',), rate_limiter.stats()['limited']),
+                           (('queue_full',), admission_stats['rejected_queue_full']),
+                           (('queue_timeout',), admission_stats['rejected_timeout'])], ('reason',))
+    lines += metric_lines('upstream_circuit_open', 'gauge', '1 while the circuit breaker is open, 0.5 half-open, 0 closed',
+                          [((name,), {'closed': 0, 'half_open': 0.5, 'open': 1}[stats['state']])
+                           for name, stats in upstream_stats.items()], ('upstream',))
+    for key, kind, help_text in (('trips', 'counter', 'Times the circuit breaker opened'),
+                                 ('calls', 'counter', 'Calls sent upstream'),
+                                 ('retries', 'counter', 'Attempts repeated after a transient failure'),
+                                 ('failures', 'counter', 'Calls that failed after their retries'),
+                                 ('short_circuited', 'counter', 'Calls failed fast while the breaker was open')):
+        lines += metric_lines(f'upstream_{key}_total', kind, help_text,
+                              [((name,), stats[key]) for name, stats in upstream_stats.items()], ('upstream',))
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+from admission_control import retry_after
+from api_server import (LANGUAGES, admission, dataset, is_cheap, language_detector, rate_limiter, session_store,
+                        upload_store, response_catalogue, process_educational_query, search_url, search_fallback,
+                        format_search_results)
+from renderers import greeting_prefix, join_segments, text
+from search_cache import search_cache
+from translation_cache import (TRANSLATE_URL, translation_cache, batch_chunks, split_batch, split_lines, join_lines,
+                               parse_translation, plan_segments, apply_translations)
+from upload_store import UploadTooLarge
+from upstream import search_upstream, translate_upstream
+
+# Default time budget for one chat request, in seconds
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '10'))
+
+# Rendering is fast, but cache lookups touch SQLite, so it runs off the event loop
+render_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='render')
+
+# Requests queued for an admission slot wait on a thread each, so the event loop keeps running
+admission_executor = ThreadPoolExecutor(max_workers=admission.max_queued, thread_name_prefix='admission')
+
+
+class Deadline:
+    """Remaining time budget for a request"""
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def timeout(self, upstream):
+        """aiohttp timeout limited to the remaining budget and the upstream's connect and read timeouts"""
+        return aiohttp.ClientTimeout(total=self.remaining(), sock_connect=upstream.connect_timeout,
+                                     sock_read=upstream.read_timeout)
+
+
+async def google_translate(session, text_value, source, target, deadline):
+    """Translate text with the same endpoint as the Flask server, over the shared session"""
+    if deadline.remaining() <= 0:
+        raise asyncio.TimeoutError()
+    params = {'sl': source, 'tl': target, 'q': text_value}
+
+    async def fetch():
+        async with session.get(TRANSLATE_URL, params=params, timeout=deadline.timeout(translate_upstream)) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    return parse_translation(await translate_upstream.call_async(fetch, deadline))
+
+
+async def translate_text_async(session, text_value, source, target, deadline):
+    """Translate text through the shared cache"""
+    if not text_value or source == target:
+        return text_value
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(render_executor, translation_cache.get, source, target, text_value)
+    if cached is not None:
+        return cached
+    translation = await google_translate(session, text_value, source, target, deadline)
+    if translation:
+        await loop.run_in_executor(render_executor, translation_cache.set, source, target, text_value, translation)
+    return translation
+
+
+async def translate_segments_async(session, blocks, source, target, deadline):
+    """Translate only the uncached text segments of rendered blocks, batched per chunk"""
+    loop = asyncio.get_running_loop()
+    parts, pending = await loop.run_in_executor(render_executor, plan_segments, blocks, source, target)
+    # Line by line, like translation_cache.translate_batch
+    text_lines, lines = split_lines(pending)
+    translated = {}
+    for chunk in batch_chunks(lines):
+        results = split_batch(await google_translate(session, '\n'.join(chunk), source, target, deadline), chunk)
+        if results is None:
+            results = await asyncio.gather(*(google_translate(session, line, source, target, deadline)
+                                             for line in chunk))
+        translated.update(zip(chunk, results))
+    translations = join_lines(text_lines, translated)
+    return await loop.run_in_executor(render_executor, apply_translations, parts, pending, translations, source, target)
+
+
+async def perform_general_search_async(session, query, greeting, deadline):
+    """Async counterpart of api_server.perform_general_search"""
+    url = search_url(query)
+    if url:
+        async def fetch():
+            async with session.get(url, timeout=deadline.timeout(search_upstream)) as response:
+                response.raise_for_status()
+                return await response.json()
+
+        try:
+            if deadline.remaining() <= 0:
+                raise asyncio.TimeoutError()
+            search_results = await search_cache.get_or_fetch_async(
+                query, lambda: search_upstream.call_async(fetch, deadline))
+            return format_search_results(query, search_results, greeting)
+        except Exception as e:
+            print(f"Error in Google search: {e}")
+            # While search is failing, an expired answer beats none
+            search_results = search_cache.stale(query)
+            if search_results is not None:
+                return format_search_results(query, search_results, greeting)
+    return search_fallback(greeting)
+
+
+async def admit_request(cheap, deadline):
+    """Return a Ticket for a slot to answer in, or None when the server stays busy, like api_server.admit_request"""
+    ticket = admission.try_admit(cheap)
+    if ticket is None:
+        loop = asyncio.get_running_loop()
+        ticket = await loop.run_in_executor(admission_executor, admission.admit, cheap, deadline.remaining())
+    return ticket
+
+
+def request_session_id(request, data):
+    """Identify the client session from the payload, a header, or the client address"""
+    session_id = data.get('session_id') or request.headers.get('X-Session-ID')
+    if not session_id:
+        session_id = request.remote or 'anonymous'
+    return str(session_id)[:128]
+
+
+async def chat(request):
+    wait = rate_limiter.acquire(request.remote or 'anonymous')
+    if wait:
+        return web.json_response({"error": "Too many requests"}, status=429,
+                                 headers={'Retry-After': retry_after(wait)})
+
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.json_response({"error": "Request must be JSON"}, status=400)
+
+    try:
+        timeout = float(request.headers.get('X-Request-Timeout', REQUEST_TIMEOUT))
+    except ValueError:
+        timeout = REQUEST_TIMEOUT
+    deadline = Deadline(min(timeout, REQUEST_TIMEOUT))
+
+    try:
+        message = data.get('message', '')
+        user_lang = data.get('language', 'en')
+        if user_lang == 'auto':
+            user_lang = language_detector.detect(message)
+        snapshot = dataset.current()
+        route = snapshot.route(message)
+        ticket = await admit_request(is_cheap(message, user_lang, route), deadline)
+        if ticket is None:
+            return web.json_response({"error": "Server busy, try again shortly"}, status=503,
+                                     headers={'Retry-After': retry_after(admission.queue_timeout)})
+    except Exception as e:
+        print(f"API CRASH: {str(e)}")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+    with ticket:
+        return await answer_chat(request, data, message, user_lang, snapshot, route, deadline)
+
+
+async def answer_chat(request, data, message, user_lang, snapshot, route, deadline):
+    """Answer an admitted chat request"""
+    session = request.app['client_session']
+    loop = asyncio.get_running_loop()
+
+    try:
+        session_id = request_session_id(request, data)
+        session_store.add_message(session_id, 'user', message)
+
+        # Check for common queries first
+        response = response_catalogue.answer(route, user_lang)
+        translated = response is not None
+
+        if not response:
+            response = snapshot.router.common_response(route)
+
+        if not response:
+            query = message
+            if user_lang != 'en':
+                try:
+                    query = await translate_text_async(session, message, user_lang, 'en', deadline)
+                    route = snapshot.route(query)
+                except Exception as e:
+                    print(f"Error translating query: {e}")
+
+            response = response_catalogue.answer(route, user_lang)
+            translated = response is not None
+
+            if not response:
+                if route['intent'] == 'general' and not route.get('local'):
+                    search_response = await perform_general_search_async(session, query, greeting_prefix(), deadline)
+                    blocks = [[text(search_response)]]
+                else:
+                    # Render in the request's context so the worker sees the pinned snapshot
+                    blocks = await loop.run_in_executor(render_executor, contextvars.copy_context().run,
+                                                        process_educational_query, query, route)
+                response = join_segments(blocks)
+
+                # If translation fails or runs out of budget, answer in English
+                if user_lang != 'en':
+                    try:
+                        response = await translate_segments_async(session, blocks, 'en', user_lang, deadline)
+                    except Exception as e:
+                        print(f"Error translating response: {e}")
+                translated = True
+
+        if user_lang != 'en' and not translated:
+            try:
+                response = await translate_text_async(session, response, 'en', user_lang, deadline)
+            except Exception as e:
+                print(f"Error translating response: {e}")
+
+        session_store.add_message(session_id, 'assistant', response)
+
+        return web.json_response({
+            'response': response,
+            'language': user_lang,
+            'session_id': session_id
+        })
+
+    except Exception as e:
+        print(f"API CRASH: {str(e)}")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+
+async def get_languages(request):
+    return web.json_response(LANGUAGES)
+
+
+async def upload_file(request):
+    reader = await request.multipart()
+    field = await reader.next()
+    while field is not None and field.name != 'file':
+        field = await reader.next()
+    if field is None:
+        return web.json_response({'success': False, 'message': 'No file part'})
+    if not field.filename:
+        return web.json_response({'success': False, 'message': 'No selected file'})
+
+    # Stream the part into the content-addressed store instead of buffering it
+    filename = os.path.basename(field.filename)
+    writer = upload_store.writer()
+    try:
+        while True:
+            chunk = await field.read_chunk(upload_store.chunk_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+    except UploadTooLarge:
+        return web.json_response({'success': False,
+                                  'message': f'File exceeds the {upload_store.max_bytes} byte upload limit'},
+                                 status=413)
+    except Exception:
+        writer.discard()
+        raise
+    digest, file_path, size, duplicate = writer.commit()
+
+    return web.json_response({
+        'success': True,
+        'message': f'File {filename} uploaded successfully',
+        'file_path': file_path,
+        'sha256': digest,
+        'size': size,
+        'duplicate': duplicate
+    })
+
+
+async def health_check(request):
+    return web.json_response({'status': 'ok', 'timestamp': datetime.now().isoformat()})
+
+
+@web.middleware
+async def dataset_middleware(request, handler):
+    """Serve each request from the data snapshot current when it arrived"""
+    token = dataset.pin()
+    try:
+        return await handler(request)
+    finally:
+        dataset.unpin(token)
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """Allow cross-origin requests like flask_cors does for the Flask app"""
+    if request.method == 'OPTIONS':
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = '*'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    return response
+
+
+async def client_session_ctx(app):
+    """Share one pooled HTTP session for all outbound calls"""
+    connector = aiohttp.TCPConnector(limit=int(os.getenv('UPSTREAM_CONNECTIONS', '100')), ttl_dns_cache=300)
+    app['client_session'] = aiohttp.ClientSession(connector=connector)
+    yield
+    await app['client_session'].close()
+
+
+def create_app():
+    app = web.Application(middlewares=[cors_middleware, dataset_middleware])
+    app.cleanup_ctx.append(client_session_ctx)
+    app.router.add_get('/api/languages', get_languages)
+    app.router.add_post('/api/chat', chat)
+    app.router.add_post('/api/upload', upload_file)
+    app.router.add_get('/api/health', health_check)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the chat API on an asyncio event loop')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
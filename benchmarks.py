@@ -0,0 +1,1107 @@
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from intent_router import IntentRouter, INTENT_KEYWORDS, CITIES
+from language_detector import LanguageDetector
+from college_index import CollegeIndex
+from college_ingest import CollegeIngestor
+from college_store import CollegeStore
+from dataset import Dataset
+from search_cache import SearchCache
+from fragment_store import FragmentStore
+from name_index import NameIndex
+from renderers import join_segments, maharashtra_heading, render_maharashtra_colleges, render_record
+from upstream import CircuitOpen, Upstream
+
+SAMPLE_QUERIES = [
+    "Tell me about IIT Bombay",
+    "Which are the best engineering colleges in Pune?",
+    "Affordable private medical colleges in Mumbai",
+    "When is the JEE Main exam this year?",
+    "How do I apply for a scholarship?",
+    "What is the admission deadline for MBA programs?",
+    "Is this a good time to study abroad?",
+]
+
+# Questions without intent keywords, which would otherwise go to the web search
+GENERAL_QUERIES = [
+    "Prime Minister's Research Fellowship",
+    "Who is eligible for INSPIRE?",
+    "Fellowship for PhD students",
+    "What does the National Testing Agency conduct?",
+    "Counselling dates for medical",
+    "When does the academic session begin for management?",
+    "12th pass with PCM",
+    "Top 1% in 12th board",
+    "WAT-PI schedule",
+    "Research funding per month",
+    "Is this a good time to study abroad?",
+    "How to become a pilot",
+    "What is the weather in Mumbai?",
+    "Best laptop for students",
+    "Career options after B.Com",
+    "How many hours should I study daily?",
+]
+
+# Questions the local records must not answer: off-topic, but sharing a place or institution word with a record
+OFF_TOPIC_QUERIES = [
+    "hotels in delhi",
+    "weather in delhi",
+    "restaurants in bangalore",
+    "coep pune",
+    "mumbai",
+    "pune weather",
+    "jobs in hyderabad",
+    "kolkata food",
+    "chennai beaches",
+    "bangalore traffic today",
+    "delhi metro timings",
+    "cheap flights to chennai",
+    "Indian Institute of Cooking",
+]
+
+# Chat messages in each language, with the code auto-detection should give
+LANGUAGE_MESSAGES = [
+    ("Which are the best engineering colleges in Pune?", 'en'),
+    ("Tell me about IIT Bombay", 'en'),
+    ("Hi ho", 'en'),
+    ("Ya sure", 'en'),
+    ("kaise ho", 'hi'),
+    ("scholarship chahiye", 'hi'),
+    ("mujhe engineering college ke baare mein batao", 'hi'),
+    ("neet ki taiyari kaise karein", 'hi'),
+    ("नीट परीक्षा की तैयारी कैसे करें?", 'hi'),
+    ("सबसे सस्ता मेडिकल कॉलेज कौन सा है", 'hi'),
+    ("नीट परीक्षेची तयारी कशी करावी?", 'mr'),
+    ("सर्वात स्वस्त वैद्यकीय महाविद्यालय कोणते आहे", 'mr'),
+    ("சென்னையில் சிறந்த பொறியியல் கல்லூரிகள்", 'ta'),
+    ("హైదరాబాద్‌లో ఉత్తమ కళాశాలలు", 'te'),
+    ("কলকাতার সেরা কলেজ", 'bn'),
+    ("ਪੰਜਾਬ ਦੇ ਵਧੀਆ ਕਾਲਜ", 'pa'),
+    ("અમદાવાદની શ્રેષ્ઠ કોલેજ", 'gu'),
+    ("ಬೆಂಗಳೂರಿನ ಅತ್ಯುತ್ತಮ ಕಾಲೇಜುಗಳು", 'kn'),
+    ("കേരളത്തിലെ മികച്ച കോളേജുകൾ", 'ml'),
+]
+
+COLLEGE_TYPES = ['Government', 'Private', 'Govt', 'Public', 'Autonomous', '']
+
+COURSE_SETS = [
+    ['B.Tech', 'Engineering'],
+    ['B.E.', 'M.Tech'],
+    ['MBBS', 'Medical'],
+    ['MBA', 'PGDM'],
+    ['B.Sc', 'M.Sc'],
+    'Engineering',
+]
+
+
+def synthetic_colleges(count, seed=42):
+    """Generate college records shaped like the scraper output"""
+    rng = random.Random(seed)
+    colleges = []
+    for i in range(count):
+        city = rng.choice(CITIES)
+        if rng.random() < 0.2:
+            rating = f"NIRF {rng.randint(1, 300)}"
+        else:
+            rating = f"{rng.uniform(2.5, 5):.1f}/5"
+        colleges.append({
+            "name": f"Synthetic College of Studies {i}",
+            "location": f"{city.title()}, Maharashtra",
+            "source": rng.choice(["Shiksha", "College Dunia", "GetMyUni", "collegeAPI"]),
+            "fees": f"₹{rng.randint(20, 400)},{rng.randint(0, 999):03d} per year",
+            "rating": rating,
+            "courses": rng.choice(COURSE_SETS),
+            "type": rng.choice(COLLEGE_TYPES),
+            "website": f"https://college{i}.example.edu.in",
+        })
+    return colleges
+
+
+NAME_SYLLABLES = ['ra', 'ma', 'shi', 'van', 'de', 'pa', 'til', 'ko', 'la', 'ji', 'ba', 'sant', 'gu', 'ru',
+                  'dev', 'na', 'tha', 'kar', 'mo', 'hi', 'ni', 'sa', 'vi', 'dya', 'pra', 'ti', 'an']
+
+NAME_KINDS = ['College of Engineering', 'Institute of Technology', 'Arts and Commerce College', 'Medical College',
+              'Institute of Management', 'Polytechnic', 'College of Pharmacy', 'Law College']
+
+
+def synthetic_names(count, seed=42):
+    """Generate college names from made-up words, so many names share words and spellings"""
+    rng = random.Random(seed)
+
+    def word():
+        return ''.join(rng.choice(NAME_SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+    return [f"{' '.join(word() for _ in range(rng.randint(1, 3)))} {rng.choice(NAME_KINDS)}, "
+            f"{rng.choice(CITIES).title()}" for _ in range(count)]
+
+
+def misspell(name, rng):
+    """Replace one letter of a name with a vowel"""
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice('aeiou') + name[i + 1:]
+
+
+def legacy_filter_colleges(colleges, city=None, field=None, college_type=None, affordable=False):
+    """The list-comprehension filtering the Maharashtra renderer used to run"""
+    def courses_of(college):
+        courses = college.get('courses', [])
+        return courses if isinstance(courses, list) else [college.get('courses', '')]
+
+    filtered = colleges
+    if city:
+        filtered = [c for c in filtered if city in c.get('location', '').lower()]
+    if field == 'engineering':
+        filtered = [c for c in filtered if any(course.lower() in ['b.tech', 'engineering', 'b.e.'] for course in courses_of(c))]
+    elif field == 'medical':
+        filtered = [c for c in filtered if any(course.lower() in ['mbbs', 'medical', 'medicine'] for course in courses_of(c))]
+    elif field == 'management':
+        filtered = [c for c in filtered if any(course.lower() in ['mba', 'management', 'business', 'pgdm'] for course in courses_of(c))]
+    if college_type == 'government':
+        filtered = [c for c in filtered if c.get('type', '').lower() in ['government', 'govt', 'public']]
+    elif college_type == 'private':
+        filtered = [c for c in filtered if c.get('type', '').lower() == 'private']
+
+    if affordable:
+        def extract_fee(fee_str):
+            if not fee_str or not isinstance(fee_str, str):
+                return float('inf')
+            numbers = re.findall(r'(\d+(?:\.\d+)?)', fee_str.replace(',', ''))
+            return float(numbers[0]) if numbers else float('inf')
+        filtered = sorted(filtered, key=lambda c: extract_fee(c.get('fees', '')))[:15]
+
+    def get_rating(college):
+        try:
+            rating = college.get('rating', '0')
+            if isinstance(rating, str):
+                if 'nirf' in rating.lower():
+                    match = re.search(r'(\d+)', rating)
+                    if match:
+                        return 1000 - float(match.group(1))
+                rating = rating.replace('/5', '').replace('/10', '').strip()
+                return float(rating)
+            return rating
+        except:
+            return 0
+
+    return sorted(filtered, key=get_rating, reverse=True)[:5]
+
+
+COLLEGE_FILTERS = [
+    {'city': 'pune', 'field': 'engineering'},
+    {'city': 'mumbai', 'college_type': 'private', 'affordable': True},
+    {'field': 'medical', 'college_type': 'government'},
+    {'city': 'nagpur'},
+    {},
+]
+
+
+def memory_probe(layout, count):
+    """Print the RSS growth from holding synthetic colleges in a layout; run in a fresh process"""
+    import gc
+    import psutil
+
+    lines = [json.dumps(college) for college in synthetic_colleges(count)]
+    gc.collect()
+    process = psutil.Process()
+    before = process.memory_info().rss
+
+    # Parse one record at a time, as a loader would, so only the layout stays resident
+    records = (json.loads(line) for line in lines)
+    colleges = CollegeStore(records) if layout == 'columnar' else list(records)
+    gc.collect()
+    print(json.dumps({'rss_bytes': process.memory_info().rss - before, 'colleges': len(colleges)}))
+
+
+def startup_probe():
+    """Print the time from importing the API server to its first chat answer; run in a fresh process"""
+    start = time.perf_counter()
+    import api_server
+    imported = time.perf_counter()
+    response = api_server.app.test_client().post('/api/chat', json={'message': 'scholarships', 'language': 'en'})
+    answered = time.perf_counter()
+    if response.status_code != 200:
+        raise AssertionError(f"First request failed with status {response.status_code}")
+    print(json.dumps({
+        'import_ms': (imported - start) * 1000,
+        'first_response_ms': (answered - start) * 1000,
+        'lazy_modules_loaded': [name for name in ('requests',) if name in sys.modules],
+    }))
+
+
+def serve_app(port):
+    """Serve the API on a threaded server until killed; run in a fresh process configured through the environment"""
+    from api_server import app
+    app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def batch_probe(languages):
+    """Print the translate calls of one /api/chat/batch request, by direction; run in a fresh process.
+
+    The environment points the translate and search URLs at a FakeSearchServer and
+    leaves the translation cache in memory only, so every question and answer is new.
+    """
+    import api_server
+    import translation_cache
+
+    if api_server.response_catalogue.rebuild_thread:
+        api_server.response_catalogue.rebuild_thread.join()
+    sent = []
+    google_translate = translation_cache.google_translate
+
+    def counting_translate(text, source, target):
+        sent.append((f"{source}->{target}", text))
+        return google_translate(text, source, target)
+
+    translation_cache.google_translate = counting_translate
+    messages = [{'message': query, 'language': lang} for lang in languages for query in SAMPLE_QUERIES]
+    response = api_server.app.test_client().post('/api/chat/batch', json={'messages': messages})
+    if response.status_code != 200:
+        raise AssertionError(f"Batch request failed with status {response.status_code}")
+
+    directions = {}
+    for direction, text in sent:
+        directions.setdefault(direction, []).append(text)
+    print(json.dumps({
+        'messages': len(messages),
+        'directions': {direction: {
+            'calls': len(texts),
+            'lines': sum(text.count('\n') + 1 for text in texts),
+            'chunks': len(translation_cache.batch_chunks([line for text in texts for line in text.split('\n')])),
+        } for direction, texts in directions.items()},
+    }))
+
+
+class FakeSearchServer:
+    """Local stand-in for the Custom Search API with fixed latency and fault injection.
+
+    With a capacity, at most that many requests are served at once and the rest queue,
+    like an upstream that slows down under load. Requests to translate_url get a
+    Google Translate result page, with the text tagged by its target language.
+    """
+
+    def __init__(self, latency=0.05, failure_rate=0.0, capacity=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(capacity) if capacity else None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                if server.slots:
+                    with server.slots:
+                        time.sleep(server.latency)
+                else:
+                    time.sleep(server.latency)
+                if random.random() < server.failure_rate:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                query = params.get('q', [''])[0]
+                if url.path == '/m':
+                    content_type = 'text/html; charset=utf-8'
+                    body = f'<div class="result-container">[{params.get("tl", [""])[0]}] {query}</div>'.encode('utf-8')
+                else:
+                    content_type = 'application/json'
+                    body = json.dumps({'items': [{
+                        'title': f'Result {i} for {query}',
+                        'snippet': 'A snippet about Indian education',
+                        'link': f'https://example.edu.in/{i}',
+                    } for i in range(3)]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/customsearch/v1'
+        self.translate_url = f'http://127.0.0.1:{self.httpd.server_address[1]}/m'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class BenchmarkRunner:
+    def __init__(self):
+        self.results_dir = 'research_paper_assets/performance_data'
+        os.makedirs(self.results_dir, exist_ok=True)
+        data_path = os.path.join(os.path.dirname(__file__), 'data', 'indian_education_data.json')
+        with open(data_path, 'r', encoding='utf-8') as f:
+            self.education_data = json.load(f)
+
+    def time_per_call(self, calls, repeat=200):
+        """Return the mean time per call in microseconds for zero-argument callables"""
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for call in calls:
+                call()
+        elapsed = time.perf_counter() - start
+        return elapsed / (repeat * len(calls)) * 1e6
+
+    def bench_router(self, table_sizes=(0, 100, 1000, 10000)):
+        """Compare per-request routing cost as the keyword tables grow"""
+        results = []
+        for extra in table_sizes:
+            data = json.loads(json.dumps(self.education_data))
+            general = data['common_queries']['general']
+            for i in range(extra):
+                general[f'synthetic topic {i}'] = f'Synthetic answer {i}'
+
+            router = IntentRouter(data)
+            common_keys = list(data['common_queries']['greetings']) + list(general)
+            intent_keywords = [keywords for _, keywords in INTENT_KEYWORDS]
+
+            def legacy_route(query):
+                # Mirrors the substring scans the request path used to run
+                message = query.lower()
+                for key in common_keys:
+                    if key in message:
+                        return key
+                for keywords in intent_keywords:
+                    if any(keyword in query.lower() for keyword in keywords):
+                        return keywords[0]
+                return None
+
+            repeat = 200 if extra < 10000 else 20
+            results.append({
+                'extra_keywords': extra,
+                'router_us': self.time_per_call([partial(router.route, q) for q in SAMPLE_QUERIES], repeat),
+                'legacy_us': self.time_per_call([partial(legacy_route, q) for q in SAMPLE_QUERIES], repeat),
+            })
+
+        print(f"{'keywords':>10} {'router (us)':>12} {'substring (us)':>15}")
+        for row in results:
+            print(f"{row['extra_keywords']:>10} {row['router_us']:>12.2f} {row['legacy_us']:>15.2f}")
+        return results
+
+    def bench_college_index(self, sizes=(1000, 10000, 100000)):
+        """Compare Maharashtra filtering through the index against list scans"""
+        results = []
+        for size in sizes:
+            colleges = synthetic_colleges(size)
+            start = time.perf_counter()
+            index = CollegeIndex(colleges)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            for filters in COLLEGE_FILTERS:
+                expected = legacy_filter_colleges(colleges, **filters)
+                if index.search(**filters) != expected:
+                    raise AssertionError(f"Index results differ from list scan for {filters}")
+
+            repeat = max(1, 20000 // size)
+            legacy_calls = [partial(legacy_filter_colleges, colleges, **filters) for filters in COLLEGE_FILTERS]
+            index_calls = [partial(index.search, **filters) for filters in COLLEGE_FILTERS]
+            results.append({
+                'colleges': size,
+                'build_ms': build_ms,
+                'index_us': self.time_per_call(index_calls, repeat),
+                'legacy_us': self.time_per_call(legacy_calls, repeat),
+            })
+
+        print(f"{'colleges':>10} {'build (ms)':>11} {'index (us)':>11} {'list scan (us)':>15}")
+        for row in results:
+            print(f"{row['colleges']:>10} {row['build_ms']:>11.1f} {row['index_us']:>11.1f} {row['legacy_us']:>15.1f}")
+        return results
+
+    def bench_search_cache(self, clients=64, requests_per_client=5, distinct_queries=4):
+        """Send bursts of identical searches to a local fake API with and without the cache"""
+        queries = [f'Popular question {i} about admissions' for i in range(distinct_queries)]
+        results = []
+        for mode in ('uncached', 'cached'):
+            cache = SearchCache()
+            with FakeSearchServer() as server:
+                def fetch(query):
+                    response = requests.get(server.url, params={'q': query}, timeout=5)
+                    response.raise_for_status()
+                    return response.json()
+
+                def client(n):
+                    for i in range(requests_per_client):
+                        query = queries[(n + i) % distinct_queries]
+                        if mode == 'cached':
+                            cache.get_or_fetch(query.upper(), partial(fetch, query))
+                        else:
+                            fetch(query)
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=clients) as pool:
+                    list(pool.map(client, range(clients)))
+                elapsed = time.perf_counter() - start
+
+            row = {
+                'mode': mode,
+                'requests': clients * requests_per_client,
+                'upstream_calls': server.requests,
+                'elapsed_s': elapsed,
+            }
+            if mode == 'cached':
+                row.update(cache.stats())
+                if server.requests > distinct_queries:
+                    raise AssertionError(f"Expected at most {distinct_queries} upstream calls, got {server.requests}")
+            results.append(row)
+
+        print(f"{'mode':>10} {'requests':>9} {'upstream':>9} {'elapsed (s)':>12}")
+        for row in results:
+            print(f"{row['mode']:>10} {row['requests']:>9} {row['upstream_calls']:>9} {row['elapsed_s']:>12.2f}")
+        cached = results[-1]
+        print(f"Saved {cached['saved_upstream_calls']} upstream calls "
+              f"({cached['hits']} cache hits, {cached['coalesced']} coalesced)")
+        return results
+
+    def bench_fragments(self, sizes=(10000,)):
+        """Compare per-request rendering of Maharashtra listings with and without pre-rendered fragments"""
+        results = []
+        for size in sizes:
+            colleges = CollegeStore(synthetic_colleges(size), prefix='maharashtra')
+            index = CollegeIndex(colleges)
+            store = FragmentStore()
+            start = time.perf_counter()
+            store.build(self.education_data, colleges)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            listings = []
+            for filters in COLLEGE_FILTERS:
+                route = {'city': filters.get('city'), 'fields': {'college': filters.get('field')},
+                         'type': filters.get('college_type'), 'affordable': filters.get('affordable', False)}
+                listings.append((maharashtra_heading(route), index.search(**filters)))
+
+            def render(fragment):
+                return [join_segments(render_maharashtra_colleges(heading, matches, colleges[:5], fragment=fragment))
+                        for heading, matches in listings]
+
+            if render(render_record) != render(store.fragment):
+                raise AssertionError("Fragment rendering differs from per-request rendering")
+
+            results.append({
+                'colleges': size,
+                'build_ms': build_ms,
+                'per_request_us': self.time_per_call([partial(render, render_record)], 2000) / len(listings),
+                'fragments_us': self.time_per_call([partial(render, store.fragment)], 2000) / len(listings),
+            })
+
+        print(f"{'colleges':>10} {'build (ms)':>11} {'per request (us)':>17} {'fragments (us)':>15}")
+        for row in results:
+            print(f"{row['colleges']:>10} {row['build_ms']:>11.1f} {row['per_request_us']:>17.1f} {row['fragments_us']:>15.1f}")
+        return results
+
+    def bench_memory(self, sizes=(100000,)):
+        """Compare resident memory of college records as dicts and as a columnar store"""
+        results = []
+        for size in sizes:
+            row = {'colleges': size}
+            for layout in ('dicts', 'columnar'):
+                code = f"import benchmarks; benchmarks.memory_probe({layout!r}, {size})"
+                output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+                row[f'{layout}_mb'] = json.loads(output.splitlines()[-1])['rss_bytes'] / 2**20
+            results.append(row)
+
+        print(f"{'colleges':>10} {'dicts (MB)':>11} {'columnar (MB)':>14}")
+        for row in results:
+            print(f"{row['colleges']:>10} {row['dicts_mb']:>11.1f} {row['columnar_mb']:>14.1f}")
+        return results
+
+    def bench_startup(self, sizes=(0, 50000)):
+        """Measure import-to-first-response of new workers, parsing the JSON files and loading the binary snapshot"""
+        import tempfile
+
+        results = []
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                colleges_path = os.path.join(tmp, 'maharashtra_colleges.json')
+                with open(colleges_path, 'w', encoding='utf-8') as f:
+                    json.dump(synthetic_colleges(size), f)
+                env = dict(os.environ, MAHARASHTRA_COLLEGES_PATH=colleges_path, DATA_RELOAD_INTERVAL='0',
+                           DATASET_SNAPSHOT_PATH=os.path.join(tmp, 'dataset.snapshot'))
+
+                row = {'colleges': size}
+                # The first worker finds no snapshot and writes one; the second loads it
+                for mode in ('json', 'snapshot'):
+                    output = subprocess.run([sys.executable, '-c', 'import benchmarks; benchmarks.startup_probe()'],
+                                            capture_output=True, text=True, check=True, env=env,
+                                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+                    probe = json.loads(output.splitlines()[-1])
+                    row[f'{mode}_import_ms'] = probe['import_ms']
+                    row[f'{mode}_first_response_ms'] = probe['first_response_ms']
+                    row['lazy_modules_loaded'] = probe['lazy_modules_loaded']
+                results.append(row)
+
+        print(f"{'colleges':>10} {'JSON import (ms)':>17} {'JSON first (ms)':>16} "
+              f"{'snapshot import (ms)':>21} {'snapshot first (ms)':>20}")
+        for row in results:
+            print(f"{row['colleges']:>10} {row['json_import_ms']:>17.0f} {row['json_first_response_ms']:>16.0f} "
+                  f"{row['snapshot_import_ms']:>21.0f} {row['snapshot_first_response_ms']:>20.0f}")
+        return results
+
+    def bench_ingest(self, rows=100000, batch_sizes=(5000,)):
+        """Measure Maharashtra query latency while a large uploaded college list is ingested"""
+        import statistics
+        import tempfile
+
+        def percentiles(samples):
+            samples = sorted(samples)
+            return {
+                'p50_ms': statistics.median(samples),
+                'p99_ms': samples[int(len(samples) * 0.99)],
+                'max_ms': samples[-1],
+            }
+
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            data_path = os.path.join(tmp, 'indian_education_data.json')
+            colleges_path = os.path.join(tmp, 'maharashtra_colleges.json')
+            upload_path = os.path.join(tmp, 'colleges.jsonl')
+            with open(data_path, 'w', encoding='utf-8') as f:
+                json.dump(self.education_data, f)
+            with open(colleges_path, 'w', encoding='utf-8') as f:
+                json.dump(synthetic_colleges(1000, seed=7), f)
+            with open(upload_path, 'w', encoding='utf-8') as f:
+                for college in synthetic_colleges(rows):
+                    f.write(json.dumps(college) + '\n')
+
+            for batch_size in batch_sizes:
+                dataset = Dataset(data_path, colleges_path, snapshot_path=None)
+
+                def query():
+                    snapshot = dataset.current()
+                    start = time.perf_counter()
+                    for filters in COLLEGE_FILTERS:
+                        matches = snapshot.maharashtra_index.search(**filters)
+                        join_segments(render_maharashtra_colleges('', matches, snapshot.maharashtra_colleges[:5],
+                                                                  fragment=snapshot.fragments.fragment))
+                    return (time.perf_counter() - start) * 1000 / len(COLLEGE_FILTERS)
+
+                idle = [query() for _ in range(500)]
+
+                ingestor = CollegeIngestor(dataset, workers=1, batch_size=batch_size)
+                start = time.perf_counter()
+                job = ingestor.submit(upload_path, 'colleges.jsonl', 'benchmark')
+                during = []
+                while job.status in ('queued', 'running'):
+                    during.append(query())
+                    time.sleep(0.002)
+                ingest_s = time.perf_counter() - start
+                if job.status != 'done' or len(dataset.current().maharashtra_colleges) != 1000 + rows:
+                    raise AssertionError(f"Ingestion ended with {job.status}: {job.error}")
+
+                row = {'rows': rows, 'batch_size': batch_size, 'ingest_s': ingest_s, 'queries_during': len(during)}
+                row.update({f'idle_{key}': value for key, value in percentiles(idle).items()})
+                row.update({f'during_{key}': value for key, value in percentiles(during).items()})
+                results.append(row)
+
+        print(f"{'rows':>8} {'batch':>6} {'ingest (s)':>11} {'idle p50/p99 (ms)':>18} {'during p50/p99/max (ms)':>24}")
+        for row in results:
+            print(f"{row['rows']:>8} {row['batch_size']:>6} {row['ingest_s']:>11.1f} "
+                  f"{row['idle_p50_ms']:>8.2f}/{row['idle_p99_ms']:<9.2f} "
+                  f"{row['during_p50_ms']:>8.2f}/{row['during_p99_ms']:.2f}/{row['during_max_ms']:.2f}")
+        return results
+
+    def bench_names(self, sizes=(10000, 100000), samples=500):
+        """Measure fuzzy college name lookups: build time, latency, and how often the named college or another one is found"""
+        rng = random.Random(7)
+        results = []
+        for size in sizes:
+            names = synthetic_names(size)
+            start = time.perf_counter()
+            index = NameIndex()
+            for i, name in enumerate(names):
+                index.add([name], i)
+            build_s = time.perf_counter() - start
+
+            row = {'names': size, 'build_s': build_s}
+            picks = rng.sample(range(size), samples)
+            for label, queries in (('exact', [names[i].split(',')[0] for i in picks]),
+                                   ('typo', [misspell(names[i].split(',')[0], rng) for i in picks])):
+                latencies = []
+                found = wrong = 0
+                for query, expected in zip(queries, picks):
+                    start = time.perf_counter()
+                    target = index.best(query)
+                    latencies.append((time.perf_counter() - start) * 1e6)
+                    found += target == expected
+                    wrong += target not in (expected, None)
+                latencies.sort()
+                row.update({
+                    f'{label}_p50_us': latencies[len(latencies) // 2],
+                    f'{label}_p99_us': latencies[int(len(latencies) * 0.99)],
+                    f'{label}_found': found / samples,
+                    f'{label}_wrong': wrong / samples,
+                })
+            results.append(row)
+
+        print(f"{'names':>8} {'build (s)':>10} {'exact p50/p99 (us)':>19} {'found':>6} {'wrong':>6} "
+              f"{'typo p50/p99 (us)':>18} {'found':>6} {'wrong':>6}")
+        for row in results:
+            print(f"{row['names']:>8} {row['build_s']:>10.2f} {row['exact_p50_us']:>9.0f}/{row['exact_p99_us']:<9.0f} "
+                  f"{row['exact_found']:>6.1%} {row['exact_wrong']:>6.1%} "
+                  f"{row['typo_p50_us']:>8.0f}/{row['typo_p99_us']:<9.0f} "
+                  f"{row['typo_found']:>6.1%} {row['typo_wrong']:>6.1%}")
+        return results
+
+    def bench_batch(self, languages=('hi', 'mr')):
+        """Count the translate calls of one /api/chat/batch request in several languages.
+
+        The app runs in its own process against local fake translate and search APIs,
+        with empty caches. Each language and direction, the questions to English and
+        the answers back with their suggestions, must take no more calls than its
+        lines fill ~4500-character chunks: one, unless the answers are long.
+        """
+        with FakeSearchServer(latency=0) as server:
+            env = dict(os.environ, GOOGLE_TRANSLATE_URL=server.translate_url, GOOGLE_SEARCH_URL=server.url,
+                       GOOGLE_API_KEY='benchmark', GOOGLE_SEARCH_ENGINE_ID='benchmark', TRANSLATION_CACHE_PATH='',
+                       RATE_LIMIT_PER_SECOND='0', DATA_RELOAD_INTERVAL='0')
+            code = f'import benchmarks; benchmarks.batch_probe({list(languages)!r})'
+            output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        results = json.loads(output.splitlines()[-1])
+
+        print(f"{results['messages']} messages in {', '.join(languages)}")
+        print(f"{'direction':>10} {'calls':>6} {'lines':>6} {'chunks':>7}")
+        for direction, row in sorted(results['directions'].items()):
+            print(f"{direction:>10} {row['calls']:>6} {row['lines']:>6} {row['chunks']:>7}")
+        expected = {f"{lang}->en" for lang in languages} | {f"en->{lang}" for lang in languages}
+        if set(results['directions']) != expected:
+            raise AssertionError(f"Expected translate calls for {sorted(expected)}, got {sorted(results['directions'])}")
+        for direction, row in results['directions'].items():
+            if row['calls'] > row['chunks']:
+                raise AssertionError(f"{direction}: {row['calls']} translate calls for {row['chunks']} chunks")
+        return results
+
+    def bench_local(self, repeat=200):
+        """Measure how many general questions the local knowledge base answers, and at what latency.
+
+        Off-topic questions that share a word with some record are also routed: any
+        local answer to one of them is a false positive that skipped the web search.
+        """
+        snapshot = Dataset(snapshot_path=None).current()
+        routes = [snapshot.route(query) for query in GENERAL_QUERIES]
+        general = [query for query, route in zip(GENERAL_QUERIES, routes) if route['intent'] == 'general']
+        answered = [query for query, route in zip(GENERAL_QUERIES, routes) if route['local']]
+        off_topic = [query for query in OFF_TOPIC_QUERIES if snapshot.route(query)['intent'] == 'general']
+        false_positives = [query for query in off_topic if snapshot.route(query)['local']]
+
+        def p95_us(call):
+            samples = []
+            for _ in range(repeat):
+                for query in general:
+                    start = time.perf_counter()
+                    call(query)
+                    samples.append((time.perf_counter() - start) * 1e6)
+            samples.sort()
+            return samples[int(len(samples) * 0.95)]
+
+        results = {
+            'documents': len(snapshot.knowledge),
+            'terms': len(snapshot.knowledge.vocabulary),
+            'general_queries': len(general),
+            'local_answers': len(answered),
+            'local_rate': len(answered) / len(general) if general else 0,
+            'off_topic_queries': len(off_topic),
+            'false_positives': len(false_positives),
+            'false_positive_rate': len(false_positives) / len(off_topic) if off_topic else 0,
+            'search_p95_us': p95_us(snapshot.knowledge.search),
+            'route_p95_us': p95_us(snapshot.route),
+            'router_p95_us': p95_us(snapshot.router.route),
+        }
+        print(f"{results['documents']} records, {results['terms']} terms")
+        print(f"Answered locally: {results['local_answers']}/{results['general_queries']} general questions "
+              f"({results['local_rate']:.0%})")
+        print(f"False positives: {results['false_positives']}/{results['off_topic_queries']} off-topic questions "
+              f"answered locally ({results['false_positive_rate']:.0%})")
+        print(f"p95: knowledge base {results['search_p95_us']:.1f} us, route with lookups {results['route_p95_us']:.1f} us, "
+              f"keyword router alone {results['router_p95_us']:.1f} us")
+        for query in answered + false_positives:
+            print(f"  {query} -> {', '.join(record['name'] for _, _, record in snapshot.route(query)['local'])}")
+        return results
+
+    def bench_language(self, repeat=2000):
+        """Measure offline language detection: per-message time and agreement with the expected codes"""
+        detector = LanguageDetector()
+        results = []
+        for message, expected in LANGUAGE_MESSAGES:
+            results.append({
+                'message': message,
+                'expected': expected,
+                'detected': detector.detect(message),
+                'detect_us': self.time_per_call([partial(detector.detect, message)], repeat),
+            })
+
+        print(f"{'expected':>8} {'detected':>8} {'time (us)':>10}  message")
+        for row in results:
+            print(f"{row['expected']:>8} {row['detected']:>8} {row['detect_us']:>10.1f}  {row['message']}")
+        correct = sum(row['detected'] == row['expected'] for row in results)
+        print(f"{correct}/{len(results)} detected as expected")
+        return results
+
+    def bench_admission(self, concurrency=(8, 32, 128), duration=5.0, cheap_share=0.2):
+        """Load the Flask app past saturation with and without admission control.
+
+        Most requests are general questions sent to a fake search API that serves
+        4 at a time in 200 ms; the rest are named-college questions answered locally. The
+        app runs in its own process. Reports admitted-request latency for both
+        kinds and the share of requests shed with 429/503.
+        """
+        limits = {
+            'unbounded': {'MAX_IN_FLIGHT': '1000000', 'MAX_QUEUED': '1000000', 'QUEUE_TIMEOUT': '60'},
+            'admission': {'MAX_IN_FLIGHT': '8', 'MAX_QUEUED': '8', 'QUEUE_TIMEOUT': '0.5'},
+        }
+
+        def percentile(samples, share):
+            samples = sorted(samples)
+            return samples[min(len(samples) - 1, int(len(samples) * share))] * 1000 if samples else 0
+
+        results = []
+        with FakeSearchServer(latency=0.2, capacity=4) as search:
+            for mode, settings in limits.items():
+                with socket.socket() as probe:
+                    probe.bind(('127.0.0.1', 0))
+                    port = probe.getsockname()[1]
+                env = dict(os.environ, GOOGLE_SEARCH_URL=search.url, GOOGLE_API_KEY='benchmark',
+                           GOOGLE_SEARCH_ENGINE_ID='benchmark', RATE_LIMIT_PER_SECOND='0', **settings)
+                server = subprocess.Popen([sys.executable, '-c', f'import benchmarks; benchmarks.serve_app({port})'],
+                                          env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                url = f'http://127.0.0.1:{port}/api/chat'
+                try:
+                    for _ in range(600):
+                        try:
+                            requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1)
+                            break
+                        except requests.ConnectionError:
+                            time.sleep(0.1)
+
+                    for clients in concurrency:
+                        samples = {'cheap': [], 'expensive': []}
+                        rejected = errors = 0
+                        lock = threading.Lock()
+                        stop = time.perf_counter() + duration
+
+                        def client(n):
+                            nonlocal rejected, errors
+                            rng = random.Random(f'{clients}:{n}')
+                            with requests.Session() as session:
+                                while time.perf_counter() < stop:
+                                    # Distinct questions, so neither the memo nor the search cache answers them
+                                    if rng.random() < cheap_share:
+                                        kind, message = 'cheap', 'Tell me about IIT Bombay'
+                                    else:
+                                        kind, message = 'expensive', f'How to become a pilot {clients} {n} {rng.random()}'
+                                    start = time.perf_counter()
+                                    try:
+                                        response = session.post(url, json={'message': message}, timeout=60)
+                                    except requests.RequestException:
+                                        with lock:
+                                            errors += 1
+                                        continue
+                                    elapsed = time.perf_counter() - start
+                                    with lock:
+                                        if response.status_code in (429, 503):
+                                            rejected += 1
+                                        elif response.ok:
+                                            samples[kind].append(elapsed)
+                                        else:
+                                            errors += 1
+                                    if response.status_code in (429, 503):
+                                        time.sleep(float(response.headers.get('Retry-After', 1)))
+
+                        with ThreadPoolExecutor(max_workers=clients) as pool:
+                            list(pool.map(client, range(clients)))
+
+                        total = len(samples['cheap']) + len(samples['expensive']) + rejected + errors
+                        results.append({
+                            'mode': mode,
+                            'clients': clients,
+                            'requests': total,
+                            'rejected_rate': rejected / total if total else 0,
+                            'errors': errors,
+                            'cheap_p50_ms': percentile(samples['cheap'], 0.5),
+                            'cheap_p99_ms': percentile(samples['cheap'], 0.99),
+                            'expensive_p50_ms': percentile(samples['expensive'], 0.5),
+                            'expensive_p99_ms': percentile(samples['expensive'], 0.99),
+                        })
+                finally:
+                    server.terminate()
+                    server.wait()
+
+        print(f"{'mode':>10} {'clients':>8} {'requests':>9} {'shed':>6} "
+              f"{'cheap p50/p99 (ms)':>19} {'search p50/p99 (ms)':>20}")
+        for row in results:
+            print(f"{row['mode']:>10} {row['clients']:>8} {row['requests']:>9} {row['rejected_rate']:>6.1%} "
+                  f"{row['cheap_p50_ms']:>9.0f}/{row['cheap_p99_ms']:<9.0f} "
+                  f"{row['expensive_p50_ms']:>9.0f}/{row['expensive_p99_ms']:<10.0f}")
+        return results
+
+    def bench_upstream(self, calls=40, reset_timeout=1.0):
+        """Call a fake search API through an Upstream while it is healthy, hangs, fails and recovers.
+
+        Shows call latency and outcome per phase: timeouts bound the slow phase, and
+        once the breaker opens, calls fail in microseconds until a trial call succeeds.
+        """
+        upstream = Upstream('search', connect_timeout=0.5, read_timeout=0.2, retries=1, backoff=0.05,
+                            failure_threshold=3, reset_timeout=reset_timeout)
+        phases = [
+            ('healthy', {'latency': 0.01, 'failure_rate': 0.0}),
+            ('hanging', {'latency': 2.0, 'failure_rate': 0.0}),
+            ('failing', {'latency': 0.01, 'failure_rate': 1.0}),
+            ('recovered', {'latency': 0.01, 'failure_rate': 0.0}),
+        ]
+
+        results = []
+        with FakeSearchServer() as server:
+            for phase, faults in phases:
+                server.latency = faults['latency']
+                server.failure_rate = faults['failure_rate']
+                if upstream.breaker.state == 'open':
+                    # Let the breaker send a trial call in this phase
+                    time.sleep(reset_timeout)
+                before = upstream.stats()
+                requests_before = server.requests
+                latencies = []
+                ok = failed = short_circuited = 0
+                for i in range(calls):
+                    start = time.perf_counter()
+                    try:
+                        upstream.get(server.url, params={'q': f'{phase} {i}'})
+                        ok += 1
+                    except CircuitOpen:
+                        short_circuited += 1
+                    except Exception:
+                        failed += 1
+                    latencies.append((time.perf_counter() - start) * 1000)
+                latencies.sort()
+                stats = upstream.stats()
+                results.append({
+                    'phase': phase,
+                    'calls': calls,
+                    'ok': ok,
+                    'failed': failed,
+                    'short_circuited': short_circuited,
+                    'upstream_requests': server.requests - requests_before,
+                    'retries': stats['retries'] - before['retries'],
+                    'p50_ms': latencies[len(latencies) // 2],
+                    'max_ms': latencies[-1],
+                    'state': stats['state'],
+                    'trips': stats['trips'],
+                })
+
+        print(f"{'phase':>10} {'ok':>4} {'failed':>7} {'fast-failed':>12} {'sent':>5} {'retries':>8} "
+              f"{'p50/max (ms)':>14} {'breaker':>10} {'trips':>6}")
+        for row in results:
+            print(f"{row['phase']:>10} {row['ok']:>4} {row['failed']:>7} {row['short_circuited']:>12} "
+                  f"{row['upstream_requests']:>5} {row['retries']:>8} {row['p50_ms']:>6.1f}/{row['max_ms']:<7.0f} "
+                  f"{row['state']:>10} {row['trips']:>6}")
+        return results
+
+    def bench_metrics(self, requests_per_arm=15000, target=0.01, seed=42):
+        """Measure the cost of request metrics on chat requests answered locally, the cheapest ones.
+
+        Requests go through the Flask test client, each one assigned at random to
+        an arm: monitoring on, monitoring off, or a control arm that is also off.
+        The end-to-end overhead is the ratio of the median request times of the on
+        and off arms, compared with a target. The control's ratio to the off arm
+        is what noise alone gives, so an overhead within it is not measurable. The
+        direct cost of one request's metric calls, with their share of the flush
+        that counts them into the histograms, is also timed.
+        """
+        import contextlib
+        import io
+        import statistics
+        import api_server
+        from admission_control import RateLimiter
+        from performance_monitor import PerformanceMonitor
+
+        queries = [query for query in SAMPLE_QUERIES if api_server.dataset.current().route(query)['intent'] != 'general']
+        client = api_server.app.test_client()
+        api_server.rate_limiter = RateLimiter(rate=0)
+        monitor = api_server.performance_monitor
+        rng = random.Random(seed)
+
+        arms = ('on', 'off', 'control')
+        timings = {arm: [] for arm in arms}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for query in queries:
+                client.post('/api/chat', json={'message': query, 'language': 'en'})
+            for i in range(requests_per_arm * len(arms)):
+                arm = rng.choice(arms)
+                monitor.enabled = arm == 'on'
+                payload = {'message': queries[i % len(queries)], 'language': 'en'}
+                start = time.perf_counter()
+                client.post('/api/chat', json=payload)
+                timings[arm].append((time.perf_counter() - start) * 1e6)
+        monitor.enabled = True
+        medians = {arm: statistics.median(samples) for arm, samples in timings.items()}
+
+        # What an answered-from-memo request records: the request, routing and one render stage. The
+        # background flush counting them into the histograms is included, as it takes the same CPU
+        probe = PerformanceMonitor()
+        batch = 1000
+
+        def instrumented_requests():
+            for _ in range(batch):
+                probe.request_started()
+                with probe.stage('routing'):
+                    pass
+                with probe.stage('render_college'):
+                    pass
+                probe.request_finished('chat', 'college', 'en', 200, 0.001)
+            probe.flush()
+
+        results = {
+            'requests': {arm: len(samples) for arm, samples in timings.items()},
+            'request_us_off': medians['off'],
+            'request_us_on': medians['on'],
+            'measured_overhead': medians['on'] / medians['off'] - 1,
+            'control_delta': medians['control'] / medians['off'] - 1,
+            'mean_overhead': statistics.mean(timings['on']) / statistics.mean(timings['off']) - 1,
+            'metric_calls_us': self.time_per_call([instrumented_requests], 20) / batch,
+            'scrape_ms': self.time_per_call([lambda: client.get('/metrics')], 20) / 1000,
+        }
+        results['direct_overhead'] = results['metric_calls_us'] / results['request_us_off']
+        results['within_target'] = results['measured_overhead'] < target
+
+        print(f"Chat request: {medians['off']:.1f} us without metrics, {medians['on']:.1f} us with "
+              f"(medians of ~{requests_per_arm} requests per arm)")
+        print(f"End-to-end overhead: {results['measured_overhead']:+.2%}, {'within' if results['within_target'] else 'over'} "
+              f"the {target:.0%} target; control arm, also off: {results['control_delta']:+.2%}")
+        print(f"Overhead of the means, including requests slowed by a flush or a pause: {results['mean_overhead']:+.2%}")
+        print(f"Metric calls and their flush per request: {results['metric_calls_us']:.1f} us "
+              f"({results['direct_overhead']:.2%} of a request)")
+        print(f"/metrics scrape: {results['scrape_ms']:.2f} ms")
+        return results
+
+    def bench_quantiles(self, sizes=(10000, 100000, 1000000), seed=42):
+        """Compare latency quantiles from a list of every sample with the log-bucket histograms.
+
+        Durations are lognormal, like response times. For each size this reports
+        the memory held, the time to compute p50/p95/p99 and the histogram's
+        worst relative error against the exact nearest-rank quantiles.
+        """
+        import math
+        import tracemalloc
+        from performance_monitor import PerformanceMonitor, RELATIVE_ERROR
+
+        rng = random.Random(seed)
+        results = []
+        for size in sizes:
+            durations = [rng.lognormvariate(4, 1) for _ in range(size)]
+
+            tracemalloc.start()
+            samples = []
+            for duration in durations:
+                samples.append(duration)
+            list_kb = tracemalloc.get_traced_memory()[0] / 1024
+            tracemalloc.stop()
+            start = time.perf_counter()
+            ordered = sorted(samples)
+            exact = {q: ordered[max(1, math.ceil(q * size)) - 1] for q in (0.5, 0.95, 0.99)}
+            list_ms = (time.perf_counter() - start) * 1000
+
+            tracemalloc.start()
+            monitor = PerformanceMonitor(enabled=False)
+            for duration in durations:
+                monitor.record_duration('text_query', duration)
+            histogram_kb = tracemalloc.get_traced_memory()[0] / 1024
+            tracemalloc.stop()
+            start = time.perf_counter()
+            metrics = monitor.get_metrics()['text_query']
+            histogram_ms = (time.perf_counter() - start) * 1000
+
+            error = max(abs(metrics[f'p{round(q * 100)}'] - value) / value for q, value in exact.items())
+            results.append({
+                'samples': size,
+                'list_kb': list_kb,
+                'histogram_kb': histogram_kb,
+                'list_quantiles_ms': list_ms,
+                'histogram_quantiles_ms': histogram_ms,
+                'max_relative_error': error,
+            })
+            print(f"{size:>8} samples: list {list_kb:8.0f} KB, {list_ms:7.2f} ms | "
+                  f"histograms {histogram_kb:5.0f} KB, {histogram_ms:5.2f} ms (all windows) | "
+                  f"error {error:.3%} (bound {RELATIVE_ERROR:.0%})")
+
+        monitor = PerformanceMonitor(enabled=False)
+        record_us = self.time_per_call([lambda: monitor.record_duration('text_query', 12.5)], 100000)
+        print(f"Recording one duration: {record_us:.2f} us")
+        return {'sizes': results, 'record_us': record_us}
+
+    def save_results(self, name, results):
+        """Save benchmark results to file"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'{self.results_dir}/benchmark_{name}_{timestamp}.json'
+
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        print(f"Results saved to {filename}")
+        return filename
+
+
+BENCHMARKS = {
+    'router': BenchmarkRunner.bench_router,
+    'college_index': BenchmarkRunner.bench_college_index,
+    'search_cache': BenchmarkRunner.bench_search_cache,
+    'fragments': BenchmarkRunner.bench_fragments,
+    'memory': BenchmarkRunner.bench_memory,
+    'startup': BenchmarkRunner.bench_startup,
+    'ingest': BenchmarkRunner.bench_ingest,
+    'names': BenchmarkRunner.bench_names,
+    'local': BenchmarkRunner.bench_local,
+    'batch': BenchmarkRunner.bench_batch,
+    'language': BenchmarkRunner.bench_language,
+    'admission': BenchmarkRunner.bench_admission,
+    'upstream': BenchmarkRunner.bench_upstream,
+    'metrics': BenchmarkRunner.bench_metrics,
+    'quantiles': BenchmarkRunner.bench_quantiles,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run backend micro-benchmarks')
+    parser.add_argument('benchmarks', nargs='*', metavar='name',
+                        help=f"benchmarks to run: {', '.join(sorted(BENCHMARKS))} (default: all)")
+    parser.add_argument('--save', action='store_true', help='save results as JSON')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    runner = BenchmarkRunner()
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        print(f"\nRunning {name} benchmark...")
+        results = BENCHMARKS[name](runner)
+        if args.save:
+            runner.save_results(name, results)
+
+
+if __name__ == '__main__':
+    main()
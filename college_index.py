@@ -0,0 +1,187 @@
+import heapq
+import re
+from array import array
+
+from intent_router import CITIES
+from college_store import CollegeStore
+
+# Course names that place a college in each field
+COURSE_FAMILIES = {
+    'engineering': {'b.tech', 'engineering', 'b.e.'},
+    'medical': {'mbbs', 'medical', 'medicine'},
+    'management': {'mba', 'management', 'business', 'pgdm'},
+}
+
+# Ownership values grouped under each type filter
+TYPE_GROUPS = {
+    'government': {'government', 'govt', 'public'},
+    'private': {'private'},
+}
+
+NUMBER_PATTERN = re.compile(r'(\d+(?:\.\d+)?)')
+
+AFFORDABLE_LIMIT = 15
+
+POSTINGS = ('by_city', 'by_field', 'by_type')
+
+
+def parse_fee(fees):
+    """Return the first number in a fee string, or infinity if there is none"""
+    if not fees or not isinstance(fees, str):
+        return float('inf')
+    numbers = NUMBER_PATTERN.findall(fees.replace(',', ''))
+    if numbers:
+        return float(numbers[0])
+    return float('inf')
+
+
+def parse_rating(rating):
+    """Return a sortable score where higher is better, inverting NIRF ranks"""
+    try:
+        if isinstance(rating, str):
+            # Handle NIRF rank (lower is better)
+            if 'nirf' in rating.lower():
+                match = NUMBER_PATTERN.search(rating)
+                if match:
+                    return 1000 - float(match.group(1))
+
+            # Handle regular ratings (higher is better)
+            rating = rating.replace('/5', '').replace('/10', '').strip()
+        return float(rating)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def normalize_courses(courses):
+    """Return the lowercased course names of a record"""
+    if not isinstance(courses, list):
+        courses = [courses or '']
+    return {str(course).lower() for course in courses}
+
+
+class CollegeIndex:
+    """In-memory index over Maharashtra college records.
+
+    Posting lists map each city, course family and ownership type to a set of
+    record ids, so filters become set intersections. Fees and ratings are
+    parsed once into numeric arrays, and the rating order is kept as a few
+    sorted runs. A CollegeStore is indexed in place; other record lists
+    are copied.
+
+    Extending the index costs about the added records, not the whole
+    index: like a CollegeStore, the fee and rating arrays grow in place and
+    older versions only read their own ids, only the posting sets the new
+    records join are copied, and the new records form a rating run of
+    their own, merged with runs no larger than twice its size.
+    """
+
+    def __init__(self, colleges):
+        self.records = colleges if isinstance(colleges, CollegeStore) else []
+        self.fees = array('d')
+        self.ratings = array('d')
+        self.by_city = {}
+        self.by_field = {}
+        self.by_type = {}
+        # (postings, key) of the sets this index added to; None while it owns all of them
+        self.changed = None
+        for college in colleges:
+            self.add(college)
+        self.count = len(self.records)
+        self.rating_runs = [self._rating_run(range(self.count))]
+
+    def __len__(self):
+        return self.count
+
+    def _rating_run(self, ids):
+        return array('I', sorted(ids, key=self.ratings.__getitem__, reverse=True))
+
+    def extended(self, store, colleges):
+        """Return an index over store, this index's store extended with colleges, leaving this one unchanged"""
+        if len(self.fees) != self.count:
+            raise ValueError("Only the latest version of a college index can be extended")
+        index = CollegeIndex.__new__(CollegeIndex)
+        index.records = store
+        index.fees = self.fees
+        index.ratings = self.ratings
+        for postings in POSTINGS:
+            setattr(index, postings, dict(getattr(self, postings)))
+        index.changed = set()
+        for college in colleges:
+            index.add(college)
+        index.count = len(store)
+
+        runs = self.rating_runs + [index._rating_run(range(self.count, index.count))]
+        # Runs shrink from oldest to newest, so each id is merged O(log n) times
+        while len(runs) > 1 and len(runs[-2]) <= 2 * len(runs[-1]):
+            run = runs.pop()
+            runs[-1] = index._rating_run(runs[-1].tolist() + run.tolist())
+        index.rating_runs = runs
+        return index
+
+    def _post(self, postings, key, college_id):
+        """Add an id to a posting set, copying a set shared with the index this one extends"""
+        ids = getattr(self, postings).get(key)
+        if self.changed is not None and (postings, key) not in self.changed:
+            self.changed.add((postings, key))
+            ids = getattr(self, postings)[key] = set(ids or ())
+        elif ids is None:
+            ids = getattr(self, postings)[key] = set()
+        ids.add(college_id)
+
+    def add(self, college):
+        """Index a single college record and return its id"""
+        college_id = len(self.fees)
+        if college_id == len(self.records):
+            self.records.append(college)
+        self.fees.append(parse_fee(college.get('fees', '')))
+        self.ratings.append(parse_rating(college.get('rating', '0')))
+
+        location = (college.get('location') or '').lower()
+        for city in CITIES:
+            if city in location:
+                self._post('by_city', city, college_id)
+        for part in location.split(','):
+            part = part.strip()
+            if part:
+                self._post('by_city', part, college_id)
+
+        courses = normalize_courses(college.get('courses', []))
+        for field, family in COURSE_FAMILIES.items():
+            if courses & family:
+                self._post('by_field', field, college_id)
+
+        college_type = (college.get('type') or '').lower()
+        for type_name, group in TYPE_GROUPS.items():
+            if college_type in group:
+                self._post('by_type', type_name, college_id)
+
+        return college_id
+
+    def filter_ids(self, city=None, field=None, college_type=None):
+        """Return the ids matching every given filter, or None when unfiltered"""
+        candidates = None
+        for postings, key in ((self.by_city, city), (self.by_field, field), (self.by_type, college_type)):
+            if key is None:
+                continue
+            ids = postings.get(key, set())
+            candidates = ids if candidates is None else candidates & ids
+        return candidates
+
+    def search(self, city=None, field=None, college_type=None, affordable=False, limit=5):
+        """Return the best rated colleges matching the filters"""
+        if field not in COURSE_FAMILIES:
+            field = None
+        candidates = self.filter_ids(city, field, college_type)
+
+        if affordable:
+            pool = range(self.count) if candidates is None else candidates
+            cheapest = heapq.nsmallest(AFFORDABLE_LIMIT, pool, key=lambda i: (self.fees[i], i))
+            ranked = sorted(cheapest, key=self.ratings.__getitem__, reverse=True)[:limit]
+        elif candidates is None:
+            # Ties go to the lower id, as in a single stable sort
+            heads = [i for run in self.rating_runs for i in run[:limit]]
+            ranked = heapq.nlargest(limit, heads, key=lambda i: (self.ratings[i], -i))
+        else:
+            ranked = heapq.nlargest(limit, candidates, key=lambda i: (self.ratings[i], -i))
+
+        return [self.records[i] for i in ranked]
@@ -0,0 +1,271 @@
+import csv
+import io
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+# Upload formats by file extension
+FORMATS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+# Column names seen in college lists, mapped to the maharashtra_colleges fields
+FIELD_ALIASES = {
+    'name': 'name', 'college': 'name', 'college_name': 'name', 'institute': 'name', 'institute_name': 'name',
+    'location': 'location', 'city': 'city', 'district': 'city', 'state': 'state',
+    'source': 'source',
+    'fees': 'fees', 'fee': 'fees', 'annual_fees': 'fees',
+    'rating': 'rating', 'nirf_rank': 'rating', 'nirf_ranking': 'rating', 'nirf': 'rating',
+    'courses': 'courses', 'course': 'courses', 'programs': 'courses', 'programmes': 'courses',
+    'type': 'type', 'ownership': 'type', 'college_type': 'type',
+    'website': 'website', 'url': 'website',
+    'established': 'established', 'year_established': 'established', 'founded': 'established',
+    'approved_by': 'approved_by', 'approval': 'approved_by',
+    'address': 'address',
+    'admission_process': 'admission_process', 'admission': 'admission_process',
+}
+
+LIST_FIELDS = ('courses', 'approved_by')
+
+# CSV cells hold lists separated by semicolons or pipes
+LIST_SEPARATOR = re.compile(r'\s*[;|]\s*')
+
+READ_SIZE = 64 * 1024
+
+
+def upload_format(filename):
+    """Return the college list format for an uploaded filename, or None"""
+    return FORMATS.get(os.path.splitext(filename or '')[1].lower())
+
+
+@lru_cache(maxsize=1024)
+def schema_field(key):
+    """Return the schema field for a column name, or None to drop the column"""
+    return FIELD_ALIASES.get(str(key).strip().lower().replace(' ', '_'))
+
+
+def iter_json_array(f):
+    """Yield the items of a top-level JSON array, reading the file in chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace and separators between items
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+            if buffer[position] == '[':
+                if started:
+                    break
+                started = True
+            elif not started and buffer[position] == ',':
+                raise ValueError("Expected a JSON array of colleges")
+            position += 1
+        if position < len(buffer):
+            if not started:
+                raise ValueError("Expected a JSON array of colleges")
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The item may continue in the next chunk
+                if eof:
+                    raise
+            else:
+                # A number at the very end of the buffer may be cut short
+                if end < len(buffer) or eof:
+                    yield item
+                    position = end
+                    continue
+        elif eof:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = f.read(READ_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_records(f, fmt):
+    """Yield raw records from a text file in one of the upload formats"""
+    if fmt == 'csv':
+        yield from csv.DictReader(f)
+    elif fmt == 'jsonl':
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        yield from iter_json_array(f)
+
+
+def normalize_college(record, source):
+    """Map a raw record onto the maharashtra_colleges schema, or return None if it has no name"""
+    if not isinstance(record, dict):
+        return None
+
+    college = {}
+    for key, value in record.items():
+        field = schema_field(key)
+        if field is None or value is None:
+            continue
+        if field in LIST_FIELDS:
+            if isinstance(value, str):
+                value = LIST_SEPARATOR.split(value.strip())
+            elif not isinstance(value, list):
+                value = [value]
+            value = [str(item).strip() for item in value if str(item).strip()]
+        else:
+            value = str(value).strip()
+        if value:
+            college[field] = value
+
+    if not college.get('name'):
+        return None
+
+    city = college.pop('city', None)
+    state = college.pop('state', None)
+    if not college.get('location'):
+        college['location'] = ', '.join(part for part in (city, state or 'Maharashtra') if part)
+    college.setdefault('source', source)
+    return college
+
+
+class IngestJob:
+    """Progress of one uploaded college list"""
+
+    def __init__(self, path, filename, sha256, fmt):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.filename = filename
+        self.sha256 = sha256
+        self.format = fmt
+        self.status = 'queued'
+        self.records = 0
+        self.skipped = 0
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'sha256': self.sha256,
+            'format': self.format,
+            'records': self.records,
+            'skipped': self.skipped,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class CollegeIngestor:
+    """Bounded worker pool that merges uploaded college lists into the live dataset.
+
+    Jobs wait in a fixed-size queue. A worker streams the file record by
+    record, normalizes each one and merges them into the dataset in
+    batches, so the data becomes searchable as the file is read. Each
+    merge swaps in a new snapshot through Dataset.merge, at a cost that
+    grows with the batch rather than the data so far, and workers pause
+    between batches so chat requests keep the interpreter. A file already
+    ingested (same sha256) returns its existing job.
+    """
+
+    def __init__(self, dataset, workers=2, max_queued=16, batch_size=5000, pause=0.01, max_jobs=1000):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.pause = pause
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.by_sha256 = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=max_queued)
+        for i in range(workers):
+            threading.Thread(target=self.work, name=f'college-ingest-{i}', daemon=True).start()
+
+    def submit(self, path, filename, sha256):
+        """Queue an uploaded file; returns its job, or None when the queue is full"""
+        with self.lock:
+            job = self.by_sha256.get(sha256)
+            if job is not None and job.status != 'failed':
+                return job
+            job = IngestJob(path, filename, sha256, upload_format(filename))
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                return None
+            self.jobs[job.id] = job
+            self.by_sha256[sha256] = job
+            # Forget the oldest finished jobs
+            while len(self.jobs) > self.max_jobs:
+                _, old = self.jobs.popitem(last=False)
+                if self.by_sha256.get(old.sha256) is old:
+                    del self.by_sha256[old.sha256]
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self.run(job)
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e)
+                print(f"Error ingesting {job.filename}: {str(e)}")
+            finally:
+                job.finished_at = datetime.now().isoformat()
+                self.queue.task_done()
+
+    def run(self, job):
+        job.status = 'running'
+        job.started_at = datetime.now().isoformat()
+        if job.format is None:
+            raise ValueError(f"Unsupported college list format: {job.filename}")
+        source = f"Upload ({job.filename})"
+        batch = []
+        with io.open(job.path, 'r', encoding='utf-8-sig', newline='') as f:
+            for record in iter_records(f, job.format):
+                college = normalize_college(record, source)
+                if college is None:
+                    job.skipped += 1
+                    continue
+                batch.append(college)
+                if len(batch) >= self.batch_size:
+                    self.merge(job, batch)
+                    batch = []
+        if batch:
+            self.merge(job, batch)
+        job.status = 'done'
+
+    def merge(self, job, batch):
+        self.dataset.merge(batch, f"{job.sha256}:{job.records}")
+        job.records += len(batch)
+        time.sleep(self.pause)
+
+    def stats(self):
+        """Return job counts by status and the queue length"""
+        with self.lock:
+            statuses = {}
+            for job in self.jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {'jobs': statuses, 'queued': self.queue.qsize()}
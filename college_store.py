@@ -0,0 +1,156 @@
+from array import array
+from collections.abc import Mapping
+
+class _Missing:
+    """Marker for absent fields; unpickles to the module's single instance"""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+# Code 0 of every column marks a record without that field
+MISSING = _Missing()
+
+
+class CollegeRecord(Mapping):
+    """Read-only dict-like view of one college in a CollegeStore"""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def key(self):
+        """Stable identifier of the record within the loaded dataset"""
+        return f"{self.store.prefix}:{self.index}"
+
+    def __getitem__(self, name):
+        column = self.store.columns.get(name)
+        if column is None:
+            raise KeyError(name)
+        value = column[0][column[1][self.index]]
+        if value is MISSING:
+            raise KeyError(name)
+        # Lists are stored as interned tuples
+        return list(value) if isinstance(value, tuple) else value
+
+    def __contains__(self, name):
+        column = self.store.columns.get(name)
+        return column is not None and column[1][self.index] != 0
+
+    def __iter__(self):
+        return (name for name, (_, codes) in self.store.columns.items() if codes[self.index] != 0)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"CollegeRecord({dict(self)!r})"
+
+
+class CollegeStore:
+    """Column-oriented, append-only store of college records.
+
+    Every field is a categorical column: the distinct values are kept once
+    and each record holds a 32-bit code per field. Locations, sources,
+    types and course lists repeat across thousands of colleges, so they
+    cost four bytes per record instead of a string per dict. Records are
+    read through CollegeRecord views, which behave like the original dicts.
+    """
+
+    def __init__(self, colleges=(), prefix='college'):
+        self.prefix = prefix
+        self.columns = {}
+        self.count = 0
+        # Value -> code per column, handed on to the store that extends this one
+        self.lookups = {}
+        self._append(colleges, self.lookups)
+
+    def __getstate__(self):
+        # The lookups are rebuilt from the columns if an unpickled store is extended
+        return dict(self.__dict__, lookups=None)
+
+    def _append(self, colleges, lookups):
+        """Append records, interning values through lookups (value -> code per column)"""
+        for college in colleges:
+            for name, value in college.items():
+                column = self.columns.get(name)
+                if column is None:
+                    column = self.columns[name] = ([MISSING], array('I', bytes(4 * self.count)))
+                    lookups[name] = {}
+                if isinstance(value, list):
+                    value = tuple(value)
+                lookup = lookups[name]
+                try:
+                    code = lookup.get(value)
+                    if code is None:
+                        code = lookup[value] = len(column[0])
+                        column[0].append(value)
+                except TypeError:
+                    # Unhashable values (nested objects) are kept without interning
+                    code = len(column[0])
+                    column[0].append(value)
+                column[1].append(code)
+            self.count += 1
+            # Fields this record lacks get the missing code
+            for _, codes in self.columns.values():
+                if len(codes) < self.count:
+                    codes.append(0)
+
+    def extended(self, colleges):
+        """Return a new store with colleges appended, leaving this one unchanged.
+
+        The columns grow in place and are shared: this store keeps reading
+        only its first count records, so views handed out earlier stay
+        valid. Only the latest store of such a chain can be extended.
+        """
+        if any(len(codes) != self.count for _, codes in self.columns.values()):
+            raise ValueError("Only the latest version of a college store can be extended")
+        lookups = self.lookups if self.lookups is not None else self._lookups()
+        # Only the new store can be extended further, so it takes the lookups over
+        self.lookups = None
+
+        store = CollegeStore(prefix=self.prefix)
+        store.columns = dict(self.columns)
+        store.count = self.count
+        store.lookups = lookups
+        store._append(colleges, lookups)
+        return store
+
+    def _lookups(self):
+        """Rebuild the value -> code lookups of every column"""
+        lookups = {}
+        for name, (values, _) in self.columns.items():
+            try:
+                # Interned values are distinct, so later duplicates cannot shadow earlier codes
+                lookups[name] = dict(zip(values[1:], range(1, len(values))))
+            except TypeError:
+                lookup = lookups[name] = {}
+                for code, value in enumerate(values[1:], 1):
+                    try:
+                        lookup.setdefault(value, code)
+                    except TypeError:
+                        pass
+        return lookups
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [CollegeRecord(self, i) for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return CollegeRecord(self, index)
+
+    def __iter__(self):
+        return (CollegeRecord(self, i) for i in range(self.count))
+
+    def __bool__(self):
+        return self.count > 0
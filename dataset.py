@@ -0,0 +1,344 @@
+import argparse
+import contextvars
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+from college_index import CollegeIndex
+from college_store import CollegeStore
+from fragment_store import FragmentStore
+from intent_router import IntentRouter
+from knowledge_base import KnowledgeBase, education_documents
+from name_index import NameIndex
+from renderers import RECORD_KINDS, render_exam, render_maharashtra_college, render_top_college
+from response_catalogue import file_hash
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+DEFAULT_DATA_PATH = os.getenv('EDUCATION_DATA_PATH', os.path.join(DATA_DIR, 'indian_education_data.json'))
+DEFAULT_COLLEGES_PATH = os.getenv('MAHARASHTRA_COLLEGES_PATH', os.path.join(DATA_DIR, 'maharashtra_colleges.json'))
+DEFAULT_SNAPSHOT_PATH = os.getenv('DATASET_SNAPSHOT_PATH',
+                                  os.path.join(os.path.dirname(__file__), 'cache', 'dataset.snapshot'))
+
+# Bump when Snapshot or anything it holds changes shape, so old snapshot files are ignored
+SNAPSHOT_FORMAT_VERSION = 7
+
+# Snapshot pinned by the request being served in this thread or task
+_pinned = contextvars.ContextVar('dataset_snapshot', default=None)
+
+
+class Snapshot:
+    """The loaded data files and everything derived from them.
+
+    A snapshot is never modified after it is built; reloading or merging
+    ingested colleges builds a new one, so a request keeps a consistent
+    view for its whole lifetime.
+    """
+
+    def __init__(self, version, education_data, maharashtra_colleges, file_hashes=None):
+        self.version = version
+        # Version of the data files alone, and how many colleges came from them
+        self.base_version = version
+        self.loaded_colleges = len(maharashtra_colleges)
+        self.file_hashes = file_hashes or {}
+        self.education_data = education_data
+        self.maharashtra_colleges = maharashtra_colleges
+        self.maharashtra_index = CollegeIndex(maharashtra_colleges)
+        self.router = IntentRouter(education_data)
+        self.fragments = FragmentStore()
+        self.fragments.build(education_data, maharashtra_colleges)
+        self.names = NameIndex()
+        for colleges in education_data.get('top_colleges', {}).values():
+            for college in colleges:
+                self.names.add([college['name']], (render_top_college, college))
+        for exams in education_data.get('entrance_exams', {}).values():
+            for exam in exams:
+                self.names.add([exam['name'], exam.get('full_name', '')], (render_exam, exam))
+        # Maharashtra colleges are targeted by index, resolved against this snapshot's list
+        for i, college in enumerate(maharashtra_colleges):
+            self.names.add([college['name']], i)
+        self.knowledge = KnowledgeBase(education_documents(education_data))
+
+    def with_colleges(self, colleges, version):
+        """Return a snapshot with colleges appended to the Maharashtra list, sharing everything else"""
+        snapshot = Snapshot.__new__(Snapshot)
+        snapshot.__dict__.update(self.__dict__)
+        snapshot.version = version
+        snapshot.maharashtra_colleges = self.maharashtra_colleges.extended(colleges)
+        snapshot.maharashtra_index = self.maharashtra_index.extended(snapshot.maharashtra_colleges, colleges)
+        snapshot.fragments = self.fragments.with_store(snapshot.maharashtra_colleges)
+        start = len(self.maharashtra_colleges)
+        snapshot.names = self.names.extended(([college['name']], start + i) for i, college in enumerate(colleges))
+        return snapshot
+
+    def named(self, text):
+        """Return (render, record) for the college or exam the text names, or None"""
+        target = self.names.best(text)
+        if isinstance(target, int):
+            return render_maharashtra_college, self.maharashtra_colleges[target]
+        return target
+
+    def route(self, text):
+        """Route a query like IntentRouter.route, resolving what it asks about in the local data.
+
+        'named' is the (render, record) of a college or exam asked about by
+        name; 'local' lists the records answering a general question, so it
+        needs no web search.
+        """
+        route = self.router.route(text)
+        route['named'] = None
+        route['local'] = None
+        if route['common'] is None and route['intent'] in ('general', 'college', 'exam'):
+            route['named'] = self.named(text)
+            if route['named'] is not None:
+                route['intent'] = RECORD_KINDS[route['named'][0]][0]
+            elif route['intent'] == 'general':
+                route['local'] = self.knowledge.search(text) or None
+        return route
+
+    def ingested_colleges(self):
+        """Return the colleges merged in after the data files were loaded, as dicts"""
+        return [dict(college) for college in self.maharashtra_colleges[self.loaded_colleges:]]
+
+
+def read_json(path):
+    """Return a file's parsed JSON and the sha256 of the exact bytes parsed"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return json.loads(raw), hashlib.sha256(raw).hexdigest()
+
+
+def dataset_version(file_hashes):
+    """Return the version id of the data files with these hashes"""
+    return hashlib.sha256(':'.join(file_hashes.values()).encode()).hexdigest()[:16]
+
+
+def merged_version(version, tag):
+    """Return the version id of a snapshot after merging a batch identified by tag"""
+    return hashlib.sha256(f"{version}:{tag}".encode()).hexdigest()[:16]
+
+
+def parse_snapshot(data_path=DEFAULT_DATA_PATH, colleges_path=DEFAULT_COLLEGES_PATH):
+    """Parse and index the data files into a new snapshot"""
+    education_data, data_hash = read_json(data_path)
+    file_hashes = {data_path: data_hash}
+
+    # Load Maharashtra college data if available
+    maharashtra_colleges = []
+    if os.path.exists(colleges_path):
+        try:
+            maharashtra_colleges, file_hashes[colleges_path] = read_json(colleges_path)
+            print(f"Loaded {len(maharashtra_colleges)} Maharashtra colleges")
+        except Exception as e:
+            print(f"Error loading Maharashtra colleges: {str(e)}")
+
+    # Keep the college lists as compact columnar stores
+    maharashtra_colleges = CollegeStore(maharashtra_colleges, prefix='maharashtra')
+    education_data['top_colleges'] = {
+        field: CollegeStore(colleges, prefix=f'college:{field}')
+        for field, colleges in education_data['top_colleges'].items()
+    }
+
+    return Snapshot(dataset_version(file_hashes), education_data, maharashtra_colleges, file_hashes)
+
+
+def write_snapshot(snapshot, path=DEFAULT_SNAPSHOT_PATH):
+    """Write a parsed snapshot to a binary file atomically.
+
+    The file holds two pickles: a small header with the data version,
+    checked before anything else is read, then the snapshot itself.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'format_version': SNAPSHOT_FORMAT_VERSION, 'version': snapshot.version}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path, file_hashes):
+    """Return the snapshot stored at path if it was built from files with these hashes, else None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            header = pickle.load(f)
+            if header.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+                return None
+            if header.get('version') != dataset_version(file_hashes):
+                return None
+            snapshot = pickle.load(f)
+    except Exception as e:
+        print(f"Error loading dataset snapshot: {str(e)}")
+        return None
+    snapshot.file_hashes = file_hashes
+    return snapshot
+
+
+def load_snapshot(data_path=DEFAULT_DATA_PATH, colleges_path=DEFAULT_COLLEGES_PATH, snapshot_path=DEFAULT_SNAPSHOT_PATH):
+    """Load the data files from a fresh binary snapshot, or parse them and write one.
+
+    Hashing the files is much cheaper than parsing and indexing them, so a
+    worker whose snapshot matches the files skips straight to serving. The
+    snapshot is only ever read from the local cache directory this server
+    writes to; pickles must not come from anywhere else.
+    """
+    if snapshot_path:
+        file_hashes = {data_path: file_hash(data_path)}
+        if os.path.exists(colleges_path):
+            file_hashes[colleges_path] = file_hash(colleges_path)
+        snapshot = read_snapshot(snapshot_path, file_hashes)
+        if snapshot is not None:
+            return snapshot
+
+    snapshot = parse_snapshot(data_path, colleges_path)
+    if snapshot_path:
+        try:
+            write_snapshot(snapshot, snapshot_path)
+        except OSError as e:
+            print(f"Error saving dataset snapshot: {str(e)}")
+    return snapshot
+
+
+class Dataset:
+    """Holds the current snapshot and swaps in a new one when the data files change.
+
+    A watcher thread polls the files' mtime and size; when they change the
+    files are parsed and indexed off the request path, and the snapshot
+    reference is replaced in one assignment. Requests pin the snapshot they
+    started with, so in-flight requests finish on the old data. Ingested
+    colleges are merged the same way, and survive later reloads.
+    """
+
+    def __init__(self, data_path=DEFAULT_DATA_PATH, colleges_path=DEFAULT_COLLEGES_PATH,
+                 snapshot_path=DEFAULT_SNAPSHOT_PATH):
+        self.data_path = data_path
+        self.colleges_path = colleges_path
+        self.snapshot_path = snapshot_path
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.watch_thread = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self.merges = 0
+        self.signature = self._signature()
+        self.snapshot = load_snapshot(data_path, colleges_path, snapshot_path)
+
+    def _signature(self):
+        """Return the mtime and size of each data file, None for a missing file"""
+        signature = []
+        for path in (self.data_path, self.colleges_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def current(self):
+        """Return the snapshot pinned by this request, or the latest one"""
+        return _pinned.get() or self.snapshot
+
+    def pin(self):
+        """Pin the latest snapshot for the rest of this request; returns a token for unpin"""
+        return _pinned.set(self.snapshot)
+
+    def unpin(self, token):
+        _pinned.reset(token)
+
+    def on_swap(self, listener):
+        """Call listener(old, new) after each snapshot swap"""
+        self.listeners.append(listener)
+
+    def check(self):
+        """Reload if the data files changed; return whether a new snapshot was swapped in"""
+        with self.lock:
+            signature = self._signature()
+            if signature == self.signature:
+                return False
+            self.signature = signature
+
+            try:
+                snapshot = load_snapshot(self.data_path, self.colleges_path, self.snapshot_path)
+            except Exception as e:
+                # Likely a partially written file; the next change triggers another try
+                self.reload_errors += 1
+                print(f"Error reloading data, keeping version {self.snapshot.version}: {str(e)}")
+                return False
+
+            # Touched but unchanged files keep the current snapshot and its caches
+            if snapshot.version == self.snapshot.base_version:
+                return False
+
+            # Colleges ingested since startup are carried over to the reloaded data
+            ingested = self.snapshot.ingested_colleges()
+            if ingested:
+                snapshot = snapshot.with_colleges(ingested, merged_version(snapshot.version, self.snapshot.version))
+
+            old, self.snapshot = self.snapshot, snapshot
+            self.reloads += 1
+
+        print(f"Reloaded data: version {old.version} -> {snapshot.version}")
+        self._notify(old, snapshot)
+        return True
+
+    def merge(self, colleges, tag):
+        """Append colleges to the current Maharashtra data and swap in the result; returns the new snapshot"""
+        with self.lock:
+            old = self.snapshot
+            snapshot = self.snapshot = old.with_colleges(colleges, merged_version(old.version, tag))
+            self.merges += 1
+        self._notify(old, snapshot)
+        return snapshot
+
+    def _notify(self, old, new):
+        for listener in self.listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                print(f"Error in data reload listener: {str(e)}")
+
+    def watch(self, interval):
+        """Poll the data files every interval seconds on a daemon thread"""
+        if interval <= 0 or self.watch_thread is not None:
+            return
+
+        def poll():
+            while True:
+                time.sleep(interval)
+                self.check()
+
+        self.watch_thread = threading.Thread(target=poll, name='dataset-watcher', daemon=True)
+        self.watch_thread.start()
+
+    def stats(self):
+        """Return the current version and reload counters"""
+        return {
+            'version': self.snapshot.version,
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors,
+            'merges': self.merges,
+            'ingested_colleges': len(self.snapshot.maharashtra_colleges) - self.snapshot.loaded_colleges,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the binary dataset snapshot loaded at startup')
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH, help='source education data JSON')
+    parser.add_argument('--colleges', default=DEFAULT_COLLEGES_PATH, help='source Maharashtra colleges JSON')
+    parser.add_argument('--output', default=DEFAULT_SNAPSHOT_PATH, help='snapshot file to write')
+    args = parser.parse_args()
+
+    # Run as a script this module is __main__; build through the importable module so that
+    # the pickled classes are dataset.Snapshot, which the server can load
+    import dataset
+    snapshot = dataset.parse_snapshot(args.data, args.colleges)
+    dataset.write_snapshot(snapshot, args.output)
+    print(f"Wrote dataset snapshot {snapshot.version} to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
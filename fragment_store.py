@@ -0,0 +1,192 @@
+import threading
+from collections import OrderedDict
+
+from college_store import CollegeRecord, CollegeStore
+from renderers import (Fragment, render_top_college, render_exam, render_scholarship, render_maharashtra_college,
+                       render_record)
+
+
+class FragmentStore:
+    """Record blocks rendered once per data load, with per-language translations.
+
+    Responses are a header plus the numbered fragments of the matching
+    records, so repeat renders only join precomputed strings, and a
+    fragment is translated once per language instead of once per request.
+    Records of a columnar CollegeStore are rendered on first use and kept
+    in an LRU, since fragments of every scraped college would outweigh
+    the compact store itself.
+    """
+
+    def __init__(self, max_translations=50000, max_lazy_fragments=5000):
+        self.max_translations = max_translations
+        self.max_lazy_fragments = max_lazy_fragments
+        self.fragments = {}
+        self.identities = {}
+        self.stores = {}
+        self.lazy = OrderedDict()
+        self.translations = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def build(self, education_data, maharashtra_colleges=()):
+        """Render the records of the loaded data, replacing any earlier fragments"""
+        fragments = {}
+        identities = {}
+
+        def add(key, render, record):
+            fragments[key] = Fragment(key, render(record))
+            # Store views carry their own key; plain dicts are matched by identity
+            if getattr(record, 'key', None) != key:
+                identities[id(record)] = (record, key)
+
+        for field, colleges in education_data.get('top_colleges', {}).items():
+            for i, college in enumerate(colleges):
+                add(f'college:{field}:{i}', render_top_college, college)
+        for field, exams in education_data.get('entrance_exams', {}).items():
+            for i, exam in enumerate(exams):
+                add(f'exam:{field}:{i}', render_exam, exam)
+
+        scholarships = education_data.get('scholarships', [])
+        if isinstance(scholarships, dict):
+            scholarships = list(scholarships.values())
+        for i, scholarship in enumerate(scholarships):
+            add(f'scholarship:{i}', render_scholarship, scholarship)
+
+        stores = {}
+        if isinstance(maharashtra_colleges, CollegeStore):
+            stores[maharashtra_colleges.prefix] = maharashtra_colleges
+        else:
+            for i, college in enumerate(maharashtra_colleges):
+                add(f'maharashtra:{i}', render_maharashtra_college, college)
+
+        with self.lock:
+            self.fragments = fragments
+            self.identities = identities
+            self.stores = stores
+            self.lazy.clear()
+            self.translations.clear()
+        return len(fragments)
+
+    def __getstate__(self):
+        """Pickle the rendered fragments; the caches start empty when loaded"""
+        state = self.__dict__.copy()
+        del state['lock']
+        # Record ids do not survive pickling, so the identity map is rebuilt on load
+        state['identities'] = list(self.identities.values())
+        state.update(lazy=OrderedDict(), translations=OrderedDict(), hits=0, misses=0)
+        return state
+
+    def __setstate__(self, state):
+        state['identities'] = {id(record): (record, key) for record, key in state['identities']}
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def with_store(self, store):
+        """Return a fragment store that also serves records of a newer CollegeStore.
+
+        Records keep their keys when a store is extended, so the rendered
+        fragments and translations are shared with this store.
+        """
+        # Not copy.copy: pickling support would start the copy with empty caches
+        fragments = FragmentStore.__new__(FragmentStore)
+        fragments.__dict__.update(self.__dict__)
+        fragments.stores = dict(self.stores, **{store.prefix: store})
+        return fragments
+
+    def fragment(self, render, record):
+        """Return the pre-rendered block of a loaded record, rendering unknown records on demand"""
+        key = self.key(record)
+        if key is None:
+            return render_record(render, record)
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            return fragment
+
+        with self.lock:
+            fragment = self.lazy.get(key)
+            if fragment is not None:
+                self.lazy.move_to_end(key)
+                return fragment
+        fragment = Fragment(key, render(record))
+        with self.lock:
+            self.lazy[key] = fragment
+            while len(self.lazy) > self.max_lazy_fragments:
+                self.lazy.popitem(last=False)
+        return fragment
+
+    def key(self, record):
+        """Return the stable key of a loaded record, or None"""
+        entry = self.identities.get(id(record))
+        if entry is not None and entry[0] is record:
+            return entry[1]
+        if isinstance(record, CollegeRecord) and self.stores.get(record.store.prefix) is record.store:
+            return record.key
+        key = getattr(record, 'key', None)
+        return key if key in self.fragments else None
+
+    def _cached(self, key, lang):
+        with self.lock:
+            translation = self.translations.get((key, lang))
+            if translation is None:
+                self.misses += 1
+            else:
+                self.translations.move_to_end((key, lang))
+                self.hits += 1
+            return translation
+
+    def _remember(self, key, lang, translation):
+        with self.lock:
+            self.translations[(key, lang)] = translation
+            while len(self.translations) > self.max_translations:
+                self.translations.popitem(last=False)
+
+    def translate(self, responses, lang, translate_many):
+        """Translate rendered responses, reusing the cached translations of whole fragments.
+
+        translate_many takes a list of block lists and returns their texts;
+        it is called once with the missing fragments and the other blocks.
+        """
+        jobs = []
+        fragment_jobs = {}
+        plans = []
+        for blocks in responses:
+            parts = []
+            run = []
+            for block in blocks:
+                if not isinstance(block, Fragment):
+                    run.append(block)
+                    continue
+                if run:
+                    parts.append(len(jobs))
+                    jobs.append(run)
+                    run = []
+                translation = self._cached(block.key, lang)
+                if translation is not None:
+                    parts.append(translation)
+                    continue
+                if block.key not in fragment_jobs:
+                    fragment_jobs[block.key] = len(jobs)
+                    jobs.append([block])
+                parts.append(fragment_jobs[block.key])
+            if run:
+                parts.append(len(jobs))
+                jobs.append(run)
+            plans.append(parts)
+
+        translated = translate_many(jobs) if jobs else []
+        for key, job in fragment_jobs.items():
+            self._remember(key, lang, translated[job])
+        return [''.join(translated[part] if isinstance(part, int) else part for part in parts) for parts in plans]
+
+    def stats(self):
+        """Return the number of fragments and translation cache counters"""
+        with self.lock:
+            return {
+                'fragments': len(self.fragments),
+                'lazy_fragments': len(self.lazy),
+                'translations': len(self.translations),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
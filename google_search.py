@@ -1,17 +1,18 @@
 import os
-import requests
 from dotenv import load_dotenv
 
+from upstream import search_upstream
+
 load_dotenv('.env.production')
 
 def google_search(query):
     try:
         api_key = os.getenv('GOOGLE_API_KEY')
         cse_id = os.getenv('CSE_ID')
-        url = f"https://www.googleapis.com/customsearch/v1?q={query}&key={api_key}&cx={cse_id}"
+        url = os.getenv('GOOGLE_SEARCH_URL', 'https://www.googleapis.com/customsearch/v1')
         
-        response = requests.get(url)
-        response.raise_for_status()
+        # Timeouts, retries and the circuit breaker are shared with the API server's searches
+        response = search_upstream.get(url, params={'q': query, 'key': api_key, 'cx': cse_id})
         
         items = response.json().get('items', [])
         return {
@@ -0,0 +1,156 @@
+import re
+
+# Keywords that select the query category, checked in this order
+INTENT_KEYWORDS = [
+    ('college', ['college', 'university', 'institute', 'iit', 'nit', 'aiims', 'iim']),
+    ('exam', ['exam', 'entrance', 'jee', 'neet', 'cat', 'xat', 'bitsat']),
+    ('scholarship', ['scholarship', 'financial aid', 'funding', 'stipend']),
+    ('admission', ['admission', 'apply', 'application', 'form', 'deadline', 'cutoff']),
+]
+
+# Field keywords differ slightly between the college, exam and admission renderers
+FIELD_KEYWORDS = {
+    'college': [
+        ('engineering', ['engineering', 'tech', 'b.tech', 'm.tech']),
+        ('medical', ['medical', 'mbbs', 'doctor', 'medicine']),
+        ('management', ['management', 'mba', 'business', 'pgdm']),
+        ('arts_and_science', ['arts', 'science', 'ba', 'bsc', 'ma', 'msc']),
+    ],
+    'exam': [
+        ('engineering', ['engineering', 'jee', 'bitsat']),
+        ('medical', ['medical', 'neet', 'aiims']),
+        ('management', ['management', 'cat', 'xat', 'mba']),
+    ],
+    'admission': [
+        ('engineering', ['engineering', 'tech', 'b.tech', 'm.tech']),
+        ('medical', ['medical', 'mbbs', 'doctor', 'medicine']),
+        ('management', ['management', 'mba', 'business', 'pgdm']),
+    ],
+}
+
+MAHARASHTRA_KEYWORDS = ['maharashtra', 'mumbai', 'pune', 'nagpur', 'aurangabad']
+
+CITIES = ['mumbai', 'pune', 'nagpur', 'aurangabad', 'nashik', 'amravati', 'solapur', 'kolhapur', 'thane', 'navi mumbai']
+
+TYPE_KEYWORDS = [
+    ('government', ['government', 'govt']),
+    ('private', ['private']),
+]
+
+FEE_KEYWORDS = ['affordable', 'cheap', 'low fee']
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens, keeping dotted forms like b.tech intact"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class IntentRouter:
+    """Routes a query to intent, field, city, type and fee flags in a single pass.
+
+    Every keyword phrase is stored in a dict keyed by its token tuple, so a
+    query is matched by looking up its word n-grams. The cost depends on the
+    query length and the longest phrase, not on how many keywords exist.
+    Matches respect word boundaries, so "hi" no longer matches "this".
+    """
+
+    def __init__(self, education_data):
+        self.phrases = {}
+        self.max_phrase_len = 1
+        self.common_responses = {}
+        self.common_order = {}
+
+        common_queries = education_data.get('common_queries', {})
+        for group in ('greetings', 'general'):
+            for key, response in common_queries.get(group, {}).items():
+                self.common_order[key] = len(self.common_order)
+                self.common_responses[key] = response
+                self._add(key, 'common', key)
+
+        for rank, (intent, keywords) in enumerate(INTENT_KEYWORDS):
+            for keyword in keywords:
+                self._add(keyword, 'intent', (rank, intent))
+
+        for intent, fields in FIELD_KEYWORDS.items():
+            for rank, (field, keywords) in enumerate(fields):
+                for keyword in keywords:
+                    self._add(keyword, 'field:' + intent, (rank, field))
+
+        for keyword in MAHARASHTRA_KEYWORDS:
+            self._add(keyword, 'maharashtra', True)
+
+        for rank, city in enumerate(CITIES):
+            self._add(city, 'city', (rank, city))
+
+        for rank, (college_type, keywords) in enumerate(TYPE_KEYWORDS):
+            for keyword in keywords:
+                self._add(keyword, 'type', (rank, college_type))
+
+        for keyword in FEE_KEYWORDS:
+            self._add(keyword, 'fee', True)
+
+    def _add(self, phrase, category, value):
+        """Register a keyword phrase for a category"""
+        tokens = tuple(tokenize(phrase))
+        if not tokens:
+            return
+        self.phrases.setdefault(tokens, []).append((category, value))
+        self.max_phrase_len = max(self.max_phrase_len, len(tokens))
+
+    def _lookup(self, tokens):
+        """Return the entries for a token tuple, allowing a plural final word"""
+        entries = self.phrases.get(tokens)
+        if entries is None and tokens[-1].endswith('s') and len(tokens[-1]) > 2:
+            entries = self.phrases.get(tokens[:-1] + (tokens[-1][:-1],))
+        return entries
+
+    def match(self, text):
+        """Collect every keyword hit in the text, grouped by category"""
+        tokens = tokenize(text)
+        hits = {}
+        for start in range(len(tokens)):
+            for length in range(1, min(self.max_phrase_len, len(tokens) - start) + 1):
+                entries = self._lookup(tuple(tokens[start:start + length]))
+                if entries:
+                    for category, value in entries:
+                        hits.setdefault(category, set()).add(value)
+        return hits
+
+    def route(self, text):
+        """Route a query and return its intent, field and filter flags"""
+        hits = self.match(text)
+
+        common = None
+        if 'common' in hits:
+            common = min(hits['common'], key=self.common_order.get)
+
+        intent = 'general'
+        if 'intent' in hits:
+            intent = min(hits['intent'])[1]
+
+        fields = {}
+        for field_intent in FIELD_KEYWORDS:
+            field_hits = hits.get('field:' + field_intent)
+            fields[field_intent] = min(field_hits)[1] if field_hits else None
+
+        city = min(hits['city'])[1] if 'city' in hits else None
+        college_type = min(hits['type'])[1] if 'type' in hits else None
+
+        return {
+            'common': common,
+            'intent': intent,
+            'field': fields.get(intent),
+            'fields': fields,
+            'maharashtra': 'maharashtra' in hits,
+            'city': city,
+            'type': college_type,
+            'affordable': 'fee' in hits,
+        }
+
+    def common_response(self, route):
+        """Return the predefined response for a routed common query, if any"""
+        if route['common'] is None:
+            return None
+        return self.common_responses[route['common']]
@@ -0,0 +1,179 @@
+import math
+from array import array
+
+from intent_router import tokenize
+from renderers import render_admission_timeline, render_exam, render_scholarship, render_top_college
+
+# Question words and fillers that say nothing about which record is meant
+STOP_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'am', 'do', 'does', 'did', 'can', 'could',
+    'will', 'would', 'should', 'shall', 'may', 'might', 'must', 'has', 'have', 'had',
+    'what', 'which', 'who', 'whom', 'whose', 'when', 'where', 'why', 'how',
+    'i', 'me', 'my', 'we', 'our', 'you', 'your', 'it', 'its', 'they', 'them', 'their', 'this', 'that', 'these',
+    'those', 'there', 'here',
+    'of', 'for', 'in', 'on', 'at', 'to', 'from', 'by', 'with', 'about', 'into', 'as', 'and', 'or', 'but', 'if',
+    'than', 'then', 'so', 'not', 'no', 'any', 'some', 'all', 'more', 'most', 'much', 'many', 'very',
+    'tell', 'know', 'want', 'need', 'please', 'give', 'get', 'find', 'show', 'list', 'information', 'info',
+    'details', 'detail',
+}
+
+# Confidence needed to answer from local records instead of searching the web
+LOCAL_THRESHOLD = 0.2
+
+# A record only answers a question if it contains at least MIN_MATCHED of the question's terms, carrying
+# at least MIN_COVERAGE of their IDF weight: a single place name shared with a college is not a match
+MIN_MATCHED = 2
+MIN_COVERAGE = 0.6
+
+# Local answers list records scoring at least this share of the best one
+RELATIVE_THRESHOLD = 0.5
+
+
+# Terms are cut to this many letters, a crude stemmer: eligible and eligibility, inspire and inspired
+STEM_LENGTH = 6
+
+
+def terms(text):
+    """Return the index terms of a text: stemmed tokens without stop words"""
+    return [token[:STEM_LENGTH] for token in tokenize(text) if token not in STOP_WORDS]
+
+
+def record_text(record):
+    """Return all the values of a record as one text; nested dicts contribute their keys too"""
+    parts = []
+    for value in record.values():
+        if isinstance(value, dict):
+            parts += [f"{key} {item}" for key, item in value.items()]
+        elif isinstance(value, (list, tuple)):
+            parts.extend(str(item) for item in value)
+        else:
+            parts.append(str(value))
+    return ' '.join(parts)
+
+
+def education_documents(education_data):
+    """Return (render, record) for every record of the education data worth answering from"""
+    documents = []
+    for colleges in education_data.get('top_colleges', {}).values():
+        documents += [(render_top_college, college) for college in colleges]
+    for exams in education_data.get('entrance_exams', {}).values():
+        documents += [(render_exam, exam) for exam in exams]
+
+    scholarships = education_data.get('scholarships', [])
+    if isinstance(scholarships, dict):
+        scholarships = list(scholarships.values())
+    documents += [(render_scholarship, scholarship) for scholarship in scholarships]
+
+    for field, calendar in education_data.get('admission_calendar', {}).items():
+        timeline = {'name': f"Admission timeline for {field.replace('_', ' ')} courses", 'events': calendar}
+        documents.append((render_admission_timeline, timeline))
+    return documents
+
+
+class KnowledgeBase:
+    """BM25 index over the local records, to answer general questions without a web search.
+
+    The document-term weights are computed once per data load and kept as
+    the arrays of a sparse CSR matrix, so a query is scored against every
+    record with one sparse matrix-vector product. The confidence of a
+    match is its score over the highest score the query could reach,
+    (k1 + 1) times the summed IDF of its terms, so it lies in [0, 1] and
+    words the records never mention count against answering locally.
+    scipy is imported on the first search, keeping it off the startup path.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.documents = list(documents)
+        self.k1 = k1
+        self.vocabulary = {}
+        doc_terms = []
+        for _, record in self.documents:
+            counts = {}
+            for term in terms(record_text(record)):
+                counts[term] = counts.get(term, 0) + 1
+            doc_terms.append(counts)
+            for term in counts:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+
+        frequencies = [0] * len(self.vocabulary)
+        for counts in doc_terms:
+            for term in counts:
+                frequencies[self.vocabulary[term]] += 1
+        count = len(doc_terms)
+        self.idf = array('d', (math.log(1 + (count - df + 0.5) / (df + 0.5)) for df in frequencies))
+        # Terms the records never use weigh like an average term
+        self.unknown_idf = sum(self.idf) / len(self.idf) if self.idf else 0.0
+
+        lengths = [sum(counts.values()) for counts in doc_terms]
+        average = sum(lengths) / count if count else 0
+        self.data = array('d')
+        self.indices = array('i')
+        self.indptr = array('i', [0])
+        for counts, length in zip(doc_terms, lengths):
+            norm = k1 * (1 - b + b * length / average)
+            for term, tf in counts.items():
+                term_id = self.vocabulary[term]
+                self.indices.append(term_id)
+                self.data.append(self.idf[term_id] * tf * (k1 + 1) / (tf + norm))
+            self.indptr.append(len(self.indices))
+        self._weights = None
+        self._pattern = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_weights'] = None
+        state['_pattern'] = None
+        return state
+
+    def weights(self):
+        """Return the document-term weights as a scipy CSR matrix, built on first use"""
+        if self._weights is None:
+            import numpy as np
+            from scipy.sparse import csr_matrix
+            self._weights = csr_matrix((np.frombuffer(self.data, dtype=np.float64),
+                                        np.frombuffer(self.indices, dtype=np.int32),
+                                        np.frombuffer(self.indptr, dtype=np.int32)),
+                                       shape=(len(self.documents), len(self.vocabulary)))
+        return self._weights
+
+    def pattern(self):
+        """Return which terms each document contains, as a CSR matrix of ones shaped like the weights"""
+        if self._pattern is None:
+            import numpy as np
+            weights = self.weights()
+            self._pattern = weights.copy()
+            self._pattern.data = np.ones_like(weights.data)
+        return self._pattern
+
+    def search(self, text, k=3, threshold=LOCAL_THRESHOLD):
+        """Return up to k (confidence, render, record) matches for a question, best first.
+
+        Returns an empty list when the best match is below the threshold.
+        """
+        query_terms = set(terms(text))
+        if not query_terms or not self.documents:
+            return []
+        term_ids = [self.vocabulary[term] for term in query_terms if term in self.vocabulary]
+        if not term_ids:
+            return []
+
+        import numpy as np
+        weights = self.weights()
+        # Columns: the query's terms, and their IDF weights
+        query = np.zeros((weights.shape[1], 2))
+        query[term_ids, 0] = 1.0
+        query[term_ids, 1] = [self.idf[term_id] for term_id in term_ids]
+        total_idf = query[:, 1].sum() + self.unknown_idf * (len(query_terms) - len(term_ids))
+
+        matched_terms, matched_idf = (self.pattern() @ query).T
+        matched = (matched_terms >= MIN_MATCHED) & (matched_idf >= MIN_COVERAGE * total_idf)
+        scores = np.where(matched, weights @ query[:, 0], 0.0) / ((self.k1 + 1) * total_idf)
+
+        best = np.argsort(-scores)[:k]
+        if scores[best[0]] < threshold:
+            return []
+        cutoff = max(threshold, scores[best[0]] * RELATIVE_THRESHOLD)
+        return [(float(scores[i]),) + self.documents[i] for i in best if scores[i] >= cutoff]
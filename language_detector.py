@@ -0,0 +1,165 @@
+import math
+import re
+
+# Unicode block (code point >> 7) of each Indic script, and the language written in it
+SCRIPT_BLOCKS = {
+    0x0900 >> 7: 'deva',
+    0x0980 >> 7: 'bn',
+    0x0A00 >> 7: 'pa',
+    0x0A80 >> 7: 'gu',
+    0x0B80 >> 7: 'ta',
+    0x0C00 >> 7: 'te',
+    0x0C80 >> 7: 'kn',
+    0x0D00 >> 7: 'ml',
+}
+
+# Languages told apart by character n-grams when they share a script.
+# Romanized Hindi (Hinglish) is answered as Hindi.
+SCRIPT_LANGUAGES = {
+    'deva': ('hi', 'mr'),
+    'latn': ('en', 'hi'),
+}
+
+# Short texts typical of chat questions, from which the n-gram profiles are built
+SAMPLES = {
+    ('latn', 'en'): [
+        "Tell me about the best engineering colleges in Pune",
+        "When is the JEE Main exam and what is the eligibility for it?",
+        "Can you give me information about scholarships for students?",
+        "What is the admission process for medical colleges?",
+        "What can I do after 12th? Which course should I choose?",
+        "How much are the fees at IIT Bombay and how do I get admission there?",
+        "Studying at government colleges is cheaper, but there are fewer seats.",
+        "Hello, I am looking for good institutes for an MBA.",
+        "Which are the top colleges for computer science in India with good placements?",
+        "What is the last date to apply for the entrance exam this year?",
+    ],
+    ('latn', 'hi'): [
+        "mujhe pune ke sabse achhe engineering college ke baare mein batao",
+        "jee main exam kab hota hai aur iske liye eligibility kya hai",
+        "kya aap mujhe scholarship ke baare mein jankari de sakte ho",
+        "medical college mein admission ka process kya hai",
+        "main 12th ke baad kya kar sakta hoon, mujhe kaun sa course lena chahiye",
+        "iit bombay ki fees kitni hai aur wahan admission kaise milta hai",
+        "sarkari college mein padhai sasti hoti hai lekin seats kam hain",
+        "namaste, mujhe mba ke liye achhe institute chahiye",
+        "bharat mein computer science ke liye sabse achha college kaun sa hai, placement kaisa hai",
+        "is saal entrance exam ke liye apply karne ki aakhri tareekh kya hai",
+    ],
+    ('deva', 'hi'): [
+        "मुझे पुणे के सबसे अच्छे इंजीनियरिंग कॉलेज के बारे में बताइए।",
+        "जेईई मेन परीक्षा कब होती है और इसके लिए पात्रता क्या है?",
+        "क्या आप मुझे छात्रवृत्ति के बारे में जानकारी दे सकते हैं?",
+        "मेडिकल कॉलेज में प्रवेश की प्रक्रिया क्या है?",
+        "मैं बारहवीं के बाद क्या कर सकता हूँ? मुझे कौन सा कोर्स चुनना चाहिए?",
+        "आईआईटी बॉम्बे की फीस कितनी है और वहाँ दाखिला कैसे मिलता है?",
+        "सरकारी कॉलेजों में पढ़ाई सस्ती होती है, लेकिन सीटें कम हैं।",
+        "नमस्ते, मुझे एमबीए के लिए अच्छे संस्थान चाहिए।",
+        "भारत में कंप्यूटर साइंस के लिए सबसे अच्छा कॉलेज कौन सा है?",
+        "इस साल प्रवेश परीक्षा के लिए आवेदन करने की आखिरी तारीख क्या है?",
+    ],
+    ('deva', 'mr'): [
+        "मला पुण्यातील सर्वोत्तम अभियांत्रिकी महाविद्यालयांबद्दल सांगा.",
+        "जेईई मेन परीक्षा कधी असते आणि त्यासाठी पात्रता काय आहे?",
+        "तुम्ही मला शिष्यवृत्तीबद्दल माहिती देऊ शकता का?",
+        "वैद्यकीय महाविद्यालयात प्रवेशाची प्रक्रिया काय आहे?",
+        "मी बारावीनंतर काय करू शकतो? मला कोणता अभ्यासक्रम निवडायला हवा?",
+        "आयआयटी मुंबईचे शुल्क किती आहे आणि तिथे प्रवेश कसा मिळतो?",
+        "सरकारी महाविद्यालयांमध्ये शिक्षण स्वस्त असते, पण जागा कमी आहेत.",
+        "नमस्कार, मला एमबीएसाठी चांगल्या संस्था हव्या आहेत.",
+        "भारतातील संगणक शास्त्रासाठी सर्वात चांगले महाविद्यालय कोणते आहे?",
+        "या वर्षी प्रवेश परीक्षेसाठी अर्ज करण्याची शेवटची तारीख कोणती आहे?",
+    ],
+}
+
+# Letters in any script, plus the Indic vowel signs and viramas that are not letters to Python;
+# the danda sentence marks are left out
+WORD_PATTERN = re.compile(r'(?:[^\W\d_]|[\u0900-\u0963\u0966-\u0DFF])+')
+
+# Log-odds a Latin-script text must show for a language other than English
+LATIN_MARGIN = 2.0
+
+# Hindi function words; a Latin-script text without any is taken as English
+HINGLISH_WORDS = {
+    'hai', 'hain', 'ho', 'hoga', 'hogi', 'tha', 'thi', 'kya', 'kaise', 'kaun', 'kaunsa', 'kab', 'kahan', 'kyun',
+    'kitna', 'kitni', 'kitne', 'ka', 'ki', 'ke', 'ko', 'se', 'mein', 'par', 'aur', 'ya', 'nahi', 'nahin',
+    'mujhe', 'mera', 'meri', 'hum', 'hume', 'aap', 'tum', 'batao', 'bataiye', 'chahiye', 'sakta', 'sakti',
+    'sakte', 'liye', 'wala', 'wali', 'sabse', 'accha', 'achha', 'achhe', 'acche', 'milega', 'milegi', 'karein',
+    'karna', 'karu', 'kaisa', 'kaisi', 'bhi', 'lekin', 'baare', 'bare',
+}
+
+# Short function words are also English words or names ("Hi ho", "Ka-ching"), so a text needs two
+# different ones, or one at least this long, to be taken as Hinglish
+LONE_WORD_LETTERS = 5
+
+
+def ngrams(text):
+    """Yield the character 1- to 3-grams of the words in a text, padded with spaces"""
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded = f" {word} "
+        for n in (1, 2, 3):
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+
+
+class LanguageDetector:
+    """Network-free language detection for the codes in LANGUAGES.
+
+    The script of a text's letters decides the language for every script
+    but Devanagari and Latin. Within those, Hindi and Marathi, and English
+    and romanized Hindi, are told apart with character n-gram profiles
+    built from short sample questions: each text is scored by the
+    log-probability of its n-grams under each profile, with add-one
+    smoothing. Latin-script texts are English unless they use two Hindi
+    function words, or a long one, and Hinglish is clearly more likely, so
+    that greetings and English questions full of Indian names do not
+    switch the reply language.
+    """
+
+    def __init__(self, samples=SAMPLES):
+        self.profiles = {}
+        for (script, lang), texts in samples.items():
+            counts = {}
+            for sample in texts:
+                for gram in ngrams(sample):
+                    counts[gram] = counts.get(gram, 0) + 1
+            total = sum(counts.values()) + len(counts) + 1
+            self.profiles[(script, lang)] = ({gram: math.log((count + 1) / total) for gram, count in counts.items()},
+                                             math.log(1 / total))
+
+    def script(self, text):
+        """Return the script most of the text's letters are written in: an Indic code, 'deva' or 'latn'"""
+        counts = {}
+        for ch in text:
+            script = SCRIPT_BLOCKS.get(ord(ch) >> 7)
+            if script is None and ord(ch) < 0x250 and ch.isalpha():
+                script = 'latn'
+            if script:
+                counts[script] = counts.get(script, 0) + 1
+        return max(counts, key=counts.get) if counts else None
+
+    def scores(self, text, script):
+        """Return the log-probability of the text under each language profile of a script"""
+        grams = list(ngrams(text))
+        scores = {}
+        for lang in SCRIPT_LANGUAGES[script]:
+            log_probs, unseen = self.profiles[(script, lang)]
+            scores[lang] = sum(log_probs.get(gram, unseen) for gram in grams)
+        return scores
+
+    def detect(self, text, default='en'):
+        """Return the language code of a text, or default when it has no letters"""
+        script = self.script(text)
+        if script is None:
+            return default
+        if script not in SCRIPT_LANGUAGES:
+            return script
+
+        if script == 'latn':
+            hindi_words = HINGLISH_WORDS.intersection(WORD_PATTERN.findall(text.lower()))
+            if len(hindi_words) < 2 and not any(len(word) >= LONE_WORD_LETTERS for word in hindi_words):
+                return 'en'
+            scores = self.scores(text, script)
+            return 'hi' if scores['hi'] - scores['en'] > LATIN_MARGIN else 'en'
+        scores = self.scores(text, script)
+        return max(scores, key=scores.get)
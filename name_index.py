@@ -0,0 +1,311 @@
+import re
+from array import array
+from collections import Counter
+
+from intent_router import CITIES
+
+# Words that say what kind of place or exam something is rather than which one
+GENERIC_WORDS = {
+    'college', 'colleges', 'university', 'universities', 'institute', 'institutes', 'institution',
+    'school', 'academy', 'department', 'campus', 'education', 'educational', 'studies', 'research',
+    'engineering', 'medical', 'management', 'technology', 'technological', 'science', 'sciences',
+    'arts', 'commerce', 'polytechnic', 'pharmacy', 'law', 'dental', 'nursing', 'architecture', 'agriculture',
+    'indian', 'india', 'national', 'maharashtra',
+    'government', 'govt', 'private', 'autonomous', 'top', 'best', 'affordable', 'cheap',
+    'exam', 'exams', 'examination', 'entrance', 'test',
+    'of', 'and', 'the', 'for', 'in', 'at', 'to', 'with',
+}
+
+# Dropped from acronyms, so "Indian Institute of Technology Bombay" also gives IITB
+ACRONYM_STOPWORDS = {'of', 'and', 'the', 'for', 'in', 'at'}
+
+CITY_WORDS = {word for city in CITIES for word in city.split()}
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+PAREN_PATTERN = re.compile(r'\(([^)]*)\)')
+
+# Share of a word's trigrams, and of the query word's, the two must have in common for the word to count as typed
+WORD_MATCH = 0.5
+
+# Share of a name a query must cover to be taken as naming that college or exam
+MATCH_THRESHOLD = 0.75
+
+# Trigrams, matched net of missed, by which the best name must beat the next one
+MATCH_MARGIN = 3
+
+# Another record matching as many of the query's trigrams, and this share of its own name, makes a match ambiguous
+RIVAL_COVERAGE = 0.5
+
+# Candidate words and records scored exactly per lookup
+CANDIDATE_WORDS = 20
+CANDIDATE_TARGETS = 20
+
+# Postings longer than this are skipped when gathering candidate records
+FREQUENT_POSTINGS = 1000
+
+# Candidate words are counted from a query word's rarest trigrams, up to this many postings in all
+GRAM_POSTINGS = 300
+
+
+def deletions(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+# A query word one letter off a generic word, like "institutu", is that generic word misspelt
+GENERIC_TYPOS = {typo for word in GENERIC_WORDS if len(word) >= 5 for typo in deletions(word) | {word}}
+
+
+def misspells_generic(word):
+    return len(word) >= 5 and (word in GENERIC_TYPOS or not deletions(word).isdisjoint(GENERIC_TYPOS))
+
+
+def words_of(text):
+    return WORD_PATTERN.findall(text.lower().replace('&', ' and '))
+
+
+def trigrams(word):
+    """Return the trigrams of a word padded like pg_trgm, so short words still have a few"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def name_aliases(name):
+    """Return the spellings a name is looked up by: the name, its short forms and acronyms"""
+    aliases = [name]
+    short = PAREN_PATTERN.search(name)
+    base = PAREN_PATTERN.sub(' ', name)
+    if short:
+        # "Indian Institute of Technology (IIT) Bombay" is also "IIT Bombay", "IIT-B" and "IIT"
+        rest = words_of(name[short.end():])
+        aliases.append(' '.join([short.group(1)] + rest))
+        if rest:
+            aliases.append(f"{short.group(1)} {rest[0][0]}")
+        aliases.append(short.group(1))
+
+    if ',' in base:
+        # "Government College of Engineering, Pune" is mostly asked about without the place
+        base = base.split(',')[0]
+        aliases.append(base)
+
+    words = words_of(base)
+    forms = [words]
+    if words and words[-1] in CITY_WORDS:
+        # People leave out the city: "Veermata Jijabai Technological Institute"
+        forms.append(words[:-1])
+        aliases.append(' '.join(words[:-1]))
+    for form in forms:
+        for letters in (form, [word for word in form if word not in ACRONYM_STOPWORDS]):
+            acronym = ''.join(word[0] for word in letters)
+            if len(acronym) >= 3 and acronym not in GENERIC_WORDS and acronym not in CITY_WORDS:
+                aliases.append(acronym)
+    return aliases
+
+
+class NameIndex:
+    """Trigram index for finding a college or exam by a loosely typed name.
+
+    Names are split into words, generic words like "college" dropped, and
+    each distinct word indexed once by its trigrams; records are posted
+    under their words. A lookup finds the vocabulary words the query
+    spells closely enough, takes the records holding most of them, and
+    scores each of their aliases by how much of the alias the query
+    covers. Storage is flat arrays: the index can be extended like a
+    CollegeStore, and older versions ignore records added after them.
+    """
+
+    def __init__(self):
+        self.word_ids = {}
+        self.words = []
+        self.word_sizes = array('H')
+        self.gram_words = {}
+        self.word_targets = []
+        self.targets = []
+        self.alias_words = array('I')
+        self.alias_offsets = array('I', [0])
+        self.alias_sizes = array('I')
+        self.target_aliases = array('I', [0])
+        self.target_sizes = array('I')
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _word_id(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = self.word_ids[word] = len(self.words)
+            self.words.append(word)
+            grams = trigrams(word)
+            self.word_sizes.append(len(grams))
+            self.word_targets.append(array('I'))
+            for gram in grams:
+                postings = self.gram_words.get(gram)
+                if postings is None:
+                    postings = self.gram_words[gram] = array('I')
+                postings.append(word_id)
+        return word_id
+
+    def add(self, names, target):
+        """Index a record under its names and their aliases; records without a distinctive word are skipped"""
+        seen = set()
+        word_set = set()
+        for name in names:
+            for alias in name_aliases(name):
+                words = tuple(word for word in words_of(alias) if word not in GENERIC_WORDS)
+                # A name made only of generic and city words would match generic queries
+                if words in seen or all(word in CITY_WORDS for word in words):
+                    continue
+                seen.add(words)
+                word_ids = [self._word_id(word) for word in words]
+                self.alias_words.extend(word_ids)
+                self.alias_offsets.append(len(self.alias_words))
+                self.alias_sizes.append(sum(self.word_sizes[word_id] for word_id in word_ids))
+                word_set.update(word_ids)
+        if not seen:
+            return False
+
+        target_id = self.count
+        for word_id in word_set:
+            self.word_targets[word_id].append(target_id)
+        self.targets.append(target)
+        self.target_aliases.append(len(self.alias_offsets) - 1)
+        self.target_sizes.append(min(self.alias_sizes[self.target_aliases[-2]:]))
+        self.count += 1
+        return True
+
+    def extended(self, entries):
+        """Return an index with (names, target) entries added, leaving this one unchanged"""
+        if len(self.targets) != self.count:
+            raise ValueError("Only the latest version of a name index can be extended")
+        index = NameIndex.__new__(NameIndex)
+        index.__dict__.update(self.__dict__)
+        for names, target in entries:
+            index.add(names, target)
+        return index
+
+    def _matched_words(self, word):
+        """Return {word id: trigrams shared} for the vocabulary words a query word spells closely enough"""
+        word_id = self.word_ids.get(word)
+        if word_id is not None:
+            return {word_id: self.word_sizes[word_id]}
+
+        grams = trigrams(word)
+        hits = Counter()
+        # A typo leaves most grams intact, so the rarest ones find the word; grams like "  s" are in too many
+        # words to be worth counting
+        budget = GRAM_POSTINGS
+        for postings in sorted(filter(None, map(self.gram_words.get, grams)), key=len):
+            if len(postings) > budget:
+                break
+            budget -= len(postings)
+            hits.update(postings)
+
+        matched = {}
+        for word_id, _ in hits.most_common(CANDIDATE_WORDS):
+            shared = len(grams & trigrams(self.words[word_id]))
+            if shared >= max(self.word_sizes[word_id], len(grams)) * WORD_MATCH:
+                matched[word_id] = shared
+        return matched
+
+    def _shared(self, word_id, query_grams):
+        """Return the trigrams a vocabulary word shares with the query word it matches, or 0"""
+        word_grams = trigrams(self.words[word_id])
+        size = self.word_sizes[word_id]
+        best = 0
+        for grams in query_grams:
+            shared = len(grams & word_grams)
+            if shared > best and shared >= max(size, len(grams)) * WORD_MATCH:
+                best = shared
+        return best
+
+    def _query_words(self, text):
+        """Return {word: {word id: trigrams shared}} for the distinctive words of a query"""
+        query_words = {}
+        for word in set(words_of(text)) - GENERIC_WORDS:
+            if word in self.word_ids or not misspells_generic(word):
+                query_words[word] = self._matched_words(word)
+        return query_words
+
+    def _scores(self, text, query_words=None):
+        """Return (score, matched grams, name grams, -target id) of the best candidates, best first"""
+        if query_words is None:
+            query_words = self._query_words(text)
+        matched = {}
+        for word_matches in query_words.values():
+            for word_id, shared in word_matches.items():
+                matched[word_id] = max(shared, matched.get(word_id, 0))
+        if not matched:
+            return []
+
+        # Candidates come from the rarer words; common ones like a city still count when scoring. Records holding
+        # as many of the words are taken shortest name first, the ones the query can cover best
+        postings = sorted((self.word_targets[word_id] for word_id in matched), key=len)
+        first = postings[0]
+        if len(first) <= FREQUENT_POSTINGS:
+            first = sorted(first, key=self.target_sizes.__getitem__)
+        candidates = Counter(first)
+        for targets in postings[1:]:
+            if len(targets) > FREQUENT_POSTINGS:
+                break
+            candidates.update(targets)
+
+        # A misspelt word can lose its place among the candidate words to ones sharing as many trigrams; in the
+        # records found by the other words it is checked against the query words directly
+        query_grams = [trigrams(word) for word in query_words if word not in self.word_ids]
+        scores = []
+        for target_id, _ in candidates.most_common(CANDIDATE_TARGETS):
+            if target_id >= self.count:
+                continue
+            best = (0.0, 0, 0)
+            for alias in range(self.target_aliases[target_id], self.target_aliases[target_id + 1]):
+                words = self.alias_words[self.alias_offsets[alias]:self.alias_offsets[alias + 1]]
+                for word_id in words:
+                    if query_grams and word_id not in matched:
+                        matched[word_id] = self._shared(word_id, query_grams)
+                covered = sum(matched.get(word_id, 0) for word_id in words)
+                best = max(best, (covered / self.alias_sizes[alias], covered, self.alias_sizes[alias]))
+            scores.append(best + (-target_id,))
+        scores.sort(reverse=True)
+        return scores
+
+    def _explains(self, target_id, query_words):
+        """Whether every query word is closest to one word, and that word is in the target's names"""
+        name_words = set(self.alias_words[self.alias_offsets[self.target_aliases[target_id]]:
+                                          self.alias_offsets[self.target_aliases[target_id + 1]]])
+        for word_matches in query_words.values():
+            if not word_matches:
+                return False
+            closest = max(word_matches.values())
+            words = [word_id for word_id, shared in word_matches.items() if shared == closest]
+            if len(words) > 1 or words[0] not in name_words:
+                return False
+        return True
+
+    def search(self, text, k=5):
+        """Return up to k (score, target) pairs, best first; score is the share of a name the text covers"""
+        return [(score, self.targets[-target_id]) for score, _, _, target_id in self._scores(text)[:k]]
+
+    def best(self, text, threshold=MATCH_THRESHOLD):
+        """Return the one target the text names, or None when nothing matches well or it is ambiguous.
+
+        Names covered past the threshold are ranked by the trigrams they match
+        less those they miss, so that a misspelt "Lasa Hivanhide Jiniladev
+        College" does not resolve to a "Lasa College" it fully contains.
+        """
+        query_words = self._query_words(text)
+        scores = self._scores(text, query_words)
+        ranked = sorted(((2 * covered - size, covered, target_id) for score, covered, size, target_id in scores
+                         if score >= threshold), reverse=True)
+        if not ranked:
+            return None
+        net, covered, target_id = ranked[0]
+        # "IIT" matches every IIT equally well, "IIT Bombay" matches one of them best
+        if len(ranked) > 1 and net - ranked[1][0] < MATCH_MARGIN:
+            return None
+        # A record matching as much of the query, only less of its name, is likely the one a typo hid. That
+        # takes a query word the best name does not spell better than any other word, which could be the rest
+        # of the other name misspelt.
+        if not self._explains(-target_id, query_words) and \
+                any(other[1] >= covered and other[0] >= RIVAL_COVERAGE and other[3] != target_id for other in scores):
+            return None
+        return self.targets[-target_id]
@@ -1,54 +1,500 @@
 import time
-import statistics
+import math
 import json
 import os
+import threading
+import itertools
+from bisect import bisect_left
 from datetime import datetime
 
-class PerformanceMonitor:
+# Upper bounds in seconds of the Prometheus latency buckets, from cached answers to slow upstream calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stages whose time is also recorded as the 'translation' operation
+TRANSLATION_STAGES = {'translate_in', 'translate_out'}
+
+OPERATIONS = ('text_query', 'translation', 'voice')
+
+# Quantiles are reported to within this relative error of a recorded duration
+RELATIVE_ERROR = 0.01
+GAMMA = (1 + RELATIVE_ERROR) / (1 - RELATIVE_ERROR)
+LOG_GAMMA = math.log(GAMMA)
+
+# Durations in ms at or below MIN_DURATION share the first bucket; the last bucket holds everything from a day up
+MIN_DURATION = 0.001
+MAX_BUCKET = math.ceil(math.log(86400000 / MIN_DURATION) / LOG_GAMMA)
+
+# Sliding windows reported by get_metrics, built from SLOT_SECONDS slots
+WINDOWS = {'1m': 60, '5m': 300, '1h': 3600}
+SLOT_SECONDS = 10
+
+# Finished requests and stages wait in a list, counted into the histograms by a background thread this often
+FLUSH_SECONDS = 1.0
+
+# Past this many waiting timings a request counts them itself, should the background thread fall behind
+MAX_PENDING = 10000
+
+def bucket_index(duration):
+    """Return the log bucket of a duration in ms: bucket i holds (MIN_DURATION * GAMMA^(i-1), MIN_DURATION * GAMMA^i]"""
+    if duration <= MIN_DURATION:
+        return 0
+    return min(MAX_BUCKET, math.ceil(math.log(duration / MIN_DURATION) / LOG_GAMMA))
+
+def bucket_value(index):
+    """Return the duration reported for a bucket, within RELATIVE_ERROR of any duration in it"""
+    if index == 0:
+        return MIN_DURATION
+    return MIN_DURATION * 2 * GAMMA ** index / (GAMMA + 1)
+
+def format_labels(names, values):
+    """Format a Prometheus label set, escaping backslashes, quotes and newlines in the values"""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def metric_lines(name, kind, help_text, samples, label_names=()):
+    """Return one metric family in the Prometheus text format; samples are (label values, value) pairs"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    for values, value in samples:
+        lines.append(f'{name}{format_labels(label_names, values)} {value}')
+    return lines
+
+class Histogram:
+    """Prometheus histogram per label set: a count per latency bucket, plus the sum and count"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS, lock=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self.series = {}
+        self.lock = lock or threading.Lock()
+
+    def observe(self, labels, seconds):
+        """Count one observation for a tuple of label values"""
+        with self.lock:
+            self._observe(labels, seconds)
+
+    def _observe(self, labels, seconds):
+        """Count one observation; the lock must be held"""
+        self._observe_many([(labels, seconds)])
+
+    def _observe_many(self, observations):
+        """Count (label values, seconds) pairs; the lock must be held"""
+        all_series, buckets = self.series, self.buckets
+        for labels, seconds in observations:
+            series = all_series.get(labels)
+            if series is None:
+                series = all_series[labels] = [[0] * (len(buckets) + 1), 0.0]
+            series[0][bisect_left(buckets, seconds)] += 1
+            series[1] += seconds
+
+    def lines(self):
+        """Return the histogram in the Prometheus text format, with cumulative bucket counts"""
+        with self.lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self.series.items())]
+        names = self.label_names + ('le',)
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(names, labels + (bound,))} {cumulative}')
+            label_text = format_labels(self.label_names, labels)
+            lines.append(f'{self.name}_sum{label_text} {total}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+class LatencyHistogram:
+    """Durations counted in logarithmic buckets, HDR-style, in memory bounded by MAX_BUCKET.
+
+    Quantiles come from the bucket holding the nearest-rank sample and are
+    within RELATIVE_ERROR (1%) of that sample's duration, for durations
+    between MIN_DURATION and a day. The count, sum, sum of squares and max
+    are exact. Histograms merge by adding their counts, so snapshots from
+    several worker processes combine into one without losing accuracy.
+    """
+
+    __slots__ = ('buckets', 'count', 'total', 'total_squares', 'max')
+
     def __init__(self):
-        self.response_times = []
-        self.translation_times = []
-        self.voice_processing_times = []
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.max = 0.0
+
+    def record(self, duration):
+        self.add(bucket_index(duration), duration)
+
+    def record_many(self, durations):
+        """Count several durations, as record does one"""
+        buckets, largest, total_squares = self.buckets, self.max, 0.0
+        for duration in durations:
+            bucket = 0 if duration <= MIN_DURATION else min(MAX_BUCKET, math.ceil(math.log(duration / MIN_DURATION) / LOG_GAMMA))
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+            total_squares += duration * duration
+            if duration > largest:
+                largest = duration
+        self.count += len(durations)
+        self.total += sum(durations)
+        self.total_squares += total_squares
+        self.max = largest
+
+    def add(self, bucket, duration):
+        """Count a duration whose bucket_index is already known"""
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += duration
+        self.total_squares += duration * duration
+        if duration > self.max:
+            self.max = duration
+
+    def merge(self, other):
+        """Add another histogram's counts to this one"""
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.total_squares += other.total_squares
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Return the q-quantile (0 < q <= 1) by nearest rank, or 0 when empty"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # The top bucket's estimate can overshoot the largest duration, which is known exactly
+                return min(bucket_value(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        """Return count, avg, p50/p95/p99, max and std_dev in ms"""
+        if not self.count:
+            return {'count': 0}
+        mean = self.total / self.count
+        variance = (self.total_squares - self.total * mean) / (self.count - 1) if self.count > 1 else 0.0
+        return {
+            'count': self.count,
+            'avg': mean,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'std_dev': math.sqrt(max(0.0, variance)),
+        }
+
+    def to_dict(self):
+        """Return the histogram as JSON-ready data: the counts from the first used bucket on, as one dense list"""
+        first = min(self.buckets, default=0)
+        counts = [0] * (max(self.buckets, default=-1) - first + 1)
+        for bucket, count in self.buckets.items():
+            counts[bucket - first] = count
+        return {'offset': first, 'counts': counts, 'count': self.count, 'sum': self.total,
+                'sum_squares': self.total_squares, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.buckets = {data['offset'] + i: count for i, count in enumerate(data['counts']) if count}
+        histogram.count = data['count']
+        histogram.total = data['sum']
+        histogram.total_squares = data['sum_squares']
+        histogram.max = data['max']
+        return histogram
+
+class WindowedHistogram:
+    """A LatencyHistogram per SLOT_SECONDS slot over the longest window, plus the durations since start.
+
+    Slots are numbered by wall-clock time, so the slots of histograms from
+    different processes line up when merged. Windows are the slots that
+    started within the window, so they cover up to one slot more or less
+    than its nominal length. Memory is fixed: one ring of slots. A
+    duration is counted in its slot only; a slot is folded into the
+    since-start histogram when its ring entry is reused, so rotation costs
+    nothing on the recording path.
+    """
+
+    def __init__(self, slot_seconds=SLOT_SECONDS, span=max(WINDOWS.values()), lock=None):
+        self.slot_seconds = slot_seconds
+        self.ring = [None] * (span // slot_seconds)
+        self.retired = LatencyHistogram()
+        self.lock = lock or threading.Lock()
+
+    def _slot(self, slot_id):
+        """Return the histogram for a slot, retiring the expired one it replaces; the lock must be held.
+
+        Returns the since-start histogram for a slot older than the ring holds.
+        """
+        position = slot_id % len(self.ring)
+        entry = self.ring[position]
+        if entry is None or entry[0] != slot_id:
+            if entry is not None:
+                if entry[0] > slot_id:
+                    return self.retired
+                self.retired.merge(entry[1])
+            entry = self.ring[position] = (slot_id, LatencyHistogram())
+        return entry[1]
+
+    def record(self, duration, now=None):
+        with self.lock:
+            self._record_many([duration], now)
+
+    def _record_many(self, durations, now=None):
+        """Count durations that ended at wall-clock time `now` in its slot; the lock must be held"""
+        if durations:
+            self._slot(int((time.time() if now is None else now) // self.slot_seconds)).record_many(durations)
+
+    def _all_time(self):
+        merged = LatencyHistogram().merge(self.retired)
+        for entry in self.ring:
+            if entry is not None:
+                merged.merge(entry[1])
+        return merged
+
+    @property
+    def all_time(self):
+        """Return a LatencyHistogram of every duration recorded"""
+        with self.lock:
+            return self._all_time()
+
+    def window(self, seconds, now=None):
+        """Return a LatencyHistogram of the durations recorded in the last `seconds`"""
+        current = int((time.time() if now is None else now) // self.slot_seconds)
+        oldest = current - seconds // self.slot_seconds
+        merged = LatencyHistogram()
+        with self.lock:
+            for entry in self.ring:
+                if entry is not None and oldest < entry[0] <= current:
+                    merged.merge(entry[1])
+        return merged
+
+    def merge(self, other):
+        """Add another windowed histogram's counts, slot by slot, to this one"""
+        with self.lock:
+            self.retired.merge(other.retired)
+            for entry in other.ring:
+                if entry is not None:
+                    self._slot(entry[0]).merge(entry[1])
+        return self
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'slot_seconds': self.slot_seconds,
+                'all_time': self._all_time().to_dict(),
+                'slots': [[slot_id, histogram.to_dict()] for slot_id, histogram in sorted(filter(None, self.ring))],
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        windowed = cls(data['slot_seconds'])
+        # The saved all-time counts include the slots; what is left once they are taken out was retired
+        retired = windowed.retired = LatencyHistogram.from_dict(data['all_time'])
+        for slot_id, saved in data['slots']:
+            histogram = LatencyHistogram.from_dict(saved)
+            windowed.ring[slot_id % len(windowed.ring)] = (slot_id, histogram)
+            for bucket, count in histogram.buckets.items():
+                retired.buckets[bucket] -= count
+                if not retired.buckets[bucket]:
+                    del retired.buckets[bucket]
+            retired.count -= histogram.count
+            retired.total -= histogram.total
+            retired.total_squares -= histogram.total_squares
+        return windowed
+
+class StageTimer:
+    """Context manager timing one stage of a request"""
+
+    __slots__ = ('monitor', 'stage', 'start')
+
+    def __init__(self, monitor, stage):
+        self.monitor = monitor
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.monitor.observe_stage(self.stage, time.perf_counter() - self.start)
+
+class _NoTimer:
+    """Stand-in for StageTimer while monitoring is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NO_TIMER = _NoTimer()
+
+class PerformanceMonitor:
+    """Response times per operation, plus Prometheus histograms of requests and their stages.
+
+    Each operation keeps a WindowedHistogram, so memory stays fixed however
+    long the server runs, and get_metrics reads quantiles from bucket counts
+    instead of sorting samples. Snapshots from several workers can be merged.
+
+    Requests are labeled by endpoint, intent, language and status; stages
+    are routing, render_<intent>, translate_in, translate_out and search.
+    Translation stages also count as the 'translation' operation, and chat
+    requests as 'text_query'. A request only appends its timings to a
+    pending list, without taking a lock. A background thread counts them
+    into the histograms every FLUSH_SECONDS, in the window slot of the
+    flush, and reads of the metrics count what is waiting first, so
+    updating the histograms stays off the request path.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        # One lock for all the histograms, so that a flush counts every pending timing under a single acquisition
+        self.lock = threading.Lock()
+        self.operations = {operation: WindowedHistogram(lock=self.lock) for operation in OPERATIONS}
+        self.requests = Histogram('chat_request_duration_seconds', 'Time to answer an API request',
+                                  ('endpoint', 'intent', 'language', 'status'), lock=self.lock)
+        self.stages = Histogram('chat_stage_duration_seconds', 'Time spent in each stage of answering a request',
+                                ('stage',), lock=self.lock)
+        # Started requests are counted without a lock; in_flight is that count minus the finished requests
+        self.started = itertools.count()
+        self.counted_reads = 0
+        self.finished = 0
+        self.pending_requests = []
+        self.pending_stages = []
+        self.flusher = None
         self.metrics_dir = 'research_paper_assets/performance_data'
         os.makedirs(self.metrics_dir, exist_ok=True)
         
     def record_response_time(self, operation, start_time):
         """Record response time for different operations"""
-        duration = time.time() - start_time
-        if operation == 'text_query':
-            self.response_times.append(duration * 1000)  # Convert to ms
-        elif operation == 'translation':
-            self.translation_times.append(duration * 1000)
-        elif operation == 'voice':
-            self.voice_processing_times.append(duration * 1000)
-            
-    def get_metrics(self):
-        """Calculate performance metrics"""
+        self.record_duration(operation, (time.time() - start_time) * 1000)
+
+    def record_duration(self, operation, duration_ms):
+        """Record the duration of an operation in milliseconds"""
+        histogram = self.operations.get(operation)
+        if histogram is not None:
+            histogram.record(duration_ms)
+
+    def stage(self, name):
+        """Return a context manager that times a stage of the current request"""
+        return StageTimer(self, name) if self.enabled else NO_TIMER
+
+    def observe_stage(self, name, seconds):
+        self.pending_stages.append(((name,), seconds))
+        if self.flusher is None or len(self.pending_stages) >= MAX_PENDING:
+            self._catch_up()
+
+    def request_started(self):
+        if self.enabled:
+            next(self.started)
+
+    def request_finished(self, endpoint, intent, language, status, seconds):
+        """Record a finished request; chat endpoints also count as the 'text_query' operation"""
+        if not self.enabled:
+            return
+        self.pending_requests.append(((endpoint, intent, language, status), seconds))
+        if self.flusher is None or len(self.pending_requests) >= MAX_PENDING:
+            self._catch_up()
+
+    def _catch_up(self):
+        """Start the background flusher on first use; after that, flush here because it fell behind"""
+        with self.lock:
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True)
+                self.flusher.start()
+                return
+        self.flush()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        """Count the pending requests and stages into the histograms"""
+        with self.lock:
+            # Copy, then delete only what was copied: other threads may append in between
+            stages = self.pending_stages[:]
+            del self.pending_stages[:len(stages)]
+            requests = self.pending_requests[:]
+            del self.pending_requests[:len(requests)]
+            self.stages._observe_many(stages)
+            self.operations['translation']._record_many([seconds * 1000 for (name,), seconds in stages
+                                                         if name in TRANSLATION_STAGES])
+            self.requests._observe_many(requests)
+            self.finished += len(requests)
+            self.operations['text_query']._record_many([seconds * 1000 for labels, seconds in requests
+                                                        if labels[0].startswith('chat')])
+
+    @property
+    def in_flight(self):
+        """Requests started and not yet finished, as of the last flush"""
+        with self.lock:
+            # Reading the started count advances it; the reads so far are taken off again
+            started = next(self.started) - self.counted_reads
+            self.counted_reads += 1
+            return started - self.finished
+
+    def prometheus_lines(self):
+        """Return the request and stage histograms and the in-flight gauge in the Prometheus text format"""
+        self.flush()
+        return (self.requests.lines() + self.stages.lines() +
+                metric_lines('http_requests_in_flight', 'gauge', 'Requests being answered', [((), self.in_flight)]))
+
+    def get_metrics(self, now=None):
+        """Calculate performance metrics: since start, and over each sliding window"""
+        self.flush()
         metrics = {}
-        for name, data in [
-            ('text_query', self.response_times),
-            ('translation', self.translation_times),
-            ('voice', self.voice_processing_times)
-        ]:
-            if data:  # Only calculate if we have data
-                metrics[name] = {
-                    'avg': statistics.mean(data),
-                    'p95': statistics.quantiles(data, n=20)[18] if len(data) >= 20 else max(data),
-                    'max': max(data),
-                    'std_dev': statistics.stdev(data) if len(data) > 1 else 0
-                }
+        for name, histogram in self.operations.items():
+            all_time = histogram.all_time
+            if all_time.count:  # Only calculate if we have data
+                metrics[name] = all_time.summary()
+                metrics[name]['windows'] = {window: histogram.window(seconds, now).summary()
+                                            for window, seconds in WINDOWS.items()}
         return metrics
     
+    def snapshot(self):
+        """Return the operation histograms as compact JSON-ready data, for saving or merging"""
+        self.flush()
+        return {
+            'relative_error': RELATIVE_ERROR,
+            'operations': {name: histogram.to_dict() for name, histogram in self.operations.items()},
+        }
+    
+    def merge_snapshot(self, snapshot):
+        """Add the counts of another monitor's snapshot, e.g. from another worker process"""
+        if snapshot.get('relative_error') != RELATIVE_ERROR:
+            raise ValueError("Snapshot was recorded with different buckets")
+        for name, data in snapshot['operations'].items():
+            self.operations[name].merge(WindowedHistogram.from_dict(data))
+        return self
+    
     def save_metrics(self):
-        """Save metrics to file"""
+        """Save metrics to file: the summary, and the snapshot it can be rebuilt and merged from"""
         metrics = self.get_metrics()
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'{self.metrics_dir}/metrics_{timestamp}.json'
         
         with open(filename, 'w') as f:
-            json.dump(metrics, f, indent=2)
+            json.dump({'summary': metrics, 'snapshot': self.snapshot()}, f, separators=(',', ':'))
         
         return filename
 
+def merge_saved_metrics(filenames):
+    """Return a PerformanceMonitor holding the merged snapshots of saved metrics files"""
+    monitor = PerformanceMonitor(enabled=False)
+    for filename in filenames:
+        with open(filename) as f:
+            monitor.merge_snapshot(json.load(f)['snapshot'])
+    return monitor
+
 # Initialize global performance monitor
-performance_monitor = PerformanceMonitor() 
\ No newline at end of file
+performance_monitor = PerformanceMonitor(enabled=os.getenv('PERFORMANCE_MONITORING', '1') != '0')
@@ -0,0 +1,415 @@
+import re
+from datetime import datetime
+
+GREETINGS = {
+    'morning': "Good morning!",
+    'afternoon': "Good afternoon!",
+    'evening': "Good evening!",
+}
+
+# Follow-up suggestions appended to web search answers
+SUGGESTIONS = [
+    "Top engineering colleges in India",
+    "NEET preparation tips",
+    "JEE Main important dates",
+    "Scholarships for undergraduate students in India",
+    "MBA admission process in IIMs"
+]
+
+TOP_COLLEGE_FIELDS = [
+    ('ranking', 'Ranking'),
+    ('admission_process', 'Admission'),
+    ('fees', 'Fees'),
+    ('website', 'Website'),
+]
+
+# Optional Maharashtra college fields; the rating label depends on its value
+MAHARASHTRA_FIELDS = [
+    ('type', 'Type'),
+    ('established', 'Established'),
+    ('rating', 'Rating'),
+    ('fees', 'Fees'),
+    ('courses', 'Courses'),
+    ('admission_process', 'Admission'),
+    ('approved_by', 'Approved by'),
+    ('address', 'Address'),
+    ('website', 'Website'),
+]
+
+SCHOLARSHIP_FIELDS = [
+    ('provider', 'Provider'),
+    ('type', 'Type'),
+    ('eligibility', 'Eligibility'),
+    ('amount', 'Amount'),
+    ('application_period', 'Application period'),
+    ('website', 'Website'),
+]
+
+EXAM_FIELDS = [
+    ('conducting_body', 'Conducted by'),
+    ('eligibility', 'Eligibility'),
+    ('application_period', 'Application period'),
+    ('exam_dates', 'Exam dates'),
+    ('colleges', 'Colleges accepting'),
+    ('website', 'Website'),
+]
+
+# Segment kinds: only TEXT is sent to the translator, ENTITY (names and
+# places) and RAW (URLs, numbers, list markers, spacing) pass through as is
+TEXT = 'text'
+ENTITY = 'entity'
+RAW = 'raw'
+
+URL_PATTERN = re.compile(r'^(https?://|www\.)\S+$')
+LETTER_PATTERN = re.compile(r'[^\W\d_]')
+
+
+class Fragment(list):
+    """A record's pre-rendered block, with its joined text and a stable key"""
+
+    __slots__ = ('key', 'text')
+
+    def __init__(self, key, segments):
+        super().__init__(segments)
+        self.key = key
+        self.text = ''.join(value for _, value in segments)
+
+
+def text(value):
+    return (TEXT, value)
+
+
+def entity(value):
+    return (ENTITY, str(value))
+
+
+def raw(value):
+    return (RAW, str(value))
+
+
+def value_segment(value):
+    """Wrap a data value, keeping URLs and values without words untranslated"""
+    value = str(value)
+    if URL_PATTERN.match(value) or not LETTER_PATTERN.search(value):
+        return raw(value)
+    return text(value)
+
+
+def bullet(label, value, indent="   "):
+    """Render a '• Label: value' line as segments"""
+    return [raw(f"{indent}• "), text(label), raw(": "), value_segment(value), raw("\n")]
+
+
+def join_segments(blocks):
+    """Join rendered blocks into the final response string"""
+    return ''.join(block.text if isinstance(block, Fragment) else ''.join(value for _, value in block)
+                   for block in blocks)
+
+
+def render_record(render, record):
+    """Render a record's block on demand; the default for the fragment hooks below"""
+    return render(record)
+
+
+def with_greeting(greeting, blocks):
+    """Prefix the first block of a response with the greeting"""
+    if not greeting:
+        return blocks
+    return [[text(greeting)] + blocks[0]] + blocks[1:]
+
+
+def time_of_day(hour=None):
+    """Return the greeting period for an hour of the day"""
+    if hour is None:
+        hour = datetime.now().hour
+    return 'morning' if 5 <= hour < 12 else 'afternoon' if 12 <= hour < 17 else 'evening'
+
+
+def greeting_prefix(hour=None):
+    """Return the time-of-day greeting that prefixes generated answers"""
+    return GREETINGS[time_of_day(hour)] + " "
+
+
+def top_college_rows(college):
+    """Return the (key, label, value) rows shown for a national college"""
+    return [(key, label, college[key]) for key, label in TOP_COLLEGE_FIELDS]
+
+
+def render_rows(rows):
+    """Render (key, label, value) rows as bullet segments, listing at most three items per value"""
+    segments = []
+    for _, label, value in rows:
+        if isinstance(value, list):
+            value = ', '.join(value[:3])
+        segments += bullet(label, value)
+    return segments
+
+
+def render_top_college(college):
+    """Render one national college record as a block, without its list number"""
+    block = [entity(college['name']), raw(" ("), entity(college['location']), raw(")\n")]
+    block += render_rows(top_college_rows(college))
+    block.append(raw("\n"))
+    return block
+
+
+def render_top_colleges(education_data, field=None, fragment=render_record):
+    """Render the top national colleges for a field as blocks"""
+    top_colleges = education_data['top_colleges']
+    if field in top_colleges:
+        colleges = top_colleges[field]
+        field = field.replace('_', ' ')
+    else:
+        # If no specific field, combine top colleges from all fields
+        colleges = []
+        for field_colleges in top_colleges.values():
+            colleges.extend(field_colleges[:2])  # Take top 2 from each field
+        field = "various fields"
+
+    blocks = [[
+        text("Here's what I found about Indian colleges and universities related to your query:\n\n"),
+        text(f"Top colleges for {field} in India:\n\n"),
+    ]]
+
+    for i, college in enumerate(colleges[:5], 1):
+        blocks += [[raw(f"{i}. ")], fragment(render_top_college, college)]
+
+    blocks.append([text("Would you like more specific information about any of these colleges or a different field?")])
+    return blocks
+
+
+def maharashtra_heading(route):
+    """Return the heading for a Maharashtra listing, worded after the query filters"""
+    city = route['city']
+    if city:
+        heading = f"Here's what I found about colleges in {city.title()}, Maharashtra:\n\n"
+    else:
+        heading = "Here's what I found about colleges in Maharashtra related to your query:\n\n"
+
+    field = route['fields']['college']
+    if field in ('engineering', 'medical', 'management'):
+        heading = heading.replace('colleges in', f'{field} colleges in')
+    if route['type']:
+        heading = heading.replace('colleges in', f"{route['type']} colleges in")
+    if route['affordable']:
+        heading = heading.replace('colleges in', 'affordable colleges in')
+    return heading
+
+
+def maharashtra_rows(college):
+    """Return the (key, label, value) rows shown for a Maharashtra college"""
+    rows = []
+    if 'source' in college:
+        rows.append(('source', 'Source', college['source']))
+
+    for key, label in MAHARASHTRA_FIELDS:
+        if not college.get(key):
+            continue
+        if key == 'rating' and 'nirf' in str(college['rating']).lower():
+            rows.append(('nirf_ranking', 'NIRF Ranking', college[key]))
+        else:
+            rows.append((key, label, college[key]))
+    return rows
+
+
+def render_maharashtra_college(college):
+    """Render one Maharashtra college record as a block, without its list number"""
+    block = [entity(college['name']), raw(" ("), entity(college.get('location', 'Maharashtra')), raw(")\n")]
+    block += render_rows(maharashtra_rows(college))
+    block.append(raw("\n"))
+    return block
+
+
+def render_maharashtra_colleges(heading, colleges, fallback=None, fragment=render_record):
+    """Render a Maharashtra listing, or the fallback colleges when nothing matched"""
+    blocks = [[text(heading)]]
+    if not colleges:
+        blocks[0].append(text("I couldn't find specific colleges matching your query in Maharashtra. Here are some top colleges in Maharashtra instead:\n\n"))
+        colleges = fallback or []
+
+    for i, college in enumerate(colleges, 1):
+        blocks += [[raw(f"{i}. ")], fragment(render_maharashtra_college, college)]
+
+    blocks.append([text("Would you like more specific information about any of these colleges or a different location in Maharashtra?")])
+    return blocks
+
+
+def exam_rows(exam):
+    """Return the (key, label, value) rows shown for an entrance exam"""
+    return [(key, label, exam[key]) for key, label in EXAM_FIELDS]
+
+
+def render_exam(exam):
+    """Render one entrance exam record as a block, without its list number"""
+    block = [entity(exam['name']), raw(" ("), entity(exam['full_name']), raw(")\n")]
+    block += render_rows(exam_rows(exam))
+    block.append(raw("\n"))
+    return block
+
+
+def render_exams(education_data, field=None, fragment=render_record):
+    """Render the entrance exams for a field as blocks"""
+    entrance_exams = education_data['entrance_exams']
+    if field in entrance_exams:
+        exams = entrance_exams[field]
+    else:
+        # If no specific field, combine exams from all fields
+        exams = []
+        for field_exams in entrance_exams.values():
+            exams.extend(field_exams)
+        field = "various fields"
+
+    blocks = [[
+        text("Here's information about entrance exams in India related to your query:\n\n"),
+        text(f"Important entrance exams for {field} in India:\n\n"),
+    ]]
+
+    for i, exam in enumerate(exams, 1):
+        blocks += [[raw(f"{i}. ")], fragment(render_exam, exam)]
+
+    blocks.append([text("Do you need more specific details about any of these exams or preparation tips?")])
+    return blocks
+
+
+def scholarship_rows(scholarship):
+    """Return the (key, label, value) rows shown for a scholarship"""
+    return [(key, label, scholarship[key]) for key, label in SCHOLARSHIP_FIELDS if scholarship.get(key)]
+
+
+def render_scholarship(scholarship):
+    """Render one scholarship record as a block, without its list number"""
+    block = [entity(scholarship['name']), raw("\n")]
+    block += render_rows(scholarship_rows(scholarship))
+    block.append(raw("\n"))
+    return block
+
+
+def render_scholarships(education_data, fragment=render_record):
+    """Render the scholarship listing as blocks"""
+    blocks = [[text("Here's information about scholarships available for Indian students:\n\n")]]
+
+    scholarships = education_data['scholarships']
+    if isinstance(scholarships, dict):
+        scholarships = list(scholarships.values())
+
+    for i, scholarship in enumerate(scholarships, 1):
+        blocks += [[raw(f"{i}. ")], fragment(render_scholarship, scholarship)]
+
+    blocks.append([text("Would you like information about any specific scholarship or eligibility criteria?")])
+    return blocks
+
+
+def timeline_rows(timeline):
+    """Return the (key, label, value) rows shown for an admission timeline"""
+    return [(event, event, date) for event, date in timeline['events'].items()]
+
+
+def render_admission_timeline(timeline):
+    """Render one field's admission timeline as a block, without its list number"""
+    block = [text(timeline['name']), raw("\n")]
+    block += render_rows(timeline_rows(timeline))
+    block.append(raw("\n"))
+    return block
+
+
+# Structured description of each record renderer: kind, subtitle field and rows
+RECORD_KINDS = {
+    render_top_college: ('college', 'location', top_college_rows),
+    render_maharashtra_college: ('college', 'location', maharashtra_rows),
+    render_exam: ('exam', 'full_name', exam_rows),
+    render_scholarship: ('scholarship', None, scholarship_rows),
+    render_admission_timeline: ('admission', None, timeline_rows),
+}
+
+
+def structured_record(render, record):
+    """Describe a record as plain data; returns the record and its field labels by key"""
+    kind, subtitle, rows = RECORD_KINDS[render]
+    rows = rows(record)
+    data = {'kind': kind, 'name': record['name']}
+    if subtitle and record.get(subtitle):
+        data['subtitle'] = record[subtitle]
+    data['fields'] = {key: value for key, _, value in rows}
+    return data, {key: label for key, label, _ in rows}
+
+
+# Closing line of an answer about one named record, by kind
+NAMED_CLOSINGS = {
+    'college': "Would you like to compare it with other colleges or know more about its admission process?",
+    'exam': "Would you like preparation tips or information about other entrance exams?",
+}
+
+
+def render_named(render, record, fragment=render_record):
+    """Render the answer about one college or exam the query asked for by name"""
+    return [
+        [text("Here's what I found about "), entity(record['name']), raw(":\n\n")],
+        fragment(render, record),
+        [text(NAMED_CLOSINGS[RECORD_KINDS[render][0]])],
+    ]
+
+
+def render_local_answer(matches, fragment=render_record):
+    """Render the local records that answer a general question, as (confidence, render, record) matches"""
+    blocks = [[text("Here's what I found in our guide related to your query:\n\n")]]
+    for i, (_, render, record) in enumerate(matches, 1):
+        blocks += [[raw(f"{i}. ")], fragment(render, record)]
+
+    blocks.append([text("Would you like more specific information about any of these?")])
+    return blocks
+
+
+def render_admission(education_data, field=None):
+    """Render the admission timeline for a field, or for all fields, as blocks"""
+    blocks = [[text("Here's information about admission processes and timelines in India:\n\n")]]
+    admission_calendar = education_data['admission_calendar']
+
+    if field not in admission_calendar:
+        # If no specific field, provide general admission information
+        blocks[0].append(text("General admission timeline for various fields:\n\n"))
+        for field_name, calendar in admission_calendar.items():
+            block = [text(f"For {field_name.capitalize()} courses:\n")]
+            for event, timeline in calendar.items():
+                block += bullet(event, timeline)
+            block.append(raw("\n"))
+            blocks.append(block)
+
+        blocks.append([text("Would you like more specific information about admission processes for a particular field or college?")])
+        return blocks
+
+    blocks[0].append(text(f"Admission timeline for {field} courses in India:\n\n"))
+
+    block = []
+    for event, timeline in admission_calendar[field].items():
+        block += bullet(event, timeline, indent="")
+    blocks.append(block)
+
+    blocks.append([raw("\n"), text("Would you like more specific information about admission processes for a particular college?")])
+    return blocks
+
+
+def render_search_results(query, search_results):
+    """Render the top three web search results as blocks; titles and snippets are translated, links are not"""
+    items = search_results.get('items')
+    if not items:
+        return [[text("I couldn't find specific information about "), entity(f"'{query}'"),
+                 text(" in the context of Indian education. Please try asking about specific colleges, exams, "
+                      "or admission processes.")]]
+
+    blocks = [[text("Here's what I found about "), entity(f"'{query}'"), text(" in the Indian education context:"),
+               raw("\n\n")]]
+    for i, item in enumerate(items[:3], 1):
+        blocks.append([
+            raw(f"{i}. "), text(item.get('title', 'No title')), raw("\n   • "),
+            text(item.get('snippet', 'No description available')), raw("\n   • "),
+            raw(item.get('link', '#')), raw("\n\n"),
+        ])
+    return blocks
+
+
+def render_suggestions(suggestions):
+    """Render follow-up suggestions as a block"""
+    block = [text("You might also be interested in:\n")]
+    for suggestion in suggestions:
+        block += [raw("• "), text(suggestion), raw("\n")]
+    return [block]
@@ -0,0 +1,222 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from renderers import GREETINGS, join_segments, render_admission, render_scholarships, text, time_of_day
+from translation_cache import LANGUAGES, translate_segments
+
+CATALOGUE_FORMAT_VERSION = 1
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'indian_education_data.json')
+DEFAULT_CATALOGUE_PATH = os.path.join(os.path.dirname(__file__), 'cache', 'response_catalogue.json')
+
+
+def file_hash(path):
+    """Return the sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_static_responses(education_data):
+    """Render every answer that depends only on the dataset as blocks, keyed by catalogue key"""
+    responses = {}
+
+    common_queries = education_data.get('common_queries', {})
+    for group in ('greetings', 'general'):
+        for key, response in common_queries.get(group, {}).items():
+            responses[f'common:{key}'] = [[text(response)]]
+
+    for period, greeting in GREETINGS.items():
+        responses[f'greeting:{period}'] = [[text(greeting)]]
+
+    responses['scholarship'] = render_scholarships(education_data)
+    for field in education_data.get('admission_calendar', {}):
+        responses[f'admission:{field}'] = render_admission(education_data, field)
+    responses['admission:general'] = render_admission(education_data)
+
+    return responses
+
+
+def build_catalogue(data_path, languages, translate, previous=None):
+    """Render the static responses and translate them into every language.
+
+    Translations in a previous catalogue built from the same data are kept, so
+    only the entries missing from it are translated again.
+    """
+    source_hash = file_hash(data_path)
+    with open(data_path, 'r', encoding='utf-8') as f:
+        education_data = json.load(f)
+    if previous is None or previous['source_hash'] != source_hash:
+        previous = {'entries': {}}
+
+    entries = {}
+    failures = 0
+    for key, blocks in render_static_responses(education_data).items():
+        entries[key] = {'en': join_segments(blocks)}
+        for lang in languages:
+            if lang == 'en':
+                continue
+            if lang in previous['entries'].get(key, {}):
+                entries[key][lang] = previous['entries'][key][lang]
+                continue
+            try:
+                translation = translate(blocks, 'en', lang)
+            except Exception as e:
+                print(f"Error translating {key} to {lang}: {str(e)}")
+                translation = None
+            if translation:
+                entries[key][lang] = translation
+            else:
+                failures += 1
+
+    return {
+        'format_version': CATALOGUE_FORMAT_VERSION,
+        'source_hash': source_hash,
+        'built_at': datetime.now().isoformat(),
+        'languages': sorted(languages),
+        'failures': failures,
+        'entries': entries,
+    }
+
+
+class ResponseCatalogue:
+    """Pre-translated static responses loaded at startup.
+
+    The catalogue records the hash of the source JSON it was built from.
+    When the hash no longer matches, or the file is missing, it is rebuilt
+    on a background thread while requests fall back to live translation.
+    Entries whose translation failed, e.g. while the translator was down,
+    are translated again after retry_delay seconds, doubling up to
+    max_retry_delay, until none are missing.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOGUE_PATH, data_path=DEFAULT_DATA_PATH, retry_delay=30.0,
+                 max_retry_delay=600.0):
+        self.path = path
+        self.data_path = data_path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.entries = {}
+        self.version = None
+        self.rebuild_thread = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def load(self):
+        """Load the catalogue if it matches the source data; return whether it is complete"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                catalogue = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading response catalogue: {str(e)}")
+            return False
+
+        if catalogue.get('format_version') != CATALOGUE_FORMAT_VERSION:
+            return False
+        if catalogue.get('source_hash') != file_hash(self.data_path):
+            # Stop serving entries built from data that has since been reloaded
+            self.entries = {}
+            self.version = None
+            return False
+
+        # A partial catalogue is still served, but is rebuilt to fill the gaps
+        self.entries = catalogue['entries']
+        self.version = catalogue['source_hash']
+        return catalogue.get('failures', 0) == 0
+
+    def save(self, catalogue):
+        """Write a catalogue atomically and make it the active one"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(catalogue, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self.entries = catalogue['entries']
+        self.version = catalogue['source_hash']
+
+    def rebuild(self, languages, translate, retry=True):
+        """Build the catalogue from the source data and save it, retrying missing translations if asked"""
+        catalogue = build_catalogue(self.data_path, languages, translate)
+        self.save(catalogue)
+        delay = self.retry_delay
+        while True:
+            # The data may have been replaced while translating; build again for the new file
+            if catalogue['source_hash'] != file_hash(self.data_path):
+                catalogue = build_catalogue(self.data_path, languages, translate)
+            elif retry and catalogue['failures']:
+                print(f"Response catalogue has {catalogue['failures']} missing translations, retrying in {delay:.0f}s")
+                self.wake.wait(delay)
+                self.wake.clear()
+                delay = min(delay * 2, self.max_retry_delay)
+                catalogue = build_catalogue(self.data_path, languages, translate, catalogue)
+            else:
+                break
+            self.save(catalogue)
+        print(f"Built response catalogue with {len(catalogue['entries'])} entries "
+              f"({catalogue['failures']} missing translations)")
+        return catalogue
+
+    def ensure_fresh(self, languages, translate):
+        """Load the catalogue, rebuilding it in the background if it is stale"""
+        if self.load():
+            return True
+        with self.lock:
+            if self.rebuild_thread is None or not self.rebuild_thread.is_alive():
+                self.rebuild_thread = threading.Thread(
+                    target=self.rebuild, args=(languages, translate), daemon=True
+                )
+                self.rebuild_thread.start()
+            else:
+                # Cut short a wait to retry, so that changed data is rebuilt now
+                self.wake.set()
+        return False
+
+    def lookup(self, key, lang):
+        """Return the catalogued text for a key and language, or None"""
+        translations = self.entries.get(key)
+        if translations is None:
+            return None
+        return translations.get(lang)
+
+    def answer_body(self, route, lang):
+        """Return a pre-translated static answer body (no greeting) for the route, or None"""
+        if route['intent'] == 'scholarship':
+            key = 'scholarship'
+        elif route['intent'] == 'admission':
+            key = f"admission:{route['fields']['admission'] or 'general'}"
+        else:
+            return None
+        return self.lookup(key, lang)
+
+    def answer(self, route, lang):
+        """Return a pre-translated static answer for the route, or None if it is not catalogued"""
+        if route['common']:
+            return self.lookup(f"common:{route['common']}", lang)
+
+        greeting = self.lookup(f"greeting:{time_of_day()}", lang)
+        body = self.answer_body(route, lang)
+        if greeting is None or body is None:
+            return None
+        return f"{greeting} {body}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the pre-translated response catalogue')
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH, help='source education data JSON')
+    parser.add_argument('--output', default=DEFAULT_CATALOGUE_PATH, help='catalogue file to write')
+    args = parser.parse_args()
+
+    catalogue = ResponseCatalogue(args.output, args.data)
+    catalogue.rebuild(list(LANGUAGES), translate_segments, retry=False)
+
+
+if __name__ == '__main__':
+    main()
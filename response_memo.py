@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseMemo:
+    """LRU memo of rendered, translated answer bodies with a TTL.
+
+    Keys include the dataset version, so entries built from old data are
+    simply never looked up again and age out of the LRU. When the data
+    changes only in part, rekey carries the unaffected entries over to the
+    new version.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the memoized value for a key, or None"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created < self.ttl_seconds:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        """Whether a fresh value is memoized for a key, without counting a lookup"""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and time.monotonic() - entry[1] < self.ttl_seconds
+
+    def set(self, key, value):
+        """Memoize a value, evicting the least recently used entries"""
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def rekey(self, rekey):
+        """Move each entry to the key rekey(key, value) returns, dropping it for None; returns how many are left"""
+        with self.lock:
+            entries = list(self.entries.items())
+        # Decided outside the lock, which may take a while; entries set meanwhile are kept as they are
+        moved = [(rekey(key, value), key, (value, created)) for key, (value, created) in entries]
+        with self.lock:
+            for _, key, _ in moved:
+                self.entries.pop(key, None)
+            kept = OrderedDict((new_key, entry) for new_key, _, entry in moved if new_key is not None)
+            # Older entries first, so that the least recently used are still evicted first
+            kept.update(self.entries)
+            self.entries = kept
+        return len(kept)
+
+    def clear(self):
+        """Drop every memoized value"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the number of entries"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0,
+            }
@@ -0,0 +1,180 @@
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+
+def normalize_query(query):
+    """Lowercase and collapse whitespace so equivalent queries share a key"""
+    return re.sub(r'\s+', ' ', query.strip().lower())
+
+
+class _Flight:
+    """An upstream call in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCache:
+    """TTL/LRU cache of search results with request coalescing.
+
+    Concurrent lookups for the same normalized query share one upstream
+    call: the first caller fetches, the others wait for its result.
+    Failed fetches are not cached; their error is raised in every waiter.
+    Expired results stay until evicted, to answer with while search fails.
+    Threads (Flask) and coroutines (async_server) are coalesced separately.
+    """
+
+    def __init__(self, max_entries=5000, ttl_seconds=6 * 3600, daily_quota=100):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.daily_quota = daily_quota
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.async_in_flight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.stale_hits = 0
+        self.quota_day = date.today()
+        self.quota_used = 0
+
+    def _lookup(self, key):
+        """Return a fresh cached result or None; the lock must be held"""
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        return None
+
+    def _start_upstream(self):
+        """Count an upstream call against today's quota; the lock must be held"""
+        today = date.today()
+        if today != self.quota_day:
+            self.quota_day = today
+            self.quota_used = 0
+        self.misses += 1
+        self.upstream_calls += 1
+        self.quota_used += 1
+
+    def _store(self, key, result):
+        """Cache a result, evicting the least recently used entries; the lock must be held"""
+        self.entries[key] = (result, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get_or_fetch(self, query, fetch):
+        """Return cached results for the query, or call fetch() once for all concurrent callers"""
+        key = normalize_query(query)
+        with self.lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[0]
+
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self.in_flight[key] = flight
+                self._start_upstream()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch()
+        except BaseException as e:
+            # Waiters must not take an interrupted fetch's missing result for an answer
+            flight.error = e if isinstance(e, Exception) else RuntimeError('Search cancelled')
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+                if flight.error is None:
+                    self._store(key, flight.result)
+                else:
+                    self.upstream_errors += 1
+            flight.done.set()
+
+        return flight.result
+
+    async def get_or_fetch_async(self, query, fetch):
+        """Coroutine variant of get_or_fetch; fetch is a zero-argument coroutine function"""
+        key = normalize_query(query)
+        with self.lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[0]
+
+            future = self.async_in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = asyncio.get_running_loop().create_future()
+                self.async_in_flight[key] = future
+                self._start_upstream()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await fetch()
+        except BaseException as e:
+            with self.lock:
+                del self.async_in_flight[key]
+                self.upstream_errors += 1
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError('Search cancelled'))
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+
+        with self.lock:
+            del self.async_in_flight[key]
+            self._store(key, result)
+        future.set_result(result)
+        return result
+
+    def stale(self, query):
+        """Return the results last cached for the query even if expired, or None; for use when search fails"""
+        with self.lock:
+            entry = self.entries.get(normalize_query(query))
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            return entry[0]
+
+    def stats(self):
+        """Return cache counters, including upstream calls and search quota saved"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'upstream_calls': self.upstream_calls,
+                'upstream_errors': self.upstream_errors,
+                'stale_hits': self.stale_hits,
+                'saved_upstream_calls': self.hits + self.coalesced,
+                'quota_used_today': self.quota_used,
+                'quota_remaining_today': max(0, self.daily_quota - self.quota_used),
+            }
+
+
+# Initialize global search cache
+search_cache = SearchCache()
@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+MAX_MESSAGES = 10
+
+# Seconds to wait on Redis before falling back, unless the URL sets socket_timeout or socket_connect_timeout
+REDIS_TIMEOUT = 0.5
+
+# Errors meaning the Redis server cannot be reached; the redis package is only needed for a Redis backend
+try:
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    REDIS_UNAVAILABLE = (RedisConnectionError, RedisTimeoutError)
+except ImportError:
+    REDIS_UNAVAILABLE = ()
+
+
+class InMemorySessionBackend:
+    """Per-session message deques held in this process.
+
+    Sessions are kept in least-recently-used order, so idle sessions and
+    sessions over the global caps are evicted from the front in O(1) each.
+    """
+
+    def __init__(self, max_messages=MAX_MESSAGES, idle_timeout=1800,
+                 max_sessions=10000, max_total_chars=20_000_000):
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.max_total_chars = max_total_chars
+        self.sessions = OrderedDict()
+        self.total_chars = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def append(self, session_id, message):
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = {'messages': deque(maxlen=self.max_messages), 'last_seen': now}
+                self.sessions[session_id] = session
+            else:
+                self.sessions.move_to_end(session_id)
+
+            messages = session['messages']
+            if len(messages) == messages.maxlen:
+                self.total_chars -= len(messages[0]['content'])
+            messages.append(message)
+            session['last_seen'] = now
+            self.total_chars += len(message['content'])
+
+            self._evict(now)
+
+    def history(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return []
+            return list(session['messages'])
+
+    def clear(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.total_chars -= sum(len(m['content']) for m in session['messages'])
+
+    def _evict(self, now):
+        """Drop idle sessions, then the least recently used ones over the caps"""
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            over_cap = len(self.sessions) > self.max_sessions or self.total_chars > self.max_total_chars
+            idle = now - session['last_seen'] > self.idle_timeout
+            if not (over_cap or idle) or len(self.sessions) == 1:
+                break
+            self.sessions.popitem(last=False)
+            self.total_chars -= sum(len(m['content']) for m in session['messages'])
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self.sessions),
+                'total_chars': self.total_chars,
+                'evictions': self.evictions,
+            }
+
+
+class RedisSessionBackend:
+    """Session history kept in a Redis-protocol store.
+
+    Each session is a capped list with an idle TTL. The client only needs
+    the redis-py list commands used here, so a local stand-in such as
+    fakeredis can replace a real server. The global memory cap is left to
+    the server's maxmemory eviction policy.
+
+    While Redis cannot be reached, history is kept in process instead, and
+    Redis is tried again every retry_interval seconds; messages kept in
+    process are not copied to Redis once it is back.
+    """
+
+    def __init__(self, client, max_messages=MAX_MESSAGES, idle_timeout=1800, prefix='chat:session:',
+                 retry_interval=5.0):
+        self.client = client
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.prefix = prefix
+        self.retry_interval = retry_interval
+        self.fallback = InMemorySessionBackend(max_messages=max_messages, idle_timeout=idle_timeout)
+        self.down_until = 0.0
+        self.failures = 0
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for a redis:// SESSION_BACKEND")
+        client = redis.Redis.from_url(url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+        return cls(client, **kwargs)
+
+    def available(self):
+        """Whether to try Redis: it answered last time, or the retry interval has passed"""
+        return time.monotonic() >= self.down_until
+
+    def _unavailable(self, e):
+        self.failures += 1
+        self.down_until = time.monotonic() + self.retry_interval
+        print(f"Error reaching Redis, keeping sessions in process for {self.retry_interval}s: {str(e)}")
+
+    def append(self, session_id, message):
+        if self.available():
+            key = self.prefix + session_id
+            pipe = self.client.pipeline()
+            pipe.rpush(key, json.dumps(message))
+            pipe.ltrim(key, -self.max_messages, -1)
+            pipe.expire(key, self.idle_timeout)
+            try:
+                pipe.execute()
+                return
+            except REDIS_UNAVAILABLE as e:
+                self._unavailable(e)
+        self.fallback.append(session_id, message)
+
+    def history(self, session_id):
+        if self.available():
+            try:
+                items = self.client.lrange(self.prefix + session_id, 0, -1)
+                return [json.loads(item) for item in items]
+            except REDIS_UNAVAILABLE as e:
+                self._unavailable(e)
+        return self.fallback.history(session_id)
+
+    def clear(self, session_id):
+        self.fallback.clear(session_id)
+        if self.available():
+            try:
+                self.client.delete(self.prefix + session_id)
+            except REDIS_UNAVAILABLE as e:
+                self._unavailable(e)
+
+    def stats(self):
+        return {
+            'backend': 'redis',
+            'available': self.available(),
+            'failures': self.failures,
+            'fallback_sessions': self.fallback.stats()['sessions'],
+        }
+
+
+class SessionStore:
+    """Conversation history per client session"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @classmethod
+    def from_config(cls, url=None, **kwargs):
+        """Use a Redis backend for redis:// URLs, otherwise keep sessions in process"""
+        if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+            return cls(RedisSessionBackend.from_url(url, **kwargs))
+        return cls(InMemorySessionBackend(**kwargs))
+
+    def add_message(self, session_id, role, content):
+        """Append a message to a session's history"""
+        self.backend.append(session_id, {'role': role, 'content': content})
+
+    def history(self, session_id):
+        """Return a session's recent messages, oldest first"""
+        return self.backend.history(session_id)
+
+    def clear(self, session_id):
+        """Forget a session"""
+        self.backend.clear(session_id)
+
+    def stats(self):
+        """Return backend session counters"""
+        return self.backend.stats()
@@ -0,0 +1,69 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import dataset
+from college_store import CollegeStore
+from dataset import DEFAULT_COLLEGES_PATH, DEFAULT_DATA_PATH, load_snapshot, parse_snapshot, read_snapshot
+
+
+def snapshot_header(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def test_snapshot_with_the_previous_layout_is_rejected_and_rebuilt(tmp_path, monkeypatch):
+    path = str(tmp_path / 'dataset.snapshot')
+    # A KnowledgeBase pickled before it had k1 and the cached pattern matrix
+    old = parse_snapshot()
+    del old.knowledge.k1, old.knowledge._pattern
+    monkeypatch.setattr(dataset, 'SNAPSHOT_FORMAT_VERSION', 4)
+    dataset.write_snapshot(old, path)
+    monkeypatch.undo()
+
+    assert read_snapshot(path, old.file_hashes) is None
+    snapshot = load_snapshot(DEFAULT_DATA_PATH, DEFAULT_COLLEGES_PATH, path)
+
+    assert snapshot_header(path)['format_version'] == dataset.SNAPSHOT_FORMAT_VERSION
+    snapshot.knowledge.search('eligibility for the national scholarship')
+    assert read_snapshot(path, snapshot.file_hashes).knowledge.k1 == snapshot.knowledge.k1
+
+
+def test_snapshot_built_by_the_command_line_loads_in_the_server(tmp_path):
+    path = str(tmp_path / 'dataset.snapshot')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, 'dataset.py', '--output', path], cwd=root, check=True, capture_output=True)
+
+    # A fresh interpreter, like a server starting up, must find the pickled classes
+    code = ('import sys, dataset; from response_catalogue import file_hash; '
+            'hashes = {p: file_hash(p) for p in (dataset.DEFAULT_DATA_PATH, dataset.DEFAULT_COLLEGES_PATH)}; '
+            'sys.exit(dataset.read_snapshot(sys.argv[1], hashes) is None)')
+    result = subprocess.run([sys.executable, '-c', code, path], cwd=root, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_merged_batches_index_like_a_snapshot_built_at_once():
+    base = parse_snapshot()
+    extra = [{'name': f'Ingested College {i}', 'location': ('Pune', 'Nagpur, Maharashtra')[i % 2],
+              'courses': ['B.Tech'], 'type': ('Private', 'Government')[i % 3 == 0], 'rating': str(i % 50 / 10),
+              'fees': f'{50000 + i * 7 % 90000}'} for i in range(300)]
+    snapshot = base
+    for start in range(0, len(extra), 37):
+        snapshot = snapshot.with_colleges(extra[start:start + 37], str(start))
+    built = dataset.Snapshot('built', base.education_data,
+                             CollegeStore([dict(c) for c in base.maharashtra_colleges] + extra))
+
+    queries = [{}, {'city': 'pune'}, {'city': 'nagpur', 'field': 'engineering'}, {'college_type': 'government'},
+               {'affordable': True}, {'city': 'pune', 'affordable': True}]
+    for query in queries:
+        for limit in (1, 5, 40):
+            merged = [dict(c) for c in snapshot.maharashtra_index.search(limit=limit, **query)]
+            assert merged == [dict(c) for c in built.maharashtra_index.search(limit=limit, **query)]
+    assert len(snapshot.maharashtra_index.rating_runs) < 10
+
+    # The first snapshot still sees only its own colleges
+    assert len(base.maharashtra_index.search(city='pune', limit=10 ** 6)) == \
+        len(base.maharashtra_index.by_city.get('pune', ()))
+    assert base.maharashtra_index.count == len(base.maharashtra_colleges)
+    assert snapshot.named('Ingested College 123')[1]['name'] == 'Ingested College 123'
@@ -0,0 +1,20 @@
+import pytest
+
+from language_detector import LanguageDetector
+
+
+@pytest.fixture(scope='module')
+def detector():
+    return LanguageDetector()
+
+
+@pytest.mark.parametrize('message', ["Hi ho", "Ho ho ho", "Hi ki", "Ya sure", "Bye ho", "Mein Kampf",
+                                     "Tell me about IIT Bombay"])
+def test_short_latin_texts_stay_english(detector, message):
+    assert detector.detect(message) == 'en'
+
+
+@pytest.mark.parametrize('message', ["kaise ho", "kya hai", "mujhe batao", "scholarship chahiye",
+                                     "neet ki taiyari kaise karein"])
+def test_romanized_hindi_is_detected(detector, message):
+    assert detector.detect(message) == 'hi'
@@ -0,0 +1,52 @@
+import random
+
+from benchmarks import misspell, synthetic_names
+from name_index import NameIndex
+
+
+def index_of(*names):
+    index = NameIndex()
+    for i, name in enumerate(names):
+        index.add([name], i)
+    return index
+
+
+def test_misspelt_long_name_does_not_resolve_to_a_shorter_one_it_contains():
+    index = index_of('Lasa College of Pharmacy, Pune', 'Lasa Hivanhide Jiniladev College of Pharmacy, Pune')
+
+    assert index.best('Lasa Hivanhide Jiniladev College of Pharmacy') == 1
+    assert index.best('Lasa Hivanhide Jioiladev College of Pharmacy') == 1
+    assert index.best('Lasa College of Pharmacy') == 0
+
+
+def test_name_matching_more_of_the_query_wins_over_a_fully_covered_shorter_one():
+    index = index_of('Vimolama Kohivi Ratil Law College, Pune', 'Kohivi College of Engineering, Nagpur')
+
+    assert index.best('iimolama Kohivi Ratil Law College') == 0
+    assert index.best('Kohivi College of Engineering') == 1
+
+
+def test_records_level_on_net_matched_trigrams_are_ambiguous():
+    # With "Devde" misspelt, the longer name matches more of the query but also misses more of itself
+    index = index_of('Devde Devjisa Law College, Pune', 'Devjisa Medical College, Nagpur')
+
+    assert index.best('Deide Devjisa Law College') is None
+
+
+def test_short_form_shared_by_several_records_is_ambiguous():
+    index = index_of('Indian Institute of Technology (IIT) Bombay', 'Indian Institute of Technology (IIT) Delhi')
+
+    assert index.best('IIT') is None
+    assert index.best('iit bombay fees') == 0
+
+
+def test_most_misspelt_names_resolve_in_a_realistic_index():
+    names = synthetic_names(50000)
+    index = index_of(*names)
+    rng = random.Random(7)
+    picks = rng.sample(range(len(names)), 300)
+    found = [index.best(misspell(names[i].split(',')[0], rng)) for i in picks]
+
+    # Some names are made of the same words as another one, so not every lookup can resolve
+    assert sum(target == i for target, i in zip(found, picks)) >= 0.65 * len(picks)
+    assert sum(target not in (None, i) for target, i in zip(found, picks)) <= 0.01 * len(picks)
@@ -0,0 +1,48 @@
+from performance_monitor import SLOT_SECONDS, PerformanceMonitor, WindowedHistogram
+
+
+def test_expired_slots_are_retired_when_their_ring_entry_is_reused():
+    windowed = WindowedHistogram(span=60)
+    start = 1000 * SLOT_SECONDS
+    windowed.record(5.0, now=start)
+    windowed.record(7.0, now=start + SLOT_SECONDS)
+    # Six slots later the first entry is reused; its duration leaves the windows but stays in all_time
+    windowed.record(9.0, now=start + 6 * SLOT_SECONDS)
+
+    assert windowed.window(60, now=start + 6 * SLOT_SECONDS).count == 2
+    assert windowed.retired.count == 1
+    assert windowed.all_time.count == 3
+    assert windowed.all_time.max == 9.0
+
+
+def test_saved_histogram_loads_with_the_same_counts():
+    windowed = WindowedHistogram(span=60)
+    start = 1000 * SLOT_SECONDS
+    for i in range(20):
+        windowed.record(1.0 + i, now=start + i * SLOT_SECONDS)
+
+    loaded = WindowedHistogram.from_dict(windowed.to_dict())
+
+    assert loaded.to_dict() == windowed.to_dict()
+    assert loaded.retired.count == windowed.retired.count
+    now = start + 19 * SLOT_SECONDS
+    assert loaded.window(60, now=now).summary() == windowed.window(60, now=now).summary()
+
+
+def test_pending_timings_are_counted_when_metrics_are_read():
+    monitor = PerformanceMonitor()
+    monitor.flusher = object()  # no background thread: only reads count what is waiting
+    monitor.request_started()
+    monitor.request_started()
+    with monitor.stage('translate_in'):
+        pass
+    monitor.request_finished('chat', 'college', 'en', 200, 0.002)
+
+    assert monitor.operations['text_query'].all_time.count == 0
+    metrics = monitor.get_metrics()
+
+    assert metrics['text_query']['count'] == 1
+    assert metrics['translation']['count'] == 1
+    assert monitor.in_flight == 1
+    assert monitor.in_flight == 1
+    assert 'chat_stage_duration_seconds_count{stage="translate_in"} 1' in monitor.prometheus_lines()
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from response_catalogue import ResponseCatalogue
+
+
+class FlakyTranslator:
+    """Fails its first `outage` calls, like a translator that is down at startup, then tags the text"""
+
+    def __init__(self, outage):
+        self.outage = outage
+        self.calls = []
+
+    def __call__(self, blocks, source, target):
+        self.calls.append(target)
+        if len(self.calls) <= self.outage:
+            raise ConnectionError('translator is down')
+        return f"[{target}] " + ''.join(value for block in blocks for _, value in block)
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data.json'
+    data = {'common_queries': {'greetings': {'hello': 'Hello!'}}, 'scholarships': [], 'admission_calendar': {}}
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return path
+
+
+def test_failed_translations_are_retried_until_complete(tmp_path, data_path, capsys):
+    catalogue = ResponseCatalogue(str(tmp_path / 'catalogue.json'), str(data_path), retry_delay=0.01)
+    translator = FlakyTranslator(outage=5)
+
+    built = catalogue.rebuild(['en', 'hi'], translator)
+
+    assert built['failures'] == 0
+    assert catalogue.lookup('common:hello', 'hi') == '[hi] Hello!'
+    assert catalogue.load()
+    # Once the translator is back, only the missing entries are translated again
+    entries = len(built['entries'])
+    assert len(translator.calls) == 5 + entries
+    assert 'retrying' in capsys.readouterr().out
+
+
+def test_retry_can_be_turned_off(tmp_path, data_path):
+    catalogue = ResponseCatalogue(str(tmp_path / 'catalogue.json'), str(data_path), retry_delay=0.01)
+
+    built = catalogue.rebuild(['en', 'hi'], FlakyTranslator(outage=1), retry=False)
+
+    assert built['failures'] == 1
+    assert not catalogue.load()
@@ -0,0 +1,224 @@
+import json
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+import search_cache
+from search_cache import SearchCache
+
+
+class FakeSearchServer:
+    """Local stand-in for the Custom Search API that counts the requests it serves"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.queries = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+                server.queries.append(query)
+                time.sleep(server.latency)
+                body = json.dumps({'items': [{'title': f'Result for {query}', 'link': 'https://example.edu.in'}]})
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(body.encode('utf-8'))
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/customsearch/v1'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def fetcher(self, query):
+        """Return a zero-argument fetch for get_or_fetch that searches the fake server"""
+        def fetch():
+            response = requests.get(self.url, params={'q': query}, timeout=5)
+            response.raise_for_status()
+            return response.json()
+        return fetch
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = FakeSearchServer()
+    yield server
+    server.close()
+
+
+def test_repeat_query_is_served_from_cache(server):
+    cache = SearchCache()
+    first = cache.get_or_fetch('JEE Main dates', server.fetcher('JEE Main dates'))
+    # Queries differing only in case and spacing share an entry
+    second = cache.get_or_fetch('  jee   main DATES ', server.fetcher('jee main dates'))
+
+    assert first == second
+    assert server.queries == ['JEE Main dates']
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['upstream_calls']) == (1, 1, 1)
+
+
+def test_expired_entry_is_fetched_again(server):
+    cache = SearchCache(ttl_seconds=0.05)
+    cache.get_or_fetch('neet cutoff', server.fetcher('neet cutoff'))
+    time.sleep(0.1)
+    cache.get_or_fetch('neet cutoff', server.fetcher('neet cutoff'))
+
+    assert len(server.queries) == 2
+    assert cache.stats()['hits'] == 0
+
+
+def test_expired_entry_still_answers_when_search_fails(server):
+    cache = SearchCache(ttl_seconds=0.05)
+    result = cache.get_or_fetch('neet cutoff', server.fetcher('neet cutoff'))
+    time.sleep(0.1)
+
+    assert cache.stale('neet cutoff') == result
+    assert cache.stale('unknown question') is None
+    assert cache.stats()['stale_hits'] == 1
+
+
+def test_least_recently_used_entry_is_evicted(server):
+    cache = SearchCache(max_entries=2)
+    for query in ('a', 'b', 'a', 'c'):
+        cache.get_or_fetch(query, server.fetcher(query))
+    assert server.queries == ['a', 'b', 'c']
+
+    # 'b' was the least recently used when 'c' came in
+    cache.get_or_fetch('a', server.fetcher('a'))
+    cache.get_or_fetch('b', server.fetcher('b'))
+    assert server.queries == ['a', 'b', 'c', 'b']
+    assert cache.stats()['entries'] == 2
+
+
+def test_concurrent_identical_queries_make_one_upstream_call(server):
+    server.latency = 0.2
+    cache = SearchCache()
+    clients = 16
+    barrier = threading.Barrier(clients)
+    results = [None] * clients
+
+    def client(i):
+        barrier.wait()
+        results[i] = cache.get_or_fetch('Scholarships for girls', server.fetcher('Scholarships for girls'))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert server.queries == ['Scholarships for girls']
+    assert all(result == results[0] for result in results)
+    stats = cache.stats()
+    assert stats['upstream_calls'] == 1
+    assert stats['coalesced'] == clients - 1
+    assert stats['saved_upstream_calls'] == clients - 1
+
+
+def test_failed_fetch_is_not_cached_and_reaches_waiters():
+    cache = SearchCache()
+    release = threading.Event()
+    errors = []
+
+    def failing_fetch():
+        release.wait(5)
+        raise ConnectionError('search is down')
+
+    def leader():
+        try:
+            cache.get_or_fetch('iit fees', failing_fetch)
+        except ConnectionError as e:
+            errors.append(e)
+
+    def waiter():
+        try:
+            cache.get_or_fetch('iit fees', lambda: pytest.fail('waiter must not fetch'))
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    while not cache.in_flight:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=waiter))
+    threads[1].start()
+    while cache.stats()['coalesced'] < 1:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2
+    stats = cache.stats()
+    assert stats['upstream_errors'] == 1
+    assert stats['entries'] == 0
+
+
+def test_interrupted_fetch_is_not_cached_as_a_result():
+    cache = SearchCache()
+    release = threading.Event()
+    outcomes = []
+
+    def interrupted_fetch():
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    def leader():
+        try:
+            cache.get_or_fetch('mba colleges', interrupted_fetch)
+        except KeyboardInterrupt:
+            outcomes.append('interrupted')
+
+    def waiter():
+        try:
+            outcomes.append(cache.get_or_fetch('mba colleges', lambda: pytest.fail('waiter must not fetch')))
+        except RuntimeError:
+            outcomes.append('cancelled')
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    while not cache.in_flight:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=waiter))
+    threads[1].start()
+    while cache.stats()['coalesced'] < 1:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(outcomes) == ['cancelled', 'interrupted']
+    assert cache.stats()['entries'] == 0
+
+
+def test_quota_counts_upstream_calls_and_resets_daily(server, monkeypatch):
+    cache = SearchCache(daily_quota=3)
+    for query in ('a', 'b', 'a'):
+        cache.get_or_fetch(query, server.fetcher(query))
+    stats = cache.stats()
+    assert (stats['quota_used_today'], stats['quota_remaining_today']) == (2, 1)
+    assert stats['saved_upstream_calls'] == 1
+
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr(search_cache, 'date', Tomorrow)
+    cache.get_or_fetch('c', server.fetcher('c'))
+    stats = cache.stats()
+    assert (stats['quota_used_today'], stats['quota_remaining_today']) == (1, 2)
+    assert stats['upstream_calls'] == 3
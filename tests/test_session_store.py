@@ -0,0 +1,70 @@
+import time
+
+import fakeredis
+import pytest
+
+from session_store import RedisSessionBackend, SessionStore
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def backend(server):
+    return RedisSessionBackend(fakeredis.FakeRedis(server=server), max_messages=4, idle_timeout=60,
+                               retry_interval=0.05)
+
+
+def test_messages_come_back_in_order(backend):
+    store = SessionStore(backend)
+    store.add_message('alice', 'user', 'Which colleges are in Pune?')
+    store.add_message('alice', 'assistant', 'Here are some colleges in Pune')
+    store.add_message('bob', 'user', 'JEE dates')
+
+    assert store.history('alice') == [{'role': 'user', 'content': 'Which colleges are in Pune?'},
+                                      {'role': 'assistant', 'content': 'Here are some colleges in Pune'}]
+    assert store.history('bob') == [{'role': 'user', 'content': 'JEE dates'}]
+    assert store.history('carol') == []
+
+    store.clear('alice')
+    assert store.history('alice') == []
+
+
+def test_history_keeps_only_the_latest_messages(backend):
+    store = SessionStore(backend)
+    for i in range(10):
+        store.add_message('alice', 'user', f'message {i}')
+
+    assert [message['content'] for message in store.history('alice')] == [f'message {i}' for i in range(6, 10)]
+    assert backend.client.llen('chat:session:alice') == 4
+
+
+def test_each_message_refreshes_the_idle_ttl(backend):
+    store = SessionStore(backend)
+    store.add_message('alice', 'user', 'hello')
+    backend.client.expire('chat:session:alice', 5)
+
+    store.add_message('alice', 'user', 'are you there?')
+
+    assert 55 < backend.client.ttl('chat:session:alice') <= 60
+
+
+def test_sessions_stay_in_process_while_redis_is_unreachable(server, backend, capsys):
+    store = SessionStore(backend)
+    store.add_message('alice', 'user', 'kept in redis')
+    server.connected = False
+
+    store.add_message('bob', 'user', 'kept in process')
+    assert store.history('bob') == [{'role': 'user', 'content': 'kept in process'}]
+    assert store.stats()['available'] is False
+    assert store.stats()['fallback_sessions'] == 1
+    # Within the retry interval Redis is not tried again, so a request does not wait on it
+    assert backend.failures == 1
+    assert 'Error reaching Redis' in capsys.readouterr().out
+
+    server.connected = True
+    time.sleep(0.06)
+    assert store.history('alice') == [{'role': 'user', 'content': 'kept in redis'}]
+    assert store.stats()['available'] is True
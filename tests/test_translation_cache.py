@@ -0,0 +1,33 @@
+from translation_cache import TranslationCache, join_lines, split_lines
+
+
+def accessed(cache, text):
+    key = cache.make_key('en', 'hi', text)
+    return cache.db.execute('SELECT accessed FROM translations WHERE key = ?', (key,)).fetchone()[0]
+
+
+def test_disk_hits_write_their_access_time_only_when_the_disk_is_trimmed(tmp_path):
+    cache = TranslationCache(str(tmp_path / 'translations.sqlite3'), max_memory_entries=1, max_disk_entries=3)
+    for i in range(3):
+        cache.set('en', 'hi', f'text {i}', f'translation {i}')
+    stored = accessed(cache, 'text 0')
+
+    cache.memory.clear()
+    assert cache.get('en', 'hi', 'text 0') == 'translation 0'
+    assert cache.stats()['disk_hits'] == 1
+    assert accessed(cache, 'text 0') == stored
+
+    # Over the cap, the least recently used row goes: text 1, since text 0 was just read
+    cache.set('en', 'hi', 'text 3', 'translation 3')
+    cache._trim_disk(accessed(cache, 'text 3'))
+    cache.memory.clear()
+    assert cache.get('en', 'hi', 'text 1') is None
+    assert cache.get('en', 'hi', 'text 0') == 'translation 0'
+
+
+def test_lines_are_translated_once_and_put_back_in_place():
+    text_lines, lines = split_lines(['Fees\n  Rating: good\n', 'Fees'])
+    assert lines == ['Fees', 'Rating: good']
+
+    translated = {'Fees': 'शुल्क', 'Rating: good': ''}
+    assert join_lines(text_lines, translated) == ['शुल्क\n  Rating: good\n', 'शुल्क']
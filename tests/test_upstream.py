@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import upstream
+from upstream import CircuitOpen, Upstream
+
+
+class FlakyService:
+    """Fault-injecting stub: raises `error` on its first `failures` calls, then answers"""
+
+    def __init__(self, failures, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error('service unavailable')
+        return 'ok'
+
+    async def fetch_async(self):
+        return self()
+
+
+@pytest.fixture
+def waits(monkeypatch):
+    """Record the backoff waits instead of sleeping through them; time.sleep is patched everywhere"""
+    recorded = []
+    monkeypatch.setattr(upstream.time, 'sleep', recorded.append)
+    return recorded
+
+
+def test_flaky_call_is_retried_within_the_backoff_bounds(waits):
+    service = Upstream('stub', retries=3, backoff=0.1, max_backoff=0.25)
+    flaky = FlakyService(failures=3)
+
+    assert service.call(flaky) == 'ok'
+    assert flaky.calls == 4
+    assert service.stats()['retries'] == 3
+    assert service.stats()['failures'] == 0
+    # Full jitter: attempt n waits anything up to backoff * 2^n, capped at max_backoff
+    for attempt, wait in enumerate(waits):
+        assert 0 <= wait <= min(0.25, 0.1 * 2 ** attempt)
+
+
+def test_jittered_delays_stay_within_their_bounds():
+    service = Upstream('stub', backoff=0.1, max_backoff=1.0)
+    for attempt in range(6):
+        delays = [service.delay(attempt) for _ in range(500)]
+        bound = min(1.0, 0.1 * 2 ** attempt)
+        assert all(0 <= delay <= bound for delay in delays)
+        # Spread over the range rather than fixed
+        assert max(delays) - min(delays) > bound / 2
+
+
+def test_call_that_still_fails_after_its_retries_raises(waits):
+    service = Upstream('stub', retries=2)
+    flaky = FlakyService(failures=10)
+
+    with pytest.raises(ConnectionError):
+        service.call(flaky)
+    assert flaky.calls == 3
+    assert len(waits) == 2
+
+
+def test_errors_a_retry_cannot_fix_are_not_retried(waits):
+    service = Upstream('stub', retries=2)
+    broken = FlakyService(failures=10, error=ValueError)
+
+    with pytest.raises(ValueError):
+        service.call(broken)
+    assert broken.calls == 1
+    assert waits == []
+
+
+def test_breaker_opens_after_the_threshold_and_fails_fast(waits):
+    service = Upstream('stub', retries=0, failure_threshold=3, reset_timeout=60)
+    down = FlakyService(failures=10 ** 6)
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            service.call(down)
+    assert service.breaker.stats()['state'] == 'open'
+
+    start = time.perf_counter()
+    for _ in range(100):
+        with pytest.raises(CircuitOpen):
+            service.call(down)
+    assert time.perf_counter() - start < 0.1
+    assert down.calls == 3
+    assert service.stats()['short_circuited'] == 100
+    assert service.stats()['trips'] == 1
+
+
+def test_half_open_breaker_sends_one_probe_and_closes_on_success():
+    service = Upstream('stub', retries=0, failure_threshold=2, reset_timeout=0.05)
+    recovering = FlakyService(failures=2)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            service.call(recovering)
+    with pytest.raises(CircuitOpen):
+        service.call(recovering)
+
+    def probe():
+        # Other callers still fail fast while the probe is out
+        assert service.breaker.stats()['state'] == 'half_open'
+        with pytest.raises(CircuitOpen):
+            service.call(recovering)
+        return recovering()
+
+    time.sleep(0.06)
+    assert service.call(probe) == 'ok'
+    assert recovering.calls == 3
+    assert service.breaker.stats()['state'] == 'closed'
+    assert service.call(recovering) == 'ok'
+
+
+def test_failed_probe_opens_the_breaker_again():
+    service = Upstream('stub', retries=0, failure_threshold=1, reset_timeout=0.05)
+    down = FlakyService(failures=10)
+    with pytest.raises(ConnectionError):
+        service.call(down)
+
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        service.call(down)
+    assert service.breaker.stats()['state'] == 'open'
+    assert service.breaker.stats()['trips'] == 2
+    with pytest.raises(CircuitOpen):
+        service.call(down)
+    assert down.calls == 2
+
+
+def test_async_calls_retry_and_share_the_breaker(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+    monkeypatch.setattr(upstream.asyncio, 'sleep', no_sleep)
+    service = Upstream('stub', retries=2, failure_threshold=1, reset_timeout=60)
+
+    flaky = FlakyService(failures=2)
+    assert asyncio.run(service.call_async(flaky.fetch_async)) == 'ok'
+    assert flaky.calls == 3
+
+    down = FlakyService(failures=10)
+    with pytest.raises(ConnectionError):
+        asyncio.run(service.call_async(down.fetch_async))
+    with pytest.raises(CircuitOpen):
+        asyncio.run(service.call_async(down.fetch_async))
+    assert down.calls == 3
+
+
+class SlowServer:
+    """Local HTTP server that waits `delay` seconds before answering"""
+
+    def __init__(self, delay):
+        server = self
+        self.delay = delay
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.delay)
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def test_read_timeout_is_honoured():
+    server = SlowServer(delay=1.0)
+    service = Upstream('stub', connect_timeout=1.0, read_timeout=0.1, retries=1, backoff=0.01)
+    try:
+        start = time.perf_counter()
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            service.get(server.url)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.close()
+
+    # Two attempts of 0.1 s each, not the server's 1 s
+    assert elapsed < 0.6
+    assert service.stats()['retries'] == 1
+
+
+def test_get_passes_separate_connect_and_read_timeouts():
+    class RecordingSession:
+        def get(self, url, **kwargs):
+            self.kwargs = kwargs
+            raise requests.exceptions.ConnectTimeout('no route')
+
+    session = RecordingSession()
+    service = Upstream('stub', connect_timeout=0.5, read_timeout=4.0, retries=0)
+    service._session = session
+
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        service.get('http://192.0.2.1/')
+    assert session.kwargs['timeout'] == (0.5, 4.0)
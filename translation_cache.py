@@ -0,0 +1,361 @@
+import hashlib
+import html
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from upstream import translate_upstream
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), 'cache', 'translations.sqlite3')
+
+# Google Translate's mobile page, which has the translation in plain HTML; overridable to point at a local stand-in server
+TRANSLATE_URL = os.getenv('GOOGLE_TRANSLATE_URL', 'https://translate.google.com/m')
+RESULT_PATTERN = re.compile(r'<div[^>]*class="result-container"[^>]*>(.*?)</div>', re.S)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+# Disk hits note their access time in memory; this many are written to the table in one go
+ACCESS_FLUSH_SIZE = 256
+
+# Stay under the translator's 5000 character request limit
+BATCH_CHAR_LIMIT = 4500
+
+# Language codes and names
+LANGUAGES = {
+    'en': 'English',
+    'hi': 'Hindi',
+    'ta': 'Tamil',
+    'te': 'Telugu',
+    'bn': 'Bengali',
+    'mr': 'Marathi',
+    'gu': 'Gujarati',
+    'kn': 'Kannada',
+    'ml': 'Malayalam',
+    'pa': 'Punjabi'
+}
+
+
+class TranslationCache:
+    """Two-tier cache for machine translations.
+
+    Entries are keyed by (source, target, sha256 of the text). A bounded LRU
+    dict answers hot lookups in memory and a SQLite table keeps translations
+    across restarts. Both tiers honour the TTL; the disk tier is trimmed to
+    max_disk_entries by least recent access. A disk hit does not write:
+    access times are collected in memory and written ACCESS_FLUSH_SIZE at
+    a time, and before each trim.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_memory_entries=2048,
+                 max_disk_entries=100000, ttl_seconds=30 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        self.evictions = 0
+        self.writes_since_trim = 0
+        # Access times of disk hits not yet written to the table
+        self.accessed = {}
+
+        self.db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self.db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS translations ('
+                'key TEXT PRIMARY KEY, translation TEXT NOT NULL, '
+                'created REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS translations_accessed ON translations (accessed)')
+            self.db.commit()
+
+    @staticmethod
+    def make_key(source, target, text):
+        """Build the cache key for a translation"""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{source}:{target}:{digest}"
+
+    def get(self, source, target, text):
+        """Return a cached translation or None"""
+        key = self.make_key(source, target, text)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                translation, created = entry
+                if now - created < self.ttl_seconds:
+                    self.memory.move_to_end(key)
+                    self.hits['memory'] += 1
+                    return translation
+                del self.memory[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    'SELECT translation, created FROM translations WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    translation, created = row
+                    if now - created < self.ttl_seconds:
+                        self.accessed[key] = now
+                        if len(self.accessed) >= ACCESS_FLUSH_SIZE:
+                            self._flush_accessed()
+                        self._remember(key, translation, created)
+                        self.hits['disk'] += 1
+                        return translation
+                    self.db.execute('DELETE FROM translations WHERE key = ?', (key,))
+                    self.db.commit()
+                    self.evictions += 1
+
+            self.misses += 1
+            return None
+
+    def set(self, source, target, text, translation):
+        """Store a translation in both tiers"""
+        key = self.make_key(source, target, text)
+        now = time.time()
+        with self.lock:
+            self._remember(key, translation, now)
+            if self.db is not None:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO translations (key, translation, created, accessed) VALUES (?, ?, ?, ?)',
+                    (key, translation, now, now)
+                )
+                self.db.commit()
+                self.writes_since_trim += 1
+                if self.writes_since_trim >= 100:
+                    self._trim_disk(now)
+
+    def _remember(self, key, translation, created):
+        """Insert into the memory tier, evicting the least recently used entry"""
+        self.memory[key] = (translation, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def _flush_accessed(self):
+        """Write the collected access times in one transaction"""
+        self.db.executemany('UPDATE translations SET accessed = ? WHERE key = ?',
+                            [(accessed, key) for key, accessed in self.accessed.items()])
+        self.db.commit()
+        self.accessed.clear()
+
+    def _trim_disk(self, now):
+        """Drop expired rows and the least recently used rows over the size cap"""
+        self.writes_since_trim = 0
+        self._flush_accessed()
+        expired = self.db.execute('DELETE FROM translations WHERE created < ?', (now - self.ttl_seconds,)).rowcount
+        count = self.db.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+        overflow = 0
+        if count > self.max_disk_entries:
+            overflow = self.db.execute(
+                'DELETE FROM translations WHERE key IN '
+                '(SELECT key FROM translations ORDER BY accessed LIMIT ?)',
+                (count - self.max_disk_entries,)
+            ).rowcount
+        self.db.commit()
+        self.evictions += expired + overflow
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes"""
+        with self.lock:
+            lookups = self.hits['memory'] + self.hits['disk'] + self.misses
+            disk_entries = 0
+            if self.db is not None:
+                disk_entries = self.db.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+            return {
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses,
+                'hit_ratio': (lookups - self.misses) / lookups if lookups else 0,
+                'evictions': self.evictions,
+                'memory_entries': len(self.memory),
+                'disk_entries': disk_entries,
+            }
+
+
+def parse_translation(page):
+    """Return the translated text from a Google Translate result page"""
+    match = RESULT_PATTERN.search(page)
+    if not match:
+        raise ValueError('No translation found in response')
+    return html.unescape(TAG_PATTERN.sub('', match.group(1))).strip()
+
+
+def google_translate(text, source, target):
+    """Translate text upstream, with the translate upstream's timeouts, retries and circuit breaker"""
+    response = translate_upstream.get(TRANSLATE_URL, params={'sl': source, 'tl': target, 'q': text})
+    return parse_translation(response.text)
+
+
+def translate_text(text, source, target):
+    """Translate text through the cache, calling Google Translate on a miss"""
+    if not text or source == target:
+        return text
+
+    cached = translation_cache.get(source, target, text)
+    if cached is not None:
+        return cached
+
+    translation = google_translate(text, source, target)
+    if translation:
+        translation_cache.set(source, target, text, translation)
+    return translation
+
+
+def batch_chunks(texts):
+    """Group texts into newline-joined chunks under the request size limit"""
+    chunks = []
+    chunk = []
+    chunk_size = 0
+    for item in texts:
+        if chunk and chunk_size + len(item) + 1 > BATCH_CHAR_LIMIT:
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+        chunk.append(item)
+        chunk_size += len(item) + 1
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def split_batch(translated, chunk):
+    """Split a translated chunk back into lines, or None if the line count changed"""
+    lines = translated.split('\n') if translated else []
+    if len(lines) != len(chunk):
+        return None
+    return [line.strip() for line in lines]
+
+
+def split_lines(texts):
+    """Cut texts into lines for batching; returns the lines of each text and their distinct non-blank lines.
+
+    Translating lines rather than whole texts means a multi-line text cannot
+    shift the lines of the others when a chunk is split again.
+    """
+    text_lines = [item.split('\n') for item in texts]
+    lines = list(dict.fromkeys(line.strip() for item in text_lines for line in item if line.strip()))
+    return text_lines, lines
+
+
+def join_lines(text_lines, translated):
+    """Rebuild texts from split_lines, each non-blank line replaced by its translation (kept if there is none)"""
+    def translate_line(line):
+        core = line.strip()
+        if not core:
+            return line
+        return line[:len(line) - len(line.lstrip())] + (translated[core] or core) + line[len(line.rstrip()):]
+
+    return ['\n'.join(translate_line(line) for line in item) for item in text_lines]
+
+
+def translate_batch(texts, source, target):
+    """Translate texts with one upstream call per ~4500 characters.
+
+    The distinct lines of the texts (see split_lines) are joined by newlines
+    and split again afterwards. If the translator merges or splits lines
+    anyway, that chunk is translated line by line.
+    """
+    text_lines, lines = split_lines(texts)
+    translated = {}
+    for chunk in batch_chunks(lines):
+        results = split_batch(google_translate('\n'.join(chunk), source, target), chunk)
+        if results is None:
+            results = [google_translate(line, source, target) for line in chunk]
+        translated.update(zip(chunk, results))
+    return join_lines(text_lines, translated)
+
+
+def translate_texts(texts, source, target):
+    """Translate several texts through the cache, batching all misses together"""
+    if source == target:
+        return list(texts)
+
+    results = {}
+    missing = []
+    for item in dict.fromkeys(texts):
+        cached = translation_cache.get(source, target, item) if item else item
+        if cached is None:
+            missing.append(item)
+        else:
+            results[item] = cached
+
+    if missing:
+        for item, translation in zip(missing, translate_batch(missing, source, target)):
+            if translation:
+                translation_cache.set(source, target, item, translation)
+            results[item] = translation or item
+    return [results[item] for item in texts]
+
+
+def plan_segments(blocks, source, target):
+    """Resolve text segments from the cache and collect the ones still missing.
+
+    Returns the output parts, with misses left in English, and a dict
+    mapping each missing text to the part positions it fills.
+    """
+    parts = []
+    pending = {}
+    for block in blocks:
+        for kind, value in block:
+            core = value.strip()
+            if kind != 'text' or not core:
+                parts.append(value)
+                continue
+            lead = value[:len(value) - len(value.lstrip())]
+            trail = value[len(value.rstrip()):]
+            cached = translation_cache.get(source, target, core)
+            if cached is None:
+                pending.setdefault(core, []).append(len(parts) + 1)
+                cached = core
+            parts.extend([lead, cached, trail])
+    return parts, pending
+
+
+def apply_translations(parts, pending, translations, source, target):
+    """Cache fresh translations, fill them into the parts and join the response"""
+    for original, translation in zip(pending, translations):
+        if not translation:
+            continue
+        translation_cache.set(source, target, original, translation)
+        for position in pending[original]:
+            parts[position] = translation
+    return ''.join(parts)
+
+
+def translate_segments(blocks, source, target):
+    """Translate rendered blocks, sending only uncached text segments upstream.
+
+    Entity and raw segments (names, URLs, numbers, list markers) are kept
+    verbatim, and leading/trailing whitespace of text segments is preserved.
+    All cache misses go out in a single batched call.
+    """
+    if source == target:
+        return ''.join(value for block in blocks for _, value in block)
+
+    parts, pending = plan_segments(blocks, source, target)
+    translations = translate_batch(list(pending), source, target) if pending else []
+    return apply_translations(parts, pending, translations, source, target)
+
+
+def translate_segments_many(responses, source, target):
+    """Translate several rendered responses with one batched call for all their cache misses"""
+    if source == target:
+        return [''.join(value for block in blocks for _, value in block) for blocks in responses]
+
+    plans = [plan_segments(blocks, source, target) for blocks in responses]
+    missing = list(dict.fromkeys(item for _, pending in plans for item in pending))
+    translated = dict(zip(missing, translate_batch(missing, source, target))) if missing else {}
+    return [apply_translations(parts, pending, [translated[item] for item in pending], source, target)
+            for parts, pending in plans]
+
+
+# Initialize global translation cache
+translation_cache = TranslationCache(os.getenv('TRANSLATION_CACHE_PATH', DEFAULT_DB_PATH))
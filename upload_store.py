@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+DEFAULT_UPLOADS_DIR = os.path.join(os.path.dirname(__file__), 'uploads')
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadTooLarge(Exception):
+    """Raised while streaming an upload that goes over the size limit"""
+
+
+class UploadWriter:
+    """Streams one upload to a temporary file, hashing it on the way"""
+
+    def __init__(self, store):
+        self.store = store
+        self.digest = hashlib.sha256()
+        self.size = 0
+        os.makedirs(store.tmp_dir, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_dir)
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.store.max_bytes:
+            self.discard()
+            raise UploadTooLarge(f"Upload exceeds {self.store.max_bytes} bytes")
+        self.digest.update(chunk)
+        self.file.write(chunk)
+
+    def commit(self):
+        """Move the file to its content address; returns (sha256, path, size, duplicate)"""
+        self.file.close()
+        digest = self.digest.hexdigest()
+        path = self.store.path(digest)
+        duplicate = os.path.exists(path)
+        if duplicate:
+            os.remove(self.tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.tmp_path, path)
+        return digest, path, self.size, duplicate
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class UploadStore:
+    """Content-addressed file store for uploads.
+
+    Files are streamed to disk in fixed-size chunks and stored under the
+    sha256 of their contents, so memory per upload is constant and a file
+    uploaded many times is kept once. The size limit is enforced while
+    streaming, before the rest of the body is read.
+    """
+
+    def __init__(self, root=DEFAULT_UPLOADS_DIR, max_bytes=20 * 2**20, chunk_size=64 * 1024):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+
+    def path(self, digest):
+        """Return where a file with this sha256 is stored"""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def find(self, digest):
+        """Return the stored file's path for a sha256, or None"""
+        digest = (digest or '').lower()
+        if not SHA256_PATTERN.match(digest):
+            return None
+        path = self.path(digest)
+        return path if os.path.exists(path) else None
+
+    def writer(self):
+        return UploadWriter(self)
+
+    def save_multipart(self, stream, boundary, field='file'):
+        """Stream the first file in a multipart body into the store.
+
+        Returns (filename, (sha256, path, size, duplicate)). The filename
+        is None without a file part under that field name, and the result
+        is None when the part has no filename or the body was cut short.
+        """
+        # Bound what the decoder buffers for part headers and ignored form fields
+        decoder = MultipartDecoder(boundary, max_form_memory_size=4 * self.chunk_size, max_parts=100)
+        writer = None
+        filename = None
+        result = None
+        capturing = False
+        ended = False
+        try:
+            while result is None:
+                event = decoder.next_event()
+                if isinstance(event, NeedData):
+                    if ended:
+                        break
+                    chunk = stream.read(self.chunk_size)
+                    ended = not chunk
+                    decoder.receive_data(chunk or None)
+                elif isinstance(event, File) and event.name == field and filename is None:
+                    filename = event.filename
+                    # Browsers send an empty part when no file was selected
+                    if filename:
+                        writer = self.writer()
+                        capturing = True
+                elif isinstance(event, (File, Field)):
+                    capturing = False
+                elif isinstance(event, Data) and capturing:
+                    writer.write(event.data)
+                    if not event.more_data:
+                        result = writer.commit()
+                elif isinstance(event, Epilogue):
+                    break
+        except Exception:
+            if writer is not None and result is None:
+                writer.discard()
+            raise
+
+        if result is None and writer is not None:
+            # Truncated body: the file part never finished
+            writer.discard()
+        return filename, result
@@ -0,0 +1,223 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+# Failures a retry may fix: rate limiting and server-side errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Exception classes, by name so neither requests nor aiohttp has to be imported here,
+# for failures on the way to the service: refused or dropped connections and timeouts
+TRANSIENT_ERRORS = {'ConnectionError', 'Timeout', 'TimeoutError', 'ClientConnectionError'}
+
+
+def retryable(error):
+    """Whether a failed call may succeed if repeated: timeouts, dropped connections, 429 and 5xx"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None) or getattr(error, 'status', None)
+    if status is not None:
+        return status in RETRY_STATUSES
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stops calling a failing upstream for a while, then lets one trial call through.
+
+    Closed, calls go through; failure_threshold failures in a row open the
+    circuit. Open, calls fail at once until reset_timeout seconds have
+    passed. Then it is half-open: one trial call goes through, and its
+    success closes the circuit while its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.trips = 0
+        self.short_circuited = 0
+
+    def allow(self):
+        """Whether a call may go upstream now; counts the calls refused"""
+        now = time.monotonic()
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and now - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.trial = False
+            # A trial that never reported back (a cancelled call) is replaced after reset_timeout
+            if self.state == 'half_open' and (not self.trial or now - self.opened_at >= self.reset_timeout):
+                self.trial = True
+                self.opened_at = now
+                return True
+            self.short_circuited += 1
+            return False
+
+    def success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.trial = False
+                self.trips += 1
+
+    def stats(self):
+        """Return the state, consecutive failures, trip count and calls refused while open"""
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'trips': self.trips,
+                'short_circuited': self.short_circuited,
+            }
+
+
+class Upstream:
+    """An external service, called with timeouts, bounded retries and a circuit breaker.
+
+    Blocking calls share one pooled requests session with separate connect
+    and read timeouts. Attempts that failed in a way a retry may fix are
+    repeated up to `retries` times, after a random ("full jitter") wait of
+    up to backoff * 2^attempt seconds, so that callers failing together do
+    not retry together. A call that still fails counts once towards opening
+    the breaker; while it is open, calls raise CircuitOpen without waiting
+    on the service, and callers answer from their fallback straight away.
+    """
+
+    def __init__(self, name, connect_timeout=2.0, read_timeout=5.0, retries=2, backoff=0.1, max_backoff=1.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.lock = threading.Lock()
+        self._session = None
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+
+    @classmethod
+    def from_env(cls, name, **defaults):
+        """Build an upstream, overriding its settings from the environment.
+
+        For the 'search' upstream these are SEARCH_CONNECT_TIMEOUT, SEARCH_TIMEOUT (read),
+        SEARCH_RETRIES, SEARCH_FAILURE_THRESHOLD and SEARCH_RESET_TIMEOUT.
+        """
+        prefix = name.upper()
+        settings = dict(defaults)
+        for key, variable, kind in (('connect_timeout', 'CONNECT_TIMEOUT', float), ('read_timeout', 'TIMEOUT', float),
+                                    ('retries', 'RETRIES', int), ('failure_threshold', 'FAILURE_THRESHOLD', int),
+                                    ('reset_timeout', 'RESET_TIMEOUT', float)):
+            value = os.getenv(f'{prefix}_{variable}')
+            if value is not None:
+                settings[key] = kind(value)
+        return cls(name, **settings)
+
+    def session(self):
+        """Return the pooled HTTP session, importing requests on first use"""
+        if self._session is None:
+            with self.lock:
+                if self._session is None:
+                    import requests
+                    self._session = requests.Session()
+        return self._session
+
+    def delay(self, attempt):
+        """Return the jittered wait before retry number attempt + 1"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _open(self):
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+        with self.lock:
+            self.calls += 1
+
+    def _failed(self, error, attempt, time_left=True):
+        """Whether a failed attempt should be retried; otherwise record the failed call"""
+        if time_left and attempt < self.retries and retryable(error):
+            with self.lock:
+                self.retried += 1
+            return True
+        with self.lock:
+            self.failures += 1
+        self.breaker.failure()
+        return False
+
+    def call(self, fetch, *args, **kwargs):
+        """Return fetch(*args, **kwargs), retried and guarded by the breaker; raises CircuitOpen while it is open"""
+        self._open()
+        attempt = 0
+        while True:
+            try:
+                result = fetch(*args, **kwargs)
+            except Exception as e:
+                if not self._failed(e, attempt):
+                    raise
+                time.sleep(self.delay(attempt))
+                attempt += 1
+                continue
+            self.breaker.success()
+            return result
+
+    async def call_async(self, fetch, deadline=None):
+        """Coroutine variant of call; fetch is a zero-argument coroutine function.
+
+        No retry is started that would outlast the deadline, an object with remaining().
+        """
+        self._open()
+        attempt = 0
+        while True:
+            try:
+                result = await fetch()
+            except Exception as e:
+                wait = self.delay(attempt)
+                if not self._failed(e, attempt, deadline is None or deadline.remaining() > wait):
+                    raise
+                await asyncio.sleep(wait)
+                attempt += 1
+                continue
+            self.breaker.success()
+            return result
+
+    def get(self, url, **kwargs):
+        """GET a URL with the connect/read timeouts; HTTP errors raise, and the response is returned"""
+        def fetch():
+            response = self.session().get(url, timeout=(self.connect_timeout, self.read_timeout), **kwargs)
+            response.raise_for_status()
+            return response
+        return self.call(fetch)
+
+    def stats(self):
+        """Return call, retry and failure counters with the breaker's state"""
+        with self.lock:
+            stats = {
+                'calls': self.calls,
+                'retries': self.retried,
+                'failures': self.failures,
+            }
+        stats.update(self.breaker.stats())
+        return stats
+
+
+# One instance per service, shared by the Flask and asyncio servers so each breaker sees every failure
+translate_upstream = Upstream.from_env('translate')
+search_upstream = Upstream.from_env('search')
+upstreams = {upstream.name: upstream for upstream in (translate_upstream, search_upstream)}